@@ -0,0 +1,440 @@
+# backend/bitperm.py
+"""Integer bitboard engine for the ChessPerm simulation.
+
+Plays exactly the moves chessperm._simulate_chess plays, without a
+chess.Board: the position is six piece bitboards, the two side
+occupancies and a 64-entry piece-type array, all updated in place.
+Legal moves come out in python-chess's generation order (that order
+decides which move a chunk value selects), with pins, checks and
+castling resolved on bitboards instead of by trying each move.
+"""
+from chess import (BB_ALL, BB_SQUARES, BB_CORNERS, BB_BACKRANKS, BB_RANK_1, BB_RANK_4,
+                   BB_RANK_5, BB_RANK_8, BB_FILE_A, BB_FILE_H, BB_RAYS,
+                   BB_KNIGHT_ATTACKS, BB_KING_ATTACKS, BB_PAWN_ATTACKS,
+                   BB_DIAG_MASKS, BB_DIAG_ATTACKS, BB_FILE_MASKS, BB_FILE_ATTACKS,
+                   BB_RANK_MASKS, BB_RANK_ATTACKS)
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(1, 7)
+# python-chess order for the four promotions of one pawn move
+_PROMOTIONS = (QUEEN, ROOK, BISHOP, KNIGHT)
+
+# Squares strictly between two squares on a line (0 when not aligned)
+_BETWEEN = [[0] * 64 for _ in range(64)]
+for _a in range(64):
+    for _b in range(64):
+        _bb = BB_RAYS[_a][_b] & ((BB_ALL << _a) ^ (BB_ALL << _b))
+        _BETWEEN[_a][_b] = _bb & (_bb - 1)
+
+# Slider attacks on an empty board, to find pinners and checkers
+_ROOK_RAYS = [BB_RANK_ATTACKS[sq][0] | BB_FILE_ATTACKS[sq][0] for sq in range(64)]
+_BISHOP_RAYS = [BB_DIAG_ATTACKS[sq][0] for sq in range(64)]
+
+# Rook attacks in one lookup instead of a rank and a file lookup, keyed by the
+# occupied squares of both masks; filled on first use (at most 102,400 entries)
+_ROOK_MASKS = [BB_RANK_MASKS[sq] | BB_FILE_MASKS[sq] for sq in range(64)]
+_ROOK_TABLE = [{} for _ in range(64)]
+
+def _rook_miss(sq: int, occupied: int) -> int:
+    attacks = BB_RANK_ATTACKS[sq][BB_RANK_MASKS[sq] & occupied] | BB_FILE_ATTACKS[sq][BB_FILE_MASKS[sq] & occupied]
+    _ROOK_TABLE[sq][_ROOK_MASKS[sq] & occupied] = attacks
+    return attacks
+
+_START_TYPES = [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK] + [PAWN] * 8 + \
+               [0] * 32 + [PAWN] * 8 + [ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK]
+
+# Castling: (rook square, squares that must be empty, squares that must not be attacked,
+# king destination), h-side first as python-chess generates them
+_CASTLES = {
+    True: ((7, 0x60, 0x70, 6), (0, 0x0E, 0x1C, 2)),
+    False: ((63, 0x60 << 56, 0x70 << 56, 62), (56, 0x0E << 56, 0x1C << 56, 58)),
+}
+_CASTLE_PATHS = {True: 0x7C, False: 0x7C << 56}
+
+class Position:
+    """Final state of a simulation: what _board_to_master_key reads from a chess.Board."""
+    __slots__ = ('types', 'white', 'black', 'turn', 'castling', 'ep_square', 'halfmove_clock', 'moves')
+
+    def __init__(self, types, white, black, turn, castling, ep_square, halfmove_clock, moves):
+        self.types = types
+        self.white = white
+        self.black = black
+        self.turn = turn
+        self.castling = castling
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        # (from, to, promotion) per ply; castling is recorded as the king's move, like python-chess
+        self.moves = moves
+
+def simulate(bits, plies: int = 100, prioritize_irreversible=True) -> Position:
+    """Same game as chessperm._simulate_chess(bits, plies, prioritize_irreversible)."""
+    value, n = bits.value, bits.length
+    squares, knight_attacks, king_attacks = BB_SQUARES, BB_KNIGHT_ATTACKS, BB_KING_ATTACKS
+    diag_masks, diag_attacks = BB_DIAG_MASKS, BB_DIAG_ATTACKS
+    rank_masks, rank_attacks, file_masks, file_attacks = BB_RANK_MASKS, BB_RANK_ATTACKS, BB_FILE_MASKS, BB_FILE_ATTACKS
+    between, rays = _BETWEEN, BB_RAYS
+    rook_masks, rook_table = _ROOK_MASKS, _ROOK_TABLE
+
+    types = list(_START_TYPES)
+    # Piece bitboards for both colours, indexed by piece type like `types`
+    boards = [0, 0x00FF00000000FF00, 0x4200000000000042, 0x2400000000000024,
+              0x8100000000000081, 0x0800000000000008, 0x1000000000000010]
+    us, them = 0xFFFF, 0xFFFF << 48
+    white = True
+    castling = BB_CORNERS
+    ep = None
+    halfmove = 0
+    history = []
+
+    for i in range(plies):
+        _, pawns, knights, bishops, rooks, queens, kings = boards
+        occupied = us | them
+        king = (kings & us).bit_length() - 1
+        diagonal = (bishops | queens) & them
+        straight = (rooks | queens) & them
+
+        # Sliders lined up with the king either check it (nothing between) or pin
+        # the single piece between; knights and pawns can only check
+        checkers = (knight_attacks[king] & knights | BB_PAWN_ATTACKS[white][king] & pawns) & them
+        pinned = 0
+        snipers = _ROOK_RAYS[king] & straight | _BISHOP_RAYS[king] & diagonal
+        while snipers:
+            sq = snipers.bit_length() - 1
+            snipers ^= squares[sq]
+            b = between[king][sq] & occupied
+            if not b:
+                checkers |= squares[sq]
+            elif not b & (b - 1):
+                pinned |= b
+        pinned &= us
+
+        # Same 6-bit windows as chessperm._get_chunk_val
+        start = (i * 6) % n
+        end = start + 6
+        if end <= n:
+            val = (value >> (n - end)) & 63
+        else:
+            tail = n - start
+            head = min(6 - tail, n)
+            val = ((value & ((1 << tail) - 1)) << head) | (value >> (n - head))
+
+        # Squares the king may not step onto (or castle across): attacked with the king
+        # itself lifted, so it cannot retreat along a checking line
+        zone = king_attacks[king] & ~us
+        if castling & us and not checkers:
+            zone |= _CASTLE_PATHS[white]
+        danger = 0
+        if zone:
+            lifted = occupied ^ squares[king]
+            bb = pawns & them
+            if white:
+                danger = (bb & ~BB_FILE_A) >> 9 | (bb & ~BB_FILE_H) >> 7
+            else:
+                danger = ((bb & ~BB_FILE_A) << 7 | (bb & ~BB_FILE_H) << 9) & BB_ALL
+            danger |= king_attacks[(kings & them).bit_length() - 1]
+            bb = knights & them
+            while bb:
+                sq = bb.bit_length() - 1
+                bb ^= squares[sq]
+                danger |= knight_attacks[sq]
+            bb = diagonal
+            while bb:
+                sq = bb.bit_length() - 1
+                bb ^= squares[sq]
+                if _BISHOP_RAYS[sq] & zone:
+                    danger |= diag_attacks[sq][diag_masks[sq] & lifted]
+            bb = straight
+            while bb:
+                sq = bb.bit_length() - 1
+                bb ^= squares[sq]
+                if _ROOK_RAYS[sq] & zone:
+                    try:
+                        danger |= rook_table[sq][rook_masks[sq] & lifted]
+                    except KeyError:
+                        danger |= _rook_miss(sq, lifted)
+
+        # 70% of the time pick among irreversible moves (captures, en passant, promotions,
+        # castling) when there are any, otherwise among all legal moves. Both lists are
+        # built in one pass as runs (count, from, targets, promotes, push) in generation
+        # order: targets are walked from the highest square down, and a non-zero push
+        # means each move starts `push` squares behind its target.
+        prefer = prioritize_irreversible and i % 10 < 7
+        runs, captures = [], []
+        total = captures_total = 0
+        target = BB_ALL ^ us
+        push_target = BB_ALL
+        movers = us
+
+        if checkers:
+            # Evasions: king moves first, then captures of or blocks against a single checker
+            t = king_attacks[king] & target & ~danger
+            if t:
+                c = t.bit_count()
+                runs.append((c, king, t, False, 0))
+                total += c
+                if prefer and t & them:
+                    x = t & them
+                    c = x.bit_count()
+                    captures.append((c, king, x, False, 0))
+                    captures_total += c
+            if checkers & (checkers - 1):
+                movers = 0
+            else:
+                checker = checkers.bit_length() - 1
+                evade = between[king][checker] | checkers
+                target &= evade
+                push_target = evade
+                movers = us & ~kings
+
+        bb = movers & ~pawns
+        while bb:
+            frm = bb.bit_length() - 1
+            bb ^= squares[frm]
+            piece = types[frm]
+            if piece == KNIGHT:
+                t = knight_attacks[frm] & target
+            elif piece == BISHOP:
+                t = diag_attacks[frm][diag_masks[frm] & occupied] & target
+            elif piece == ROOK:
+                try:
+                    t = rook_table[frm][rook_masks[frm] & occupied] & target
+                except KeyError:
+                    t = _rook_miss(frm, occupied) & target
+            elif piece == QUEEN:
+                try:
+                    t = rook_table[frm][rook_masks[frm] & occupied]
+                except KeyError:
+                    t = _rook_miss(frm, occupied)
+                t = (t | diag_attacks[frm][diag_masks[frm] & occupied]) & target
+            else:
+                t = king_attacks[frm] & target & ~danger
+            if t:
+                if pinned and pinned & squares[frm]:
+                    t &= rays[king][frm]
+                    if not t:
+                        continue
+                c = t.bit_count()
+                runs.append((c, frm, t, False, 0))
+                total += c
+                if prefer and t & them:
+                    x = t & them
+                    c = x.bit_count()
+                    captures.append((c, frm, x, False, 0))
+                    captures_total += c
+
+        if castling & us and not checkers:
+            for rook, empty, safe, king_to in _CASTLES[white]:
+                if castling & squares[rook] and not occupied & empty and not danger & safe:
+                    run = (1, king, squares[king_to], False, 0)
+                    runs.append(run)
+                    total += 1
+                    if prefer:
+                        captures.append(run)
+                        captures_total += 1
+
+        own_pawns = pawns & movers
+        if own_pawns:
+            # Only pawns with something to capture
+            if white:
+                bb = own_pawns & ((them & ~BB_FILE_A) >> 9 | (them & ~BB_FILE_H) >> 7)
+            else:
+                bb = own_pawns & ((them & ~BB_FILE_A) << 7 | (them & ~BB_FILE_H) << 9)
+            pawn_attacks = BB_PAWN_ATTACKS[white]
+            while bb:
+                frm = bb.bit_length() - 1
+                bb ^= squares[frm]
+                t = pawn_attacks[frm] & them & target
+                if t:
+                    if pinned & squares[frm]:
+                        t &= rays[king][frm]
+                        if not t:
+                            continue
+                    if t & BB_BACKRANKS:
+                        run = (4 * t.bit_count(), frm, t, True, 0)
+                    else:
+                        run = (t.bit_count(), frm, t, False, 0)
+                    runs.append(run)
+                    total += run[0]
+                    if prefer:
+                        captures.append(run)
+                        captures_total += run[0]
+
+            empty = BB_ALL ^ occupied
+            if white:
+                single = own_pawns << 8 & empty
+                double = single << 8 & empty & BB_RANK_4
+                step = 8
+            else:
+                single = own_pawns >> 8 & empty
+                double = single >> 8 & empty & BB_RANK_5
+                step = -8
+            bb = own_pawns & pinned
+            while bb:
+                frm = bb.bit_length() - 1
+                bb ^= squares[frm]
+                if not rays[king][frm] & squares[frm + step]:
+                    single &= ~squares[frm + step]
+                    if 0 <= frm + 2 * step < 64:
+                        double &= ~squares[frm + 2 * step]
+            single &= push_target
+            double &= push_target
+            # Promotions are the highest pushes for white and the lowest for black
+            promotions = single & BB_BACKRANKS
+            quiet = single ^ promotions
+            if quiet and not white:
+                runs.append((quiet.bit_count(), 0, quiet, False, step))
+                total += runs[-1][0]
+            if promotions:
+                run = (4 * promotions.bit_count(), 0, promotions, True, step)
+                runs.append(run)
+                total += run[0]
+                if prefer:
+                    captures.append(run)
+                    captures_total += run[0]
+            if quiet and white:
+                runs.append((quiet.bit_count(), 0, quiet, False, step))
+                total += runs[-1][0]
+            if double:
+                runs.append((double.bit_count(), 0, double, False, 2 * step))
+                total += runs[-1][0]
+
+            # En passant: when in check, only if it blocks or captures the checker
+            if ep and not occupied & squares[ep] and (
+                    not checkers or squares[ep] & evade or ep - step == checker):
+                captured = squares[ep - step]
+                bb = own_pawns & BB_PAWN_ATTACKS[not white][ep] & (BB_RANK_5 if white else BB_RANK_4)
+                while bb:
+                    frm = bb.bit_length() - 1
+                    bb ^= squares[frm]
+                    # Both pawns leave the king's lines at once, so test the result directly
+                    after = occupied ^ squares[frm] ^ captured | squares[ep]
+                    if not (diag_attacks[king][diag_masks[king] & after] & diagonal or
+                            (rank_attacks[king][rank_masks[king] & after] |
+                             file_attacks[king][file_masks[king] & after]) & straight or
+                            checkers & ~captured & ~straight & ~diagonal):
+                        run = (1, frm, squares[ep], False, 0)
+                        runs.append(run)
+                        total += 1
+                        if prefer:
+                            captures.append(run)
+                            captures_total += 1
+
+        if captures_total:
+            runs, total = captures, captures_total
+        elif not total:
+            break
+
+        # Find the selected move: skip whole runs, then walk down the run's targets
+        index = val % total
+        for c, frm, t, promotes, push in runs:
+            if index < c:
+                break
+            index -= c
+        promotion = 0
+        if promotes:
+            index, promotion = index >> 2, _PROMOTIONS[index & 3]
+        # The index-th highest target, popping from whichever end is closer
+        rest = t.bit_count() - 1 - index
+        if index <= rest:
+            for _ in range(index):
+                t ^= squares[t.bit_length() - 1]
+            to = t.bit_length() - 1
+        else:
+            for _ in range(rest):
+                t &= t - 1
+            to = (t & -t).bit_length() - 1
+        if push:
+            frm = to - push
+        history.append((frm, to, promotion))
+
+        # Make the move
+        from_bb, to_bb = squares[frm], squares[to]
+        piece = types[frm]
+        captured = types[to]
+        if castling:
+            castling &= ~(from_bb | to_bb)
+        halfmove += 1
+        if captured:
+            them ^= to_bb
+            boards[captured] ^= to_bb
+            halfmove = 0
+        us ^= from_bb | to_bb
+        boards[piece] ^= from_bb | to_bb
+        types[frm] = 0
+        types[to] = piece
+        next_ep = None
+        if piece == PAWN:
+            halfmove = 0
+            if to - frm == 16 or frm - to == 16:
+                next_ep = (frm + to) >> 1
+            elif to == ep and not captured:
+                sq = to - 8 if white else to + 8
+                them ^= squares[sq]
+                boards[PAWN] ^= squares[sq]
+                types[sq] = 0
+            elif promotion:
+                boards[PAWN] ^= to_bb
+                boards[promotion] |= to_bb
+                types[to] = promotion
+        elif piece == KING:
+            if castling:
+                castling &= ~(BB_RANK_1 if white else BB_RANK_8)
+            if to - frm == 2 or frm - to == 2:
+                rook_from, rook_to = (frm + 3, frm + 1) if to > frm else (frm - 4, frm - 1)
+                rook_bb = squares[rook_from] | squares[rook_to]
+                boards[ROOK] ^= rook_bb
+                us ^= rook_bb
+                types[rook_from], types[rook_to] = 0, ROOK
+        ep = next_ep
+
+        us, them = them, us
+        white = not white
+
+    return Position(types, us if white else them, them if white else us, white, castling, ep, halfmove, history)
+
+# Reverses the bit order of a byte (bit 0 becomes the most significant)
+_REVERSE_BITS = bytes(int(f'{b:08b}'[::-1], 2) for b in range(256))
+
+def _pack_key(occupied: int, pieces, white: bool, castling, ep_square, halfmove_clock: int) -> bytes:
+    """The 256-bit master key layout shared by both engines.
+
+    `pieces` yields one 4-bit code (color << 3 | piece type) per occupied
+    square, a1 first; `castling` yields kingside W/B then queenside W/B.
+    """
+    # 1. Occupied squares: 64-bit map, a1 first
+    acc = int.from_bytes(occupied.to_bytes(8, 'little').translate(_REVERSE_BITS), 'big')
+    n = 64 + 4 * occupied.bit_count()
+
+    # 2. Each piece (type + color), 4 bits per occupied square
+    for code in pieces:
+        acc = (acc << 4) | code
+
+    # 3. Turn (1 bit), castling rights (4 bits), en passant square (6 bits), halfmove clock (7 bits)
+    tail = 0 if white else 1
+    for flag in castling:
+        tail = (tail << 1) | (1 if flag else 0)
+    tail = (tail << 13) | ((ep_square or 0) << 7) | min(halfmove_clock, 127)
+    acc = (acc << 18) | tail
+    n += 18
+
+    # Pad to 256 bits by repeating the leading bits
+    while n < 256:
+        take = min(n, 256 - n)
+        acc = (acc << take) | (acc >> (n - take))
+        n += take
+
+    return (acc >> (n - 256)).to_bytes(32, 'big')
+
+def _piece_codes(occupied: int, black: int, types):
+    while occupied:
+        lsb = occupied & -occupied
+        yield (8 if black & lsb else 0) | types[lsb.bit_length() - 1]
+        occupied ^= lsb
+
+def master_key(position: Position) -> bytes:
+    """Same bytes as chessperm._board_to_master_key for the equivalent chess.Board."""
+    black = position.black
+    occupied = position.white | black
+    castling = position.castling
+    return _pack_key(occupied, _piece_codes(occupied, black, position.types), position.turn,
+                     (castling & rook for rook in (BB_SQUARES[7], BB_SQUARES[63], BB_SQUARES[0], BB_SQUARES[56])),
+                     position.ep_square, position.halfmove_clock)
@@ -1,18 +1,117 @@
+import os
+import re
+import time
 import chess
+import struct
+import hashlib
 import secrets
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+try:
+    from . import metrics, bitperm
+except ImportError:
+    import metrics
+    import bitperm
 
-def _password_to_bits(password: str, salt: bytes = b'') -> list[int]:
-    combined = password.encode() + salt
-    return [((byte >> i) & 1) for byte in combined for i in reversed(range(8))]
+# CHESSPERM_ENGINE=bitboard plays the simulation on bitperm's integer bitboards
+# instead of chess.Board; both engines derive identical keys
+ENGINE = os.environ.get("CHESSPERM_ENGINE", "python-chess")
+if ENGINE not in ('python-chess', 'bitboard'):
+    raise ValueError(f"Unknown CHESSPERM_ENGINE: {ENGINE}")
 
-def _get_chunk_val(bits: list[int], index: int, chunk_size: int = 6) -> int:
-    start = (index * chunk_size) % len(bits)
-    chunk = bits[start:start + chunk_size]
-    if len(chunk) < chunk_size:
-        chunk += bits[:chunk_size - len(chunk)]
-    return int(''.join(str(b) for b in chunk), 2)
+class _Bits:
+    """Bit vector packed into one int, most significant bit first."""
+    __slots__ = ('value', 'length')
 
-def _simulate_chess(bits: list[int], plies: int = 100, prioritize_irreversible=True) -> chess.Board:
+    def __init__(self, value: int = 0, length: int = 0):
+        self.value = value
+        self.length = length
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> '_Bits':
+        return cls(int.from_bytes(data, 'big'), len(data) * 8)
+
+    @classmethod
+    def from_list(cls, bits: list[int]) -> '_Bits':
+        value = 0
+        for b in bits:
+            value = (value << 1) | b
+        return cls(value, len(bits))
+
+    def append(self, value: int, nbits: int):
+        self.value = (self.value << nbits) | value
+        self.length += nbits
+
+    def __add__(self, other: '_Bits') -> '_Bits':
+        return _Bits((self.value << other.length) | other.value, self.length + other.length)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def to_list(self) -> list[int]:
+        return [(self.value >> i) & 1 for i in reversed(range(self.length))]
+
+def _password_to_bits(password: str, salt: bytes = b'') -> _Bits:
+    return _Bits.from_bytes(password.encode() + salt)
+
+def _get_chunk_val(bits: _Bits, index: int, chunk_size: int = 6) -> int:
+    n, value = bits.length, bits.value
+    start = (index * chunk_size) % n
+    end = start + chunk_size
+    if end <= n:
+        return (value >> (n - end)) & ((1 << chunk_size) - 1)
+    # Window runs off the end: take the tail, then wrap around to the head
+    tail = n - start
+    head = min(chunk_size - tail, n)
+    return ((value & ((1 << tail) - 1)) << head) | (value >> (n - head))
+
+def _irreversible_moves(board: chess.Board) -> list:
+    # Captures, promotions and castling, in the same order as filtering list(board.legal_moves).
+    # Only moves onto enemy pieces, empty back-rank squares and the en passant square are
+    # generated; non-pawn moves onto empty squares are then dropped.
+    squares = chess.BB_SQUARES
+    them = board.occupied_co[not board.turn]
+    pawns = board.pawns
+    to_mask = them | (chess.BB_BACKRANKS & ~board.occupied)
+    if board.ep_square is not None:
+        to_mask |= squares[board.ep_square]
+
+    # Legal moves come out as piece moves, castling, then pawn moves, so castling
+    # (never matched by to_mask) is spliced in before the first pawn move
+    moves = []
+    castling = bool(board.castling_rights)
+    for move in board.generate_legal_moves(chess.BB_ALL, to_mask):
+        if pawns & squares[move.from_square]:
+            if castling:
+                moves.extend(board.generate_castling_moves())
+                castling = False
+            moves.append(move)
+        elif them & squares[move.to_square]:
+            moves.append(move)
+    if castling:
+        moves.extend(board.generate_castling_moves())
+    return moves
+
+def _simulate_chess(bits: _Bits, plies: int = 100, prioritize_irreversible=True) -> chess.Board:
+    board = chess.Board()
+    for i in range(plies):
+        # 70% of the time pick among irreversible moves, when there are any
+        move_pool = None
+        if prioritize_irreversible and i % 10 < 7:
+            move_pool = _irreversible_moves(board)
+        if not move_pool:
+            move_pool = list(board.legal_moves)
+            if not move_pool:
+                break
+
+        val = _get_chunk_val(bits, i)
+        board.push(move_pool[val % len(move_pool)])
+    return board
+
+def _simulate_chess_reference(bits: _Bits, plies: int = 100, prioritize_irreversible=True) -> chess.Board:
+    # Original move-selection loop; _simulate_chess must match it move for move
     board = chess.Board()
     for i in range(plies):
         legal_moves = list(board.legal_moves)
@@ -36,71 +135,436 @@ def _simulate_chess(bits: list[int], plies: int = 100, prioritize_irreversible=T
     return board
 
 def _board_to_master_key(board: chess.Board) -> bytes:
-    bits = []
+    occupied = board.occupied
+    black = board.occupied_co[chess.BLACK]
+    pieces = ((8 if black & chess.BB_SQUARES[sq] else 0) | board.piece_type_at(sq) for sq in chess.scan_forward(occupied))
+    castling = (board.has_kingside_castling_rights(chess.WHITE), board.has_kingside_castling_rights(chess.BLACK),
+                board.has_queenside_castling_rights(chess.WHITE), board.has_queenside_castling_rights(chess.BLACK))
+    return bitperm._pack_key(occupied, pieces, board.turn == chess.WHITE, castling,
+                             board.ep_square, board.halfmove_clock)
 
-    # 1. Occupied squares: 64-bit map
-    bits.extend([1 if board.piece_at(i) else 0 for i in chess.SQUARES])
+# === PGN replay ===
 
-    # 2. Encode each piece (type + color)
-    for sq in chess.SQUARES:
-        piece = board.piece_at(sq)
-        if piece:
-            color_bit = 0 if piece.color == chess.WHITE else 1
-            type_code = piece.piece_type  # 1–6
-            val = (color_bit << 3) | (type_code & 0b111)
-            bits.extend([(val >> b) & 1 for b in reversed(range(4))])
+_PGN_LEXEME = re.compile(r'\{[^}]*\}?|[()]|\$\d+|[^\s{}()]+')
+_PGN_RESULTS = frozenset(('1-0', '0-1', '1/2-1/2', '*'))
 
-    # 3. Turn (1 bit)
-    bits.append(0 if board.turn == chess.WHITE else 1)
+def _pgn_tokens(pgn: str) -> list:
+    # Candidate moves of a PGN in one pass: {comments}, (variations), $NAGs, move numbers
+    # and results are dropped; anything else is left for the SAN resolver to accept or skip
+    tokens = []
+    depth = 0
+    for lexeme in _PGN_LEXEME.findall(pgn):
+        first = lexeme[0]
+        if first == '(':
+            depth += 1
+        elif first == ')':
+            depth = max(depth - 1, 0)
+        elif not (depth or first in '{$' or lexeme.endswith('.') or lexeme in _PGN_RESULTS):
+            tokens.append(lexeme)
+    return tokens
 
-    # 4. Castling rights (4 bits)
-    bits += [int(board.has_kingside_castling_rights(c)) for c in [chess.WHITE, chess.BLACK]]
-    bits += [int(board.has_queenside_castling_rights(c)) for c in [chess.WHITE, chess.BLACK]]
+_SQUARES = {name: square for square, name in enumerate(chess.SQUARE_NAMES)}
+_PIECES = {symbol: chess.PIECE_SYMBOLS.index(symbol.lower()) for symbol in 'NBRQKnbrqk'}
 
-    # 5. En passant square (6 bits)
-    ep = board.ep_square if board.ep_square is not None else 0
-    bits.extend([(ep >> b) & 1 for b in reversed(range(6))])
+def _parse_san(board: chess.Board, san: str):
+    try:
+        return board.parse_san(san)
+    except ValueError:
+        return None
 
-    # 6. Halfmove clock (7 bits)
-    hmc = min(board.halfmove_clock, 127)
-    bits.extend([(hmc >> b) & 1 for b in reversed(range(7))])
+def _resolve_san(board: chess.Board, san: str):
+    """The move board.parse_san(san) returns, or None where it raises.
 
-    # Pad to 256 bits
-    while len(bits) < 256:
-        bits.extend(bits[:256 - len(bits)])
+    Piece and pawn moves are resolved from attack tables and pawn pushes;
+    castling, null moves, square-to-square notation and king moves while
+    castling rights remain go through python-chess.
+    """
+    match = chess.SAN_REGEX.match(san)
+    if match is None:
+        return _parse_san(board, san)
+    piece, from_file, from_rank, target, promotion = match.groups()
+    if piece is None and from_file and from_rank:
+        return _parse_san(board, san)
 
-    return bytes(int(''.join(str(b) for b in bits[i:i+8]), 2) for i in range(0, 256, 8))
+    us = board.turn
+    to_square = _SQUARES[target]
+    to_bb = chess.BB_SQUARES[to_square]
+    if board.occupied_co[us] & to_bb:
+        return None
+    from_mask = chess.BB_ALL
+    if from_file:
+        from_mask &= chess.BB_FILES[ord(from_file) - 97]
+    if from_rank:
+        from_mask &= chess.BB_RANKS[int(from_rank) - 1]
 
-# === Public API ===
+    if piece:
+        if promotion:
+            return None
+        piece_type = _PIECES[piece]
+        if piece_type == chess.KING and board.castling_rights & (chess.BB_RANK_1 if us else chess.BB_RANK_8):
+            return _parse_san(board, san)
+        from_mask &= board.attackers_mask(us, to_square) & board.pieces_mask(piece_type, us)
+        promotion = None
+    else:
+        promotion = _PIECES[promotion[-1]] if promotion else None
+        if (promotion is not None) != bool(to_bb & chess.BB_BACKRANKS) or promotion == chess.KING:
+            return None
+        pawns = board.pawns & board.occupied_co[us] & from_mask
+        if not from_file:
+            pawns &= chess.BB_FILES[to_square & 7]
+        if board.occupied & to_bb:
+            from_mask = pawns & chess.BB_PAWN_ATTACKS[not us][to_square]
+        else:
+            from_mask = 0
+            one = to_square - 8 if us else to_square + 8
+            if 0 <= one < 64:
+                if pawns & chess.BB_SQUARES[one]:
+                    from_mask = chess.BB_SQUARES[one]
+                elif not board.occupied & chess.BB_SQUARES[one] and to_square >> 3 == (3 if us else 4):
+                    from_mask = pawns & chess.BB_SQUARES[one - 8 if us else one + 8]
+            if to_square == board.ep_square:
+                from_mask |= pawns & chess.BB_PAWN_ATTACKS[not us][to_square]
+
+    matched = None
+    for from_square in chess.scan_reversed(from_mask):
+        move = chess.Move(from_square, to_square, promotion)
+        if board.is_into_check(move):
+            continue
+        if matched:
+            return None
+        matched = move
+    return matched
 
-def derive_master_key(pgn: str, salt: bytes = b'', plies: int = 100) -> bytes:
+def _replay_token(board: chess.Board, token: str):
+    # Plays one SAN token and returns its 12-bit code, or None if it isn't a legal move here
+    move = _resolve_san(board, token)
+    if move is None:
+        return None
+    board.push(move)
+    # 3 bits each for from-file, from-rank, to-file, to-rank; a null move
+    # ("0000" in UCI) has always encoded as all ones
+    if not move:
+        return 0xFFF
+    return (((move.from_square & 7) << 9) | ((move.from_square >> 3) << 6) |
+            ((move.to_square & 7) << 3) | (move.to_square >> 3))
+
+def _replay_tokens(tokens) -> _Bits:
     board = chess.Board()
-    bits = []
+    bits = _Bits()
+    for token in tokens:
+        code = _replay_token(board, token)
+        if code is not None:
+            bits.append(code, 12)
+    return bits
 
-    for token in pgn.replace('\n', ' ').split():
-        token = token.strip()
-        if not token or token.endswith('.'):
-            continue
-        try:
-            move = board.parse_san(token)
-            board.push(move)
-            uci = move.uci()
-            coords = [ord(uci[0]) - ord('a'), ord(uci[1]) - ord('1'),
-                      ord(uci[2]) - ord('a'), ord(uci[3]) - ord('1')]
-            for c in coords:
-                bits.extend([(c >> b) & 1 for b in reversed(range(3))])
-        except ValueError:
-            continue
+def _pgn_move_bits(pgn: str) -> _Bits:
+    return _replay_tokens(_pgn_tokens(pgn))
+
+def _legacy_pgn_tokens(pgn: str) -> list:
+    # Whitespace tokenizer used before the PGN lexer: comments and variations are not
+    # skipped, so any legal move inside them is played
+    return [token for token in pgn.replace('\n', ' ').split() if not token.endswith('.')]
+
+def _legacy_pgn_move_bits(pgn: str) -> _Bits:
+    return _replay_tokens(_legacy_pgn_tokens(pgn))
+
+class _ReplayNode:
+    __slots__ = ('token', 'parent', 'children', 'board', 'value', 'length', 'stamp')
+
+    def __init__(self, token, parent, board, value, length, stamp):
+        self.token = token
+        self.parent = parent
+        self.children = {}
+        self.board = board
+        self.value = value
+        self.length = length
+        self.stamp = stamp
+
+class PgnReplay:
+    """Bounded trie of replayed PGN prefixes.
+
+    Each node, keyed by one SAN token under its parent, holds the move
+    bits accumulated up to that prefix, so games that share an opening
+    only parse it once. The board after a prefix is snapshotted the first
+    time another game continues from it, so unique continuations never
+    pay for board copies. Only the first `max_depth` tokens of a game are
+    cached; past `max_nodes`, the least recently used leaves are pruned
+    until a quarter of the room is free again.
+    """
+
+    def __init__(self, max_nodes: int = 100_000, max_depth: int = 40):
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self._root = _ReplayNode(None, None, chess.Board(), 0, 0, 0)
+        self._clock = 0
+        self._lock = threading.Lock()
+        self.nodes = 0
+        self.cached_tokens = 0
+        self.parsed_tokens = 0
+        self.pruned = 0
+
+    def move_bits(self, pgn: str) -> _Bits:
+        tokens = _pgn_tokens(pgn)
+        with self._lock:
+            self._clock += 1
+            node, depth = self._root, 0
+            for token in tokens:
+                child = node.children.get(token)
+                if child is None:
+                    break
+                child.stamp = self._clock
+                node, depth = child, depth + 1
+            self.cached_tokens += depth
 
+            rest = tokens[depth:]
+            bits = _Bits(node.value, node.length)
+            if rest:
+                # Node boards are never played on; continue from a copy
+                board = self._board_at(node).copy(stack=False)
+                for token in rest:
+                    code = _replay_token(board, token)
+                    self.parsed_tokens += 1
+                    if code is not None:
+                        bits.append(code, 12)
+                    if depth < self.max_depth:
+                        child = _ReplayNode(token, node, None, bits.value, bits.length, self._clock)
+                        node.children[token] = child
+                        node, depth = child, depth + 1
+                        self.nodes += 1
+            if self.nodes > self.max_nodes:
+                self._prune(self.max_nodes * 3 // 4)
+            return bits
+
+    def _board_at(self, node: _ReplayNode) -> chess.Board:
+        # Replays from the nearest snapshotted ancestor and keeps the result on the node
+        if node.board is None:
+            path = []
+            ancestor = node
+            while ancestor.board is None:
+                path.append(ancestor.token)
+                ancestor = ancestor.parent
+            board = ancestor.board.copy(stack=False)
+            for token in reversed(path):
+                _replay_token(board, token)
+            self.parsed_tokens += len(path)
+            node.board = board
+        return node.board
+
+    def _prune(self, target: int):
+        while self.nodes > target:
+            leaves, stack = [], [self._root]
+            while stack:
+                node = stack.pop()
+                if node.children:
+                    stack.extend(node.children.values())
+                elif node is not self._root:
+                    leaves.append(node)
+            leaves.sort(key=lambda n: n.stamp)
+            for leaf in leaves[:self.nodes - target]:
+                del leaf.parent.children[leaf.token]
+                self.nodes -= 1
+                self.pruned += 1
+
+    def stats(self) -> dict:
+        total = self.cached_tokens + self.parsed_tokens
+        return {
+            "nodes": self.nodes,
+            "max_nodes": self.max_nodes,
+            "cached_tokens": self.cached_tokens,
+            "parsed_tokens": self.parsed_tokens,
+            "cached_fraction": self.cached_tokens / total if total else 0.0,
+            "pruned": self.pruned,
+        }
+
+def _simulate_master_key(bits: _Bits, plies: int) -> bytes:
+    if ENGINE == 'bitboard':
+        with metrics.span("chessperm.simulate"):
+            position = bitperm.simulate(bits, plies)
+        return bitperm.master_key(position)
+    with metrics.span("chessperm.simulate"):
+        final_board = _simulate_chess(bits, plies)
+    return _board_to_master_key(final_board)
+
+# === Public API ===
+
+def _pgn_master_key(bits: _Bits, pgn: str, salt: bytes, plies: int) -> bytes:
     if not bits:
         bits = _password_to_bits(pgn)
     if salt:
-        bits += _password_to_bits("", salt)
+        bits = bits + _password_to_bits("", salt)
+    return _simulate_master_key(bits, plies)
 
-    final_board = _simulate_chess(bits, plies)
-    return _board_to_master_key(final_board)
+@metrics.timed("chessperm.derive")
+def derive_master_key(pgn: str, salt: bytes = b'', plies: int = 100, replay: PgnReplay = None) -> bytes:
+    with metrics.span("chessperm.parse"):
+        bits = replay.move_bits(pgn) if replay is not None else _pgn_move_bits(pgn)
+    return _pgn_master_key(bits, pgn, salt, plies)
+
+@metrics.timed("chessperm.derive")
+def derive_legacy_master_key(pgn: str, salt: bytes = b'', plies: int = 100):
+    """The key derive_master_key gave `pgn` before the PGN lexer, or None if it is unchanged.
 
+    The old tokenizer also played legal moves found in {comments} and
+    (variations), so packages sealed from annotated PGNs need this key.
+    """
+    with metrics.span("chessperm.parse"):
+        legacy = _legacy_pgn_move_bits(pgn)
+        current = _pgn_move_bits(pgn)
+    if (legacy.value, legacy.length) == (current.value, current.length):
+        return None
+    return _pgn_master_key(legacy, pgn, salt, plies)
+
+@metrics.timed("chessperm.derive")
 def derive_master_key_from_password(password: str, salt: bytes = b'', plies: int = 100) -> bytes:
     bits = _password_to_bits(password, salt)
-    final_board = _simulate_chess(bits, plies)
-    return _board_to_master_key(final_board)
+    return _simulate_master_key(bits, plies)
+
+_batch_replay = None
+
+def _derive_chunk(chunk: list, salt: bytes, plies: int, mode: str, replay: bool = False) -> list:
+    global _batch_replay
+    if mode == 'password':
+        return [derive_master_key_from_password(item, salt, plies) for item in chunk]
+    if not replay:
+        return [derive_master_key(item, salt, plies) for item in chunk]
+    # One trie per process, shared by every chunk that process handles
+    if _batch_replay is None:
+        _batch_replay = PgnReplay()
+    return [derive_master_key(item, salt, plies, _batch_replay) for item in chunk]
+
+def derive_master_keys_batch(inputs, salt: bytes = b'', plies: int = 100, workers: int = None,
+                             mode: str = 'pgn', chunksize: int = 64, replay: bool = True):
+    """Derive master keys for an iterable of PGNs (mode='pgn') or passwords
+    (mode='password'), yielding them in input order.
+
+    Work is dispatched to a process pool in chunks; at most two chunks per
+    worker are in flight, so memory stays bounded for arbitrarily long inputs.
+    workers=0 derives inline in the calling process. With `replay`, PGNs
+    are replayed through a PgnReplay trie so shared openings parse once.
+    """
+    if mode not in ('pgn', 'password'):
+        raise ValueError(f"Unknown mode: {mode}")
+    items = iter(inputs)
+    chunks = iter(lambda: list(islice(items, chunksize)), [])
+
+    if workers == 0:
+        for chunk in chunks:
+            yield from _derive_chunk(chunk, salt, plies, mode, replay)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        window = 2 * workers
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_derive_chunk, chunk, salt, plies, mode, replay))
+            if len(pending) >= window:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+class MasterKeyCache:
+    """Opt-in LRU cache of derived master keys with a TTL.
+
+    Entries are keyed by a BLAKE2b MAC of (mode, input, salt, plies) under a
+    random per-process key, so the PGN or password itself is never stored.
+    Keys are held in bytearrays and zeroed when evicted, expired or cleared;
+    copies already handed to callers are theirs to dispose of. Every get()
+    and put() sweeps out expired entries, at most once per PURGE_INTERVAL.
+    """
+
+    PURGE_INTERVAL = 1.0
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 300.0):
+        if max_entries <= 0 or ttl <= 0:
+            raise ValueError(f"Need max_entries > 0 and ttl > 0, got {max_entries} and {ttl}")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._mac_key = secrets.token_bytes(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._next_purge = 0.0
+
+    def _fingerprint(self, mode: str, secret: str, salt: bytes, plies: int) -> bytes:
+        data = secret.encode('utf-8')
+        mac = hashlib.blake2b(key=self._mac_key, digest_size=32)
+        mac.update(struct.pack('>BIII', mode == 'password', plies, len(data), len(salt)))
+        mac.update(data)
+        mac.update(salt)
+        return mac.digest()
+
+    def _drop(self, fingerprint: bytes):
+        key, _ = self._entries.pop(fingerprint)
+        key[:] = bytes(len(key))
+
+    def _purge(self, now: float, force: bool = False):
+        # Caller holds the lock
+        if not force and now < self._next_purge:
+            return
+        self._next_purge = now + min(self.PURGE_INTERVAL, self.ttl)
+        for fingerprint in [f for f, (_, expires) in self._entries.items() if expires <= now]:
+            self._drop(fingerprint)
+            self.expirations += 1
+
+    def get(self, mode: str, secret: str, salt: bytes = b'', plies: int = 100):
+        fingerprint = self._fingerprint(mode, secret, salt, plies)
+        with self._lock:
+            now = time.monotonic()
+            self._purge(now)
+            entry = self._entries.get(fingerprint)
+            if entry is not None and entry[1] <= now:
+                self._drop(fingerprint)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(fingerprint)
+            self.hits += 1
+            return bytes(entry[0])
+
+    def put(self, mode: str, secret: str, key: bytes, salt: bytes = b'', plies: int = 100):
+        fingerprint = self._fingerprint(mode, secret, salt, plies)
+        with self._lock:
+            now = time.monotonic()
+            self._purge(now)
+            if fingerprint in self._entries:
+                self._drop(fingerprint)
+            self._entries[fingerprint] = (bytearray(key), now + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def derive(self, mode: str, secret: str, salt: bytes = b'', plies: int = 100) -> bytes:
+        key = self.get(mode, secret, salt, plies)
+        if key is None:
+            derive = derive_master_key_from_password if mode == 'password' else derive_master_key
+            key = derive(secret, salt, plies)
+            self.put(mode, secret, key, salt, plies)
+        return key
+
+    def purge_expired(self):
+        with self._lock:
+            self._purge(time.monotonic(), force=True)
+
+    def clear(self):
+        with self._lock:
+            while self._entries:
+                self._drop(next(iter(self._entries)))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -1,19 +1,226 @@
 # backend/kyber_kem.py
+import time
+import ctypes
+import queue
+import threading
+from collections import deque
 import oqs
+try:
+    from . import metrics
+    from .logs import logger
+except ImportError:
+    import metrics
+    from logs import logger
 
-def generate_keypair():
-    kem = oqs.KeyEncapsulation('Kyber512')
-    public_key = kem.generate_keypair()
-    secret_key = kem.export_secret_key()
-    return public_key, secret_key
-
-def encapsulate(public_key: bytes):
-    kem = oqs.KeyEncapsulation('Kyber512')
-    ciphertext, shared_secret = kem.encap_secret(public_key)
-    return ciphertext, shared_secret
-
-def decapsulate(ciphertext: bytes, secret_key: bytes):
-    # This is the correct way to initialize the KEM object for decapsulation with a given secret key
-    kem = oqs.KeyEncapsulation('Kyber512', secret_key=secret_key)
-    shared_secret = kem.decap_secret(ciphertext)
-    return shared_secret
\ No newline at end of file
+DEFAULT_ALG = 'Kyber512'
+
+def _wipe_secret(kem):
+    # Zero the secret-key buffer held by a pooled context
+    sk = getattr(kem, 'secret_key', None)
+    if isinstance(sk, ctypes.Array):
+        ctypes.memset(sk, 0, ctypes.sizeof(sk))
+
+def _bind_secret(kem, secret_key: bytes):
+    # Rebind a pooled context to another secret key, as KeyEncapsulation(alg, secret_key=...) would.
+    # decap_secret reading `kem.secret_key` is undocumented (checked against liboqs-python 0.16.0.1,
+    # the version pinned in requirements.txt), so KemPool verifies it before relying on it
+    expected = kem.details['length_secret_key']
+    if len(secret_key) != expected:
+        raise ValueError(f"Secret key must be {expected} bytes for {kem.details['name']}, got {len(secret_key)}")
+    kem.secret_key = ctypes.create_string_buffer(secret_key, expected)
+
+class KemPool:
+    """Reusable liboqs contexts for one KEM algorithm.
+
+    Key generation and encapsulation use a context cached per thread;
+    decapsulation checks a context out of a bounded pool, binds the
+    caller's secret key, and wipes it before returning the context. A
+    self-check at construction makes sure rebinding and wiping really
+    change the key decap_secret uses; if not, every decapsulation gets a
+    fresh context instead.
+    """
+
+    def __init__(self, alg: str = DEFAULT_ALG, max_decap: int = 8):
+        self.alg = alg
+        self.max_decap = max_decap
+        self._local = threading.local()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.rebinding = self._self_check()
+        if not self.rebinding:
+            logger.warning("liboqs-python ignores rebound secret keys; %s decapsulation will not be pooled", alg)
+
+    def _self_check(self) -> bool:
+        # Two fresh keypairs, each decapsulated through one rebound pooled context,
+        # then once more after the wipe, which must no longer recover the secret
+        cases = []
+        for _ in range(2):
+            kem = oqs.KeyEncapsulation(self.alg)
+            public_key = kem.generate_keypair()
+            cases.append((kem.export_secret_key(), *kem.encap_secret(public_key)))
+            kem.free()
+        kem = self._checkout()
+        try:
+            for secret_key, ciphertext, shared in cases:
+                _bind_secret(kem, secret_key)
+                if kem.decap_secret(ciphertext) != shared:
+                    return False
+            _wipe_secret(kem)
+            return kem.decap_secret(ciphertext) != shared
+        except Exception:
+            return False
+        finally:
+            _wipe_secret(kem)
+            self._idle.put(kem)
+
+    def _thread_kem(self):
+        kem = getattr(self._local, 'kem', None)
+        if kem is None:
+            kem = self._local.kem = oqs.KeyEncapsulation(self.alg)
+        return kem
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.max_decap:
+                self._created += 1
+                return oqs.KeyEncapsulation(self.alg)
+        return self._idle.get()
+
+    @metrics.timed("kyber.keygen")
+    def generate_keypair(self):
+        kem = self._thread_kem()
+        public_key = kem.generate_keypair()
+        secret_key = kem.export_secret_key()
+        _wipe_secret(kem)
+        return public_key, secret_key
+
+    @metrics.timed("kyber.encap")
+    def encapsulate(self, public_key: bytes):
+        return self._thread_kem().encap_secret(public_key)
+
+    @metrics.timed("kyber.decap")
+    def decapsulate(self, ciphertext: bytes, secret_key: bytes):
+        if not self.rebinding:
+            kem = oqs.KeyEncapsulation(self.alg, secret_key=secret_key)
+            try:
+                return kem.decap_secret(ciphertext)
+            finally:
+                kem.free()
+        kem = self._checkout()
+        try:
+            _bind_secret(kem, secret_key)
+            return kem.decap_secret(ciphertext)
+        finally:
+            _wipe_secret(kem)
+            self._idle.put(kem)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(alg: str = DEFAULT_ALG) -> KemPool:
+    pool = _pools.get(alg)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(alg, KemPool(alg))
+    return pool
+
+def generate_keypair(alg: str = DEFAULT_ALG):
+    return get_pool(alg).generate_keypair()
+
+def encapsulate(public_key: bytes, alg: str = DEFAULT_ALG):
+    return get_pool(alg).encapsulate(public_key)
+
+def decapsulate(ciphertext: bytes, secret_key: bytes, alg: str = DEFAULT_ALG):
+    return get_pool(alg).decapsulate(ciphertext, secret_key)
+
+class KeypairReservoir:
+    """Background-filled stock of fresh keypairs for one KEM algorithm.
+
+    A refill thread tops the reservoir up to `capacity` whenever it drops
+    below `low_water`. Each keypair is handed out exactly once; take()
+    falls back to inline generation when the reservoir is empty.
+    """
+
+    def __init__(self, alg: str = DEFAULT_ALG, capacity: int = 32, low_water: int = 8):
+        if not 0 <= low_water < capacity:
+            raise ValueError(f"Need 0 <= low_water < capacity, got {low_water} and {capacity}")
+        self.alg = alg
+        self.capacity = capacity
+        self.low_water = low_water
+        self._keys = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopped = False
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_seconds_total = 0.0
+        self.refill_seconds_max = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name=f"keypair-reservoir-{self.alg}", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._keys.clear()
+        if thread is not None:
+            thread.join()
+
+    def take(self):
+        if self._thread is None:
+            self.start()
+        with self._lock:
+            keypair = self._keys.popleft() if self._keys else None
+            if keypair is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if len(self._keys) < self.low_water:
+                self._wake.set()
+        return keypair or generate_keypair(self.alg)
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopped:
+                return
+            started = time.perf_counter()
+            while not self._stopped and len(self._keys) < self.capacity:
+                keypair = generate_keypair(self.alg)
+                with self._lock:
+                    if len(self._keys) < self.capacity:
+                        self._keys.append(keypair)
+            elapsed = time.perf_counter() - started
+            self.refills += 1
+            self.refill_seconds_total += elapsed
+            self.refill_seconds_max = max(self.refill_seconds_max, elapsed)
+
+    def stats(self) -> dict:
+        taken = self.hits + self.misses
+        return {
+            "alg": self.alg,
+            "available": len(self._keys),
+            "capacity": self.capacity,
+            "low_water": self.low_water,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / taken if taken else 0.0,
+            "refills": self.refills,
+            "refill_ms_avg": self.refill_seconds_total / self.refills * 1000 if self.refills else 0.0,
+            "refill_ms_max": self.refill_seconds_max * 1000,
+        }
@@ -0,0 +1,155 @@
+# backend/logs.py
+import os
+import sys
+import copy
+import json
+import time
+import queue
+import random
+import logging
+import logging.handlers
+
+# CHESSPERM_LOG_LEVEL      minimum level written (INFO)
+# CHESSPERM_LOG_SAMPLE     fraction of requests whose INFO/DEBUG records are kept (1.0);
+#                          warnings and errors are always kept
+# CHESSPERM_LOG_SECRETS=1  include key material and plaintext (never in production)
+# CHESSPERM_LOG_QUEUE      records buffered for the writer thread; overflow is dropped, not waited on
+LOG_LEVEL   = os.environ.get("CHESSPERM_LOG_LEVEL", "INFO").upper()
+SAMPLE_RATE = float(os.environ.get("CHESSPERM_LOG_SAMPLE", 1.0))
+LOG_SECRETS = os.environ.get("CHESSPERM_LOG_SECRETS", "0") == "1"
+QUEUE_SIZE  = int(os.environ.get("CHESSPERM_LOG_QUEUE", 10000))
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, event, then the record's fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    # Never blocks the caller: a full queue drops the record and counts it
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+    def prepare(self, record):
+        # JSON formatting happens on the writer thread; only freeze what can't cross threads here
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+logger = logging.getLogger("chessperm")
+_listener = None
+
+def setup(stream=None):
+    """Route the "chessperm" logger through a queue to a JSON writer thread."""
+    global _listener
+    if _listener is not None:
+        return
+    records = queue.Queue(maxsize=QUEUE_SIZE)
+    writer = logging.StreamHandler(stream or sys.stderr)
+    writer.setFormatter(JsonFormatter())
+    logger.handlers[:] = [_DroppingQueueHandler(records)]
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(records, writer, respect_handler_level=True)
+    _listener.start()
+
+def shutdown():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def dropped() -> int:
+    return _DroppingQueueHandler.dropped
+
+class RequestLog:
+    """Structured log context for one request.
+
+    Fields accumulate with set()/secret() and stage timings with stage()
+    or timed(); each info()/warning() call writes one record carrying all
+    of them. Whether a request's INFO/DEBUG records are kept is decided
+    once, at creation, so a sampled request is logged in full.
+    """
+
+    def __init__(self, request: str, sample_rate: float = None):
+        self.request = request
+        rate = SAMPLE_RATE if sample_rate is None else sample_rate
+        self.sampled = rate >= 1.0 or random.random() < rate
+        self.fields = {"request": request}
+        self.timings = {}
+        self._started = time.perf_counter()
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def secret(self, **fields):
+        # Key material and plaintext: only written with CHESSPERM_LOG_SECRETS=1
+        for name, value in fields.items():
+            if value is None or not LOG_SECRETS:
+                self.fields[name] = None if value is None else "<redacted>"
+            else:
+                self.fields[name] = value.hex() if isinstance(value, (bytes, bytearray)) else value
+
+    def stage(self, name: str):
+        return _Stage(self, name)
+
+    async def timed(self, name: str, awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.timings[name] = round((time.perf_counter() - started) * 1000, 3)
+
+    def _log(self, level: int, event: str, fields: dict):
+        if level < logging.WARNING and not self.sampled:
+            return
+        if not logger.isEnabledFor(level):
+            return
+        record = dict(self.fields, **fields)
+        record["stages_ms"] = dict(self.timings)
+        record["elapsed_ms"] = round((time.perf_counter() - self._started) * 1000, 3)
+        logger.log(level, event, extra={"fields": record})
+
+    def debug(self, event: str, **fields):
+        self._log(logging.DEBUG, event, fields)
+
+    def info(self, event: str, **fields):
+        self._log(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields):
+        self._log(logging.WARNING, event, fields)
+
+    def error(self, event: str, **fields):
+        self._log(logging.ERROR, event, fields)
+
+class _Stage:
+    def __init__(self, log: RequestLog, name: str):
+        self.log = log
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.log.timings[self.name] = round((time.perf_counter() - self.started) * 1000, 3)
@@ -1,21 +1,317 @@
 # backend/main.py
-import os, io, uuid, zipfile
+import os, io, json, asyncio, zipfile, threading
+from typing import List, Optional
 from fastapi import FastAPI, Form, File, UploadFile, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel
 
-from .chessperm import derive_master_key, derive_master_key_from_password
-from .kyber_kem import generate_keypair, encapsulate, decapsulate
+from .chessperm import MasterKeyCache, derive_master_key, derive_master_key_from_password, derive_legacy_master_key
+from .kyber_kem import KeypairReservoir, generate_keypair, encapsulate, decapsulate
 from .symcrypto import encrypt_message, decrypt_message
-from .stego import embed_data_in_image, extract_data_from_image
+from .stego import CoverCache, embed_data_in_image, extract_data_from_image
+from .zipstream import ZipStream, STORED
+from .logs import RequestLog
+from . import workers, logs, metrics
 
 app = FastAPI()
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
 
 BASE = os.path.dirname(__file__)
 COVER = os.path.join(BASE, "cover.png")
-TMP   = os.path.join(BASE, "tmp")
-os.makedirs(TMP, exist_ok=True)
+COVER_CACHE = CoverCache(COVER)
+
+# Largest accepted decrypt upload; starlette already spools uploads past 1 MiB to disk
+MAX_UPLOAD = int(os.environ.get("CHESSPERM_MAX_UPLOAD", 64 * 1024 * 1024))
+# Multipart framing and the text fields (starlette caps each at 1 MiB) on top of the file
+FORM_OVERHEAD = 1024 * 1024
+
+# Pre-generated Kyber keypairs; CHESSPERM_KEYPAIR_RESERVOIR=0 generates inline
+RESERVOIR_SIZE = int(os.environ.get("CHESSPERM_KEYPAIR_RESERVOIR", 32))
+RESERVOIR_LOW  = int(os.environ.get("CHESSPERM_KEYPAIR_LOW_WATER", RESERVOIR_SIZE // 4))
+KEYPAIRS = KeypairReservoir(capacity=RESERVOIR_SIZE, low_water=RESERVOIR_LOW) if RESERVOIR_SIZE > 0 else None
+
+# Derived master keys kept in memory; off unless CHESSPERM_KEY_CACHE gives a size
+KEY_CACHE_SIZE = int(os.environ.get("CHESSPERM_KEY_CACHE", 0))
+KEY_CACHE_TTL  = float(os.environ.get("CHESSPERM_KEY_CACHE_TTL", 300))
+KEY_CACHE = MasterKeyCache(KEY_CACHE_SIZE, KEY_CACHE_TTL) if KEY_CACHE_SIZE > 0 else None
+
+# Largest accepted /api/encrypt-batch request, and how many of its items are in the pipeline at once
+MAX_BATCH = int(os.environ.get("CHESSPERM_MAX_BATCH", 1000))
+BATCH_CONCURRENCY = int(os.environ.get("CHESSPERM_BATCH_CONCURRENCY", 2 * (workers.PROCESS_WORKERS or workers.THREAD_WORKERS)))
+
+# --- Pipeline stages, run on the worker pools (module-level so they pickle) ---
+
+def _derive(input_type: str, pgn: str, password: str) -> bytes:
+    if input_type == 'password':
+        return derive_master_key_from_password(password)
+    return derive_master_key(pgn)
+
+async def _master_key(input_type: str, pgn: str, password: str) -> bytes:
+    # Cache lookups stay on the event loop; only misses go to the process pool
+    if KEY_CACHE is None:
+        return await workers.processes.run(_derive, input_type, pgn, password)
+    mode, secret = ('password', password) if input_type == 'password' else ('pgn', pgn)
+    mk = KEY_CACHE.get(mode, secret)
+    if mk is None:
+        mk = await workers.processes.run(_derive, input_type, pgn, password)
+        KEY_CACHE.put(mode, secret, mk)
+    return mk
+
+def _kem_session():
+    pub, sec = KEYPAIRS.take() if KEYPAIRS else generate_keypair()
+    kem_ct, shared = encapsulate(pub)
+    return pub, sec, kem_ct, shared
+
+def _open_session(kem_ct: bytes, private_key: str) -> bytes:
+    return decapsulate(kem_ct, bytes.fromhex(private_key))
+
+def _symmetric_key(shared: bytes, mk: bytes) -> bytes:
+    # XOR with master key → symmetric key
+    if len(mk) < len(shared):
+        mk += b'\x00' * (len(shared) - len(mk))
+    return bytes(a ^ b for a, b in zip(shared, mk[:len(shared)]))
+
+def _embed_png(payload: bytes):
+    # → (PNG, pid, cover cache hit, capacity); a worker process fills its own COVER_CACHE,
+    # so the lookup is handed back for the parent's stats
+    cover, capacity, hit = COVER_CACHE.lookup()
+    if len(payload) > capacity:
+        raise ValueError(f"Message too long for cover image (max payload {capacity} bytes)")
+    buf = io.BytesIO()
+    embed_data_in_image(cover, payload, buf)
+    return buf.getvalue(), os.getpid(), hit, capacity
+
+@metrics.timed("decrypt.upload")
+def _extract_upload(src, is_zip: bool, req: RequestLog = None) -> bytes:
+    # Reads the stego payload from a spooled upload without copying it into memory
+    if not is_zip:
+        return extract_data_from_image(src, req=req)
+    try:
+        with zipfile.ZipFile(src) as zip_file:
+            if 'stego.png' not in zip_file.namelist():
+                raise HTTPException(400, "ZIP file does not contain stego.png")
+            with zip_file.open('stego.png') as member:
+                return extract_data_from_image(member, req=req)
+    except zipfile.BadZipFile:
+        raise HTTPException(400, "Invalid ZIP file")
+
+@metrics.timed("encrypt.package")
+def _write_package(archive: ZipStream, cover, payload: bytes, sec: bytes):
+    # ZIP { stego.png, private_key.txt }; the PNG is encoded straight into its (stored) entry
+    with archive.open("stego.png", level=STORED) as entry:
+        embed_data_in_image(cover, payload, entry)
+    archive.writestr("private_key.txt", sec.hex())
+    archive.close()
+
+async def _stream_archive(fill, *args):
+    # Runs fill(archive, *args) on the thread pool and yields the archive while it is
+    # being written; the writer blocks once a few chunks are waiting to be sent
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue(maxsize=4)
+    stopped = threading.Event()
+
+    def sink(data: bytes):
+        if stopped.is_set():
+            raise ConnectionError("Response closed")
+        asyncio.run_coroutine_threadsafe(chunks.put(data), loop).result()
+
+    writer = asyncio.ensure_future(workers.threads.run(fill, ZipStream(sink), *args))
+    writer.add_done_callback(lambda f: f.cancelled() or f.exception())
+    try:
+        while True:
+            get = asyncio.ensure_future(chunks.get())
+            await asyncio.wait({get, writer}, return_when=asyncio.FIRST_COMPLETED)
+            if get.done():
+                yield get.result()
+                continue
+            get.cancel()
+            # Every put finishes before the writer returns, so the queue holds the rest
+            while not chunks.empty():
+                yield chunks.get_nowait()
+            writer.result()
+            return
+    finally:
+        if not writer.done():
+            stopped.set()
+            while not chunks.empty():
+                chunks.get_nowait()
+
+def _check_input(input_type: str, pgn: str, password: str):
+    if input_type == 'password':
+        if not password:
+            raise HTTPException(400, "Password is required for password input type")
+    elif not pgn:
+        raise HTTPException(400, "PGN is required for PGN input type")
+
+class BatchItem(BaseModel):
+    message: str
+    # Setting any of these gives the item its own key input instead of the batch's;
+    # without input_type, an item with only a password (or only a PGN) is of that type
+    input_type: Optional[str] = None
+    pgn: Optional[str] = None
+    password: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    input_type: str = 'pgn'
+    pgn: Optional[str] = None
+    password: Optional[str] = None
+    items: List[BatchItem]
+
+def _key_input(batch: BatchRequest, item: BatchItem):
+    if item.input_type is None and item.pgn is None and item.password is None:
+        return batch.input_type, batch.pgn, batch.password
+    input_type = item.input_type
+    if input_type is None:
+        if item.password is not None and item.pgn is None:
+            input_type = 'password'
+        elif item.pgn is not None and item.password is None:
+            input_type = 'pgn'
+        else:
+            input_type = batch.input_type
+    return input_type, item.pgn, item.password
+
+async def _seal(mk: bytes, message: bytes):
+    # Steps 2-5 of /api/encrypt for one message → (stego PNG, secret key)
+    pub, sec, kem_ct, shared = await workers.threads.run(_kem_session)
+    key = _symmetric_key(shared, mk)
+    nonce, ct, tag = await workers.threads.run(encrypt_message, key, message)
+    png, pid, hit, capacity = await workers.processes.run(_embed_png, kem_ct + nonce + tag + ct)
+    if pid != os.getpid():
+        COVER_CACHE.count(hit, capacity)
+    return png, sec
+
+async def _batch_archive(batch: BatchRequest, req: RequestLog):
+    # Streams a ZIP of item_NNNNN/{stego.png, private_key.txt} (or error.txt) in completion order,
+    # then manifest.json; each distinct key input is derived once
+    gate = asyncio.Semaphore(BATCH_CONCURRENCY)
+    master_keys = {}
+
+    def master_key(key_input):
+        if key_input not in master_keys:
+            master_keys[key_input] = asyncio.ensure_future(_master_key(*key_input))
+        return master_keys[key_input]
+
+    async def run(index: int, item: BatchItem):
+        async with gate:
+            try:
+                key_input = _key_input(batch, item)
+                _check_input(*key_input)
+                png, sec = await _seal(await master_key(key_input), item.message.encode())
+                return index, png, sec, None
+            except HTTPException as e:
+                return index, None, None, e.detail
+            except Exception as e:
+                return index, None, None, str(e) or type(e).__name__
+
+    tasks = [asyncio.ensure_future(run(i, item)) for i, item in enumerate(batch.items)]
+    archive = ZipStream()
+    results = []
+    try:
+        with archive as z:
+            for next_done in asyncio.as_completed(tasks):
+                index, png, sec, error = await next_done
+                name = f"item_{index:05d}"
+                if error is None:
+                    z.writestr(f"{name}/stego.png", png, level=STORED)
+                    z.writestr(f"{name}/private_key.txt", sec.hex())
+                    results.append({"index": index, "ok": True, "path": f"{name}/"})
+                else:
+                    z.writestr(f"{name}/error.txt", error)
+                    results.append({"index": index, "ok": False, "error": error})
+                yield archive.drain()
+            results.sort(key=lambda r: r["index"])
+            ok = sum(r["ok"] for r in results)
+            z.writestr("manifest.json", json.dumps(
+                {"total": len(results), "succeeded": ok, "failed": len(results) - ok, "items": results}, indent=2))
+        req.info("encrypt-batch ok", succeeded=ok, failed=len(results) - ok)
+        yield archive.drain()
+    finally:
+        # Client went away or the archive failed: stop the remaining work
+        for task in tasks:
+            task.cancel()
+        for future in master_keys.values():
+            future.cancel()
+
+@app.on_event("startup")
+def _startup():
+    logs.setup()
+    if KEYPAIRS:
+        KEYPAIRS.start()
+
+@app.on_event("shutdown")
+def _shutdown_workers():
+    workers.shutdown()
+    if KEYPAIRS:
+        KEYPAIRS.stop()
+    if KEY_CACHE:
+        KEY_CACHE.clear()
+    logs.shutdown()
+
+async def _server_timing(request, call_next):
+    # Streamed bodies are still being written when the headers go out, so their
+    # stages (encrypt.package) only show up in /metrics
+    with metrics.request_spans() as spans:
+        response = await call_next(request)
+    if spans:
+        response.headers["Server-Timing"] = metrics.server_timing(spans)
+    return response
+
+class _BodyLimit:
+    # Rejects an oversized body before starlette parses (and spools) it: at once on
+    # Content-Length, or as soon as a chunked body passes the limit
+    def __init__(self, app, path: str, limit: int):
+        self.app = app
+        self.path = path
+        self.limit = limit
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            return await self.app(scope, receive, send)
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.limit:
+            RequestLog(self.path.rsplit("/", 1)[-1]).warning("upload rejected", status=413, upload_bytes=int(length))
+            response = JSONResponse({"detail": f"Request body too large: {int(length)} bytes (max {self.limit})"}, 413)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def capped():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > self.limit:
+                RequestLog(self.path.rsplit("/", 1)[-1]).warning("upload rejected", status=413, upload_bytes=received)
+                raise HTTPException(413, f"Request body too large: over {self.limit} bytes")
+            return message
+
+        await self.app(scope, capped, send)
+
+app.add_middleware(_BodyLimit, path="/api/decrypt", limit=MAX_UPLOAD + FORM_OVERHEAD)
+# Added after _BodyLimit so it wraps it: early 413s carry CORS headers too
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+
+if metrics.SERVER_TIMING:
+    app.middleware("http")(_server_timing)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/workers")
+async def worker_stats():
+    return workers.stats()
+
+@app.get("/api/keypairs")
+async def keypair_stats():
+    return KEYPAIRS.stats() if KEYPAIRS else {"enabled": False}
+
+@app.get("/api/key-cache")
+async def key_cache_stats():
+    return KEY_CACHE.stats() if KEY_CACHE else {"enabled": False}
+
+@app.get("/api/cover-cache")
+async def cover_cache_stats():
+    return COVER_CACHE.stats()
 
 @app.post("/api/encrypt")
 async def encrypt(
@@ -24,65 +320,60 @@ async def encrypt(
     password: str = Form(None),
     message: str = Form(...)
 ):
-    print("\n--- ENCRYPTION REQUEST ---")
-    print(f"Input type: {input_type}")
-    print(f"PGN: {pgn}")
-    print(f"Password: {password}")
-    print(f"Message: {message}")
-    # 1) ChessPerm → master key
-    if input_type == 'password':
-        if not password:
-            raise HTTPException(400, "Password is required for password input type")
-        mk = derive_master_key_from_password(password)
-    else:
-        if not pgn:
-            raise HTTPException(400, "PGN is required for PGN input type")
-        mk = derive_master_key(pgn)
-    print(f"Master key (hex): {mk.hex()}")
-    print(f"Master key length: {len(mk)} bytes")
-
-    # 2) Kyber512 KEM
-    pub, sec = generate_keypair()
-    print(f"Public key (hex, truncated): {pub.hex()[:32]}... (len={len(pub)})")
-    print(f"Secret key (hex, truncated): {sec.hex()[:32]}... (len={len(sec)})")
-    kem_ct, shared = encapsulate(pub)
-    print(f"KEM ciphertext (hex, truncated): {kem_ct.hex()[:32]}... (len={len(kem_ct)})")
-    print(f"Shared secret (hex): {shared.hex()}")
-    print(f"Shared secret length: {len(shared)} bytes")
+    req = RequestLog("encrypt")
+    req.set(input_type=input_type)
+    req.secret(pgn=pgn, password=password, message=message)
+    try:
+        _check_input(input_type, pgn, password)
 
-    # 3) XOR with master key → symmetric key
-    if len(mk) < len(shared):
-        mk += b'\x00' * (len(shared) - len(mk))
-    key = bytes(a ^ b for a, b in zip(shared, mk[:len(shared)]))
-    print(f"Symmetric key (hex): {key.hex()}")
-    print(f"Symmetric key length: {len(key)} bytes")
-
-    # 4) Encrypt payload
-    nonce, ct, tag = encrypt_message(key, message.encode())
-    print(f"Nonce (hex): {nonce.hex()}")
-    print(f"Tag (hex): {tag.hex()}")
-    print(f"Ciphertext (hex, truncated): {ct.hex()[:32]}... (len={len(ct)})")
-    payload = kem_ct + nonce + tag + ct
-    print(f"Payload total length: {len(payload)} bytes")
-
-    # 5) Stego-embed & write temp PNG
-    img_out = os.path.join(TMP, f"{uuid.uuid4()}.png")
-    embed_data_in_image(COVER, payload, img_out)
-
-    # 6) ZIP { stego.png, private_key.txt }
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, 'w') as z:
-        z.write(img_out, arcname="stego.png")
-        z.writestr("private_key.txt", sec.hex())
-    buf.seek(0)
+        # 1) ChessPerm → master key, 2) Kyber512 KEM, concurrently
+        mk, (pub, sec, kem_ct, shared) = await asyncio.gather(
+            req.timed("derive", _master_key(input_type, pgn, password)),
+            req.timed("kem", workers.threads.run(_kem_session)),
+        )
+        req.secret(master_key=mk, secret_key=sec, shared_secret=shared)
+
+        # 3) XOR with master key → symmetric key
+        key = _symmetric_key(shared, mk)
+        req.secret(symmetric_key=key)
 
-    print("--- ENCRYPTION COMPLETE ---\n")
+        # 4) Encrypt payload
+        nonce, ct, tag = await req.timed("encrypt", workers.threads.run(encrypt_message, key, message.encode()))
+        payload = kem_ct + nonce + tag + ct
+        req.set(ciphertext_len=len(ct), payload_len=len(payload))
+
+        # os.stat, and a full decode on a miss, stay off the event loop
+        cover, capacity, _ = await req.timed("cover", workers.threads.run(COVER_CACHE.lookup))
+        if len(payload) > capacity:
+            raise HTTPException(400, f"Message too long for cover image (max payload {capacity} bytes)")
+    except HTTPException as e:
+        req.warning("encrypt rejected", status=e.status_code, error=e.detail)
+        raise
+
+    # 5) + 6) Stego-embed into a ZIP streamed out as it is written
+    req.info("encrypt ok")
     return StreamingResponse(
-        buf,
+        _stream_archive(_write_package, cover, payload, sec),
         media_type="application/zip",
         headers={"Content-Disposition": "attachment; filename=chessperm_package.zip"}
     )
 
+@app.post("/api/encrypt-batch")
+async def encrypt_batch(batch: BatchRequest):
+    req = RequestLog("encrypt-batch")
+    req.set(items=len(batch.items))
+    if not batch.items:
+        req.warning("encrypt-batch rejected", status=400)
+        raise HTTPException(400, "Batch has no items")
+    if len(batch.items) > MAX_BATCH:
+        req.warning("encrypt-batch rejected", status=413)
+        raise HTTPException(413, f"Batch too large: {len(batch.items)} items (max {MAX_BATCH})")
+    return StreamingResponse(
+        _batch_archive(batch, req),
+        media_type="application/zip",
+        headers={"Content-Disposition": "attachment; filename=chessperm_batch.zip"}
+    )
+
 @app.post("/api/decrypt")
 async def decrypt(
     file: UploadFile = File(...),
@@ -91,40 +382,26 @@ async def decrypt(
     pgn: str           = Form(None),
     password: str      = Form(None)
 ):
-    print("\n--- DECRYPTION REQUEST ---")
-    print(f"Input type: {input_type}")
-    print(f"PGN: {pgn}")
-    print(f"Password: {password}")
-    print(f"Private key (truncated): {private_key[:32]}... (len={len(private_key)})")
+    req = RequestLog("decrypt")
+    req.set(input_type=input_type, filename=file.filename)
+    req.secret(pgn=pgn, password=password, private_key=private_key)
     try:
-        # 1) Handle file upload - could be ZIP or PNG
-        data = await file.read()
-        print(f"Received file: {file.filename}, size: {len(data)} bytes")
-        
-        # Check if it's a ZIP file
-        if file.filename and (file.filename.endswith('.zip') or file.content_type == 'application/zip'):
-            try:
-                with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
-                    if 'stego.png' not in zip_file.namelist():
-                        print("ZIP file does not contain stego.png")
-                        raise HTTPException(400, "ZIP file does not contain stego.png")
-                    data = zip_file.read('stego.png')
-                print("Extracted stego.png from ZIP")
-            except zipfile.BadZipFile:
-                print("Invalid ZIP file")
-                raise HTTPException(400, "Invalid ZIP file")
-        
-        # 2) Save & extract stego
-        img_in = os.path.join(TMP, f"{uuid.uuid4()}.png")
-        with open(img_in, "wb") as f: 
-            f.write(data)
-        print(f"Saved stego image to: {img_in}")
-        
-        # Extract data from stego image
-        blob = extract_data_from_image(img_in)
-        print(f"Extracted blob length: {len(blob)}")
+        _check_input(input_type, pgn, password)
+
+        # 1) Handle file upload - could be ZIP or PNG; read it in place from the spool
+        src = file.file
+        src.seek(0, os.SEEK_END)
+        size = src.tell()
+        src.seek(0)
+        req.set(upload_bytes=size)
+        if size > MAX_UPLOAD:
+            raise HTTPException(413, f"Upload too large: {size} bytes (max {MAX_UPLOAD})")
+        is_zip = bool(file.filename and (file.filename.endswith('.zip') or file.content_type == 'application/zip'))
+
+        # 2) Extract data from stego image (file objects don't pickle, so use the thread pool)
+        blob = await req.timed("extract", workers.threads.run(_extract_upload, src, is_zip, req))
+        req.set(blob_len=len(blob))
         if not blob:
-            print("No data found in stego image")
             raise HTTPException(400, "No data found in stego image")
 
         # 3) Chop into (KEM_CT | nonce | tag | ct)
@@ -133,59 +410,54 @@ async def decrypt(
         LEN_TAG   = 16
         
         if len(blob) < LEN_KEM + LEN_NONCE + LEN_TAG:
-            print(f"Invalid data length: {len(blob)} bytes")
             raise HTTPException(400, f"Invalid data length: {len(blob)} bytes")
             
         kem_ct    = blob[:LEN_KEM]
         nonce     = blob[LEN_KEM:LEN_KEM+LEN_NONCE]
         tag       = blob[LEN_KEM+LEN_NONCE:LEN_KEM+LEN_NONCE+LEN_TAG]
         ct        = blob[LEN_KEM+LEN_NONCE+LEN_TAG:]
-        print(f"KEM_CT: {kem_ct.hex()[:32]}... (len={len(kem_ct)})")
-        print(f"Nonce: {nonce.hex()}")
-        print(f"Tag: {tag.hex()}")
-        print(f"Ciphertext: {ct.hex()[:32]}... (len={len(ct)})")
+        req.set(ciphertext_len=len(ct))
 
-        # 4) Decapsulate + rederive symmetric key
-        try:
-            shared = decapsulate(kem_ct, bytes.fromhex(private_key))
-            print(f"Shared secret (hex): {shared.hex()}")
-        except Exception as e:
-            print(f"KEM decapsulation failed: {e}")
-            raise HTTPException(400, f"KEM decapsulation failed: {str(e)}")
-        if input_type == 'password':
-            if not password:
-                raise HTTPException(400, "Password is required for password input type")
-            mk = derive_master_key_from_password(password)
-        else:
-            if not pgn:
-                raise HTTPException(400, "PGN is required for PGN input type")
-            mk = derive_master_key(pgn)
-        if len(mk) < len(shared):
-            mk += b'\x00' * (len(shared) - len(mk))
-        key = bytes(a ^ b for a, b in zip(shared, mk[:len(shared)]))
-        print(f"Symmetric key (hex): {key.hex()}")
-
-        # 5) Decrypt & return
+        # 4) Decapsulate + rederive symmetric key, concurrently
+        shared, mk = await asyncio.gather(
+            req.timed("kem", workers.threads.run(_open_session, kem_ct, private_key)),
+            req.timed("derive", _master_key(input_type, pgn, password)),
+            return_exceptions=True,
+        )
+        if isinstance(shared, Exception):
+            raise HTTPException(400, f"KEM decapsulation failed: {str(shared)}")
+        if isinstance(mk, Exception):
+            raise mk
+        key = _symmetric_key(shared, mk)
+        req.secret(shared_secret=shared, master_key=mk, symmetric_key=key)
+
+        # 5) Decrypt & return; packages sealed from annotated PGNs before the PGN lexer
+        #    landed open with the legacy key instead
         try:
-            pt = decrypt_message(key, nonce, ct, tag)
-            print(f"Decrypted message: {pt.decode()}")
-            print("--- DECRYPTION COMPLETE ---\n")
-            return {"message": pt.decode()}
+            try:
+                pt = await req.timed("decrypt", workers.threads.run(decrypt_message, key, nonce, ct, tag))
+            except ValueError:
+                if input_type == 'password':
+                    raise
+                legacy = await req.timed("derive_legacy", workers.processes.run(derive_legacy_master_key, pgn))
+                if legacy is None:
+                    raise
+                key = _symmetric_key(shared, legacy)
+                req.secret(master_key=legacy, symmetric_key=key)
+                pt = await req.timed("decrypt_legacy", workers.threads.run(decrypt_message, key, nonce, ct, tag))
+                req.set(legacy_key=True)
+            message = pt.decode()  # UnicodeDecodeError is a ValueError too
         except ValueError as e:
-            print(f"Decryption failed: {e}")
             raise HTTPException(400, f"Decryption failed: {e}")
         except Exception as e:
-            print(f"Decryption error: {e}")
             raise HTTPException(400, f"Decryption error: {str(e)}")
-            
-    except HTTPException:
+        req.secret(message=message)
+        req.info("decrypt ok")
+        return {"message": message}
+
+    except HTTPException as e:
+        req.warning("decrypt rejected", status=e.status_code, error=e.detail)
         raise
     except Exception as e:
-        print(f"Internal server error: {e}")
+        req.error("decrypt failed", status=500, error=str(e))
         raise HTTPException(500, f"Internal server error: {str(e)}")
-    finally:
-        try:
-            if 'img_in' in locals():
-                os.remove(img_in)
-        except:
-            pass
@@ -0,0 +1,154 @@
+# backend/metrics.py
+import os
+import time
+import bisect
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+
+# CHESSPERM_METRICS=0 turns spans into no-ops (timed() then returns the function untouched)
+# CHESSPERM_SERVER_TIMING=1 adds a Server-Timing header with the request's spans
+ENABLED = os.environ.get("CHESSPERM_METRICS", "1") != "0"
+SERVER_TIMING = ENABLED and os.environ.get("CHESSPERM_SERVER_TIMING", "0") == "1"
+
+# Prometheus client defaults, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Cumulative-bucket latency histogram for one stage."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += seconds
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+# Worker-side buffer (see collect) and the current request's spans (see request_spans)
+_local = threading.local()
+_request = contextvars.ContextVar("chessperm_request_spans", default=None)
+
+def _histogram(name: str) -> Histogram:
+    h = _histograms.get(name)
+    if h is None:
+        with _histograms_lock:
+            h = _histograms.setdefault(name, Histogram())
+    return h
+
+def record(name: str, seconds: float):
+    pending = getattr(_local, "pending", None)
+    if pending is not None:
+        pending.append((name, seconds))
+        return
+    _histogram(name).observe(seconds)
+    spans = _request.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+def merge(spans):
+    """Record spans collected elsewhere (a worker thread or process)."""
+    for name, seconds in spans or ():
+        record(name, seconds)
+
+@contextmanager
+def collect():
+    # Buffer this thread's spans instead of recording them, so a worker can return
+    # them with its result and the caller records them in the request's context
+    previous = getattr(_local, "pending", None)
+    _local.pending = spans = []
+    try:
+        yield spans
+    finally:
+        _local.pending = previous
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.started)
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+_NO_SPAN = _NoSpan()
+
+def span(name: str):
+    """Context manager timing a block as stage `name`."""
+    return _Span(name) if ENABLED else _NO_SPAN
+
+def timed(name: str):
+    """Decorator timing every call of a function as stage `name`."""
+    def decorate(fn):
+        if not ENABLED:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+@contextmanager
+def request_spans():
+    """Collect the spans recorded while handling one request (for Server-Timing)."""
+    spans = []
+    token = _request.set(spans)
+    try:
+        yield spans
+    finally:
+        _request.reset(token)
+
+def server_timing(spans) -> str:
+    totals = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in totals.items())
+
+def render() -> str:
+    """All stage histograms in the Prometheus text exposition format."""
+    lines = [
+        "# HELP chessperm_stage_seconds Time spent in each encrypt/decrypt pipeline stage.",
+        "# TYPE chessperm_stage_seconds histogram",
+    ]
+    for name in sorted(_histograms):
+        h = _histograms[name]
+        counts, total, count = h.snapshot()
+        cumulative = 0
+        for bound, n in zip(h.buckets, counts):
+            cumulative += n
+            lines.append(f'chessperm_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'chessperm_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+        lines.append(f'chessperm_stage_seconds_sum{{stage="{name}"}} {total}')
+        lines.append(f'chessperm_stage_seconds_count{{stage="{name}"}} {count}')
+    return "\n".join(lines) + "\n"
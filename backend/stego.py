@@ -1,13 +1,321 @@
+import io
+import os
+import struct
+import threading
+import zlib
+import numpy as np
 from PIL import Image
+try:
+    from . import metrics
+    from .logs import logger
+except ImportError:
+    import metrics
+    from logs import logger
 
+# Legacy framing: payload bits followed by this terminator
 _TERMINATOR = '1111111111111110'
 
-def embed_data_in_image(input_path: str, data: bytes, output_path: str) -> str:
-    img = Image.open(input_path)
+# Current framing: header (magic, version, flags, payload length) [+ CRC32] + payload
+_MAGIC = b'CPSG'
+_VERSION = 1
+_FLAG_CRC = 0x01
+_HEADER = struct.Struct('>4sBBI')
+_CRC = struct.Struct('>I')
+
+# "numpy" (vectorized, default) or "python" (reference per-pixel loops)
+DEFAULT_ENGINE = "numpy"
+
+def _frame(data: bytes, crc: bool = True) -> bytes:
+    header = _HEADER.pack(_MAGIC, _VERSION, _FLAG_CRC if crc else 0, len(data))
+    if crc:
+        header += _CRC.pack(zlib.crc32(data))
+    return header + data
+
+def _open(src):
+    # Accepts a path, raw PNG bytes, a file-like object, an already-open Image
+    # or an (h, w, channels) pixel array, which is passed through untouched
+    if isinstance(src, (Image.Image, np.ndarray)):
+        return src
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        src = io.BytesIO(src)
+    return Image.open(src)
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_CHUNK = struct.Struct('>I4s')
+_PNG_IHDR = struct.Struct('>IIBBBBB')
+_PNG_CHANNELS = {2: 3, 6: 4}  # colour type -> channels (8-bit RGB / RGBA)
+
+class _PngRows:
+    """Incremental decoder for 8-bit, non-interlaced RGB/RGBA PNG streams.
+
+    IDAT data is inflated and unfiltered one scanline at a time, and only
+    as many rows as the requested LSBs need are ever decoded. `fp` must be
+    seekable, so that whole-image reads can go back through PIL.
+    """
+
+    def __init__(self, fp, start: int, width: int, height: int, channels: int):
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self._fp = fp
+        self._start = start
+        self._rows = self._decode_rows()
+        self._bits = []
+        self._nbits = 0
+        self._image = None
+        self.rows_decoded = 0
+
+    def _idat(self):
+        while True:
+            head = self._fp.read(_PNG_CHUNK.size)
+            if len(head) < _PNG_CHUNK.size:
+                raise ValueError("Truncated PNG stream")
+            length, kind = _PNG_CHUNK.unpack(head)
+            if kind == b'IEND':
+                return
+            if kind == b'IDAT':
+                while length:
+                    piece = self._fp.read(min(length, 64 * 1024))
+                    if not piece:
+                        raise ValueError("Truncated PNG stream")
+                    length -= len(piece)
+                    yield piece
+            else:
+                self._fp.read(length)
+            self._fp.read(4)  # chunk CRC
+
+    def _decode_rows(self):
+        bpp = self.channels
+        stride = self.width * bpp
+        prev = np.zeros(stride, dtype=np.uint8)
+        inflate = zlib.decompressobj()
+        buf = bytearray()
+
+        def rows():
+            nonlocal prev
+            while len(buf) > stride:
+                row = _unfilter(buf[0], np.frombuffer(bytes(buf[1:stride + 1]), dtype=np.uint8), prev, bpp)
+                del buf[:stride + 1]
+                prev = row
+                yield row
+
+        for piece in self._idat():
+            while piece:
+                buf += inflate.decompress(piece, 4 * (stride + 1))
+                piece = inflate.unconsumed_tail
+                yield from rows()
+        buf += inflate.flush()
+        yield from rows()
+
+    def lsb_bits(self, nbits: int) -> np.ndarray:
+        # LSBs of the first three channels, row-major, decoding rows only as needed
+        if self._image is not None:
+            return _lsb_bits(self._image, nbits)
+        while self._nbits < nbits and self.rows_decoded < self.height:
+            row = next(self._rows, None)
+            if row is None:
+                raise ValueError("PNG stream ended before its last row")
+            bits = row.reshape(self.width, self.channels)[:, :3].reshape(-1) & 1
+            self._bits.append(bits)
+            self._nbits += len(bits)
+            self.rows_decoded += 1
+        if len(self._bits) > 1:
+            self._bits = [np.concatenate(self._bits)]
+        return self._bits[0][:nbits] if self._bits else np.zeros(0, dtype=np.uint8)
+
+    def to_image(self) -> Image.Image:
+        # Whole image decoded once by PIL, for the python engine and the legacy full scan
+        if self._image is None:
+            self._fp.seek(self._start)
+            image = Image.open(self._fp)
+            image.load()
+            self._image = image
+        return self._image
+
+def _unfilter(kind: int, row: np.ndarray, prev: np.ndarray, bpp: int) -> np.ndarray:
+    if kind == 0:
+        return row
+    if kind == 1:  # Sub: running sum per channel, wrapping at 256
+        return np.cumsum(row.reshape(-1, bpp), axis=0, dtype=np.uint8).reshape(-1)
+    if kind == 2:  # Up
+        return row + prev
+    if kind in (3, 4):
+        # Average and Paeth depend on the byte just decoded, so no numpy form; PIL's
+        # zip decoder unfilters the row in C, with `prev` as an unfiltered row above it
+        data = zlib.compress(b'\0' + prev.tobytes() + bytes([kind]) + row.tobytes(), 0)
+        mode = 'RGBA' if bpp == 4 else 'RGB'
+        pair = Image.frombytes(mode, (len(row) // bpp, 2), data, 'zip', mode, 0)
+        return np.asarray(pair)[1].reshape(-1)
+    raise ValueError(f"Unknown PNG filter type: {kind}")
+
+def _open_for_read(src):
+    # Like _open, but PNG streams the row decoder can handle are read lazily
+    if isinstance(src, (Image.Image, np.ndarray)):
+        return src
+    fp = io.BytesIO(src) if isinstance(src, (bytes, bytearray, memoryview)) else src
+    start = fp.tell() if fp.seekable() else None
+    head = fp.read(len(_PNG_SIGNATURE) + _PNG_CHUNK.size + _PNG_IHDR.size)
+    if (start is not None and head.startswith(_PNG_SIGNATURE)
+            and len(head) == len(_PNG_SIGNATURE) + _PNG_CHUNK.size + _PNG_IHDR.size):
+        _, kind = _PNG_CHUNK.unpack_from(head, len(_PNG_SIGNATURE))
+        w, h, depth, colour, _, _, interlace = _PNG_IHDR.unpack_from(head, len(_PNG_SIGNATURE) + _PNG_CHUNK.size)
+        if kind == b'IHDR' and depth == 8 and colour in _PNG_CHANNELS and interlace == 0:
+            # Same decompression-bomb limit PIL applies, checked before anything is inflated
+            if Image.MAX_IMAGE_PIXELS and w * h > Image.MAX_IMAGE_PIXELS:
+                raise Image.DecompressionBombError(
+                    f"Image size ({w * h} pixels) exceeds limit of {Image.MAX_IMAGE_PIXELS} pixels")
+            fp.read(4)  # IHDR CRC
+            return _PngRows(fp, start, w, h, _PNG_CHANNELS[colour])
+    # Anything else goes through PIL
+    if start is not None:
+        fp.seek(start)
+    else:
+        fp = io.BytesIO(head + fp.read())
+    return Image.open(fp)
+
+def _as_image(img) -> Image.Image:
+    if isinstance(img, _PngRows):
+        return img.to_image()
+    return Image.fromarray(img) if isinstance(img, np.ndarray) else img
+
+def _size(img) -> tuple:
+    if isinstance(img, _PngRows):
+        return img.width, img.height
+    return (img.shape[1], img.shape[0]) if isinstance(img, np.ndarray) else img.size
+
+def _lsb_plane(img) -> np.ndarray:
+    # Writable (h, w, channels) copy; only the first three channels carry payload bits
+    arr = np.array(img)
+    if arr.ndim != 3 or arr.shape[2] < 3:
+        raise ValueError(f"Unsupported image for stego: shape {arr.shape}")
+    return arr
+
+def capacity(src, crc: bool = True) -> int:
+    """Largest payload in bytes that fits in the cover `src`."""
+    w, h = _size(_open(src))
+    overhead = _HEADER.size + (_CRC.size if crc else 0)
+    return max(w * h * 3 // 8 - overhead, 0)
+
+class CoverCache:
+    """Process-wide cache of a decoded cover image.
+
+    The pixels are kept as a read-only array; `get()` and `lookup()` hand
+    out read-only views, so embedding copies them only when it writes. The
+    file is re-decoded whenever its mtime changes, so call them off the
+    event loop. Worker processes each hold their
+    own copy; `count()` folds their lookups into this one's stats.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.last_hit = None
+        self.capacity = 0
+        self._pixels = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self) -> np.ndarray:
+        return self.lookup()[0]
+
+    def lookup(self) -> tuple:
+        """(pixels, capacity, hit) of one lookup, taken together under the lock."""
+        mtime = os.stat(self.path).st_mtime_ns
+        with self._lock:
+            if self._pixels is None or mtime != self._mtime:
+                with Image.open(self.path) as img:
+                    pixels = _lsb_plane(img)
+                pixels.flags.writeable = False
+                self._pixels, self._mtime = pixels, mtime
+                self.capacity = capacity(pixels)
+                self.misses += 1
+                self.last_hit = False
+            else:
+                self.hits += 1
+                self.last_hit = True
+            return self._pixels.view(), self.capacity, self.last_hit
+
+    def count(self, hit: bool, capacity: int):
+        """Record a lookup made by another process's copy of this cache."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.last_hit = hit
+            if self._pixels is None:
+                self.capacity = capacity
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "loaded": self._pixels is not None,
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+# --- numpy engine ---
+
+def _embed_numpy(img, stream: bytes) -> Image.Image:
+    arr = _lsb_plane(img)
+    bits = np.unpackbits(np.frombuffer(stream, dtype=np.uint8))
+
+    rgb = arr[..., :3].reshape(-1)  # copy for RGBA, view for RGB
+    if len(bits) > rgb.size:
+        raise ValueError(f"Payload needs {len(bits)} bits, cover holds {rgb.size}")
+    rgb[:len(bits)] = (rgb[:len(bits)] & 0xFE) | bits
+    arr[..., :3] = rgb.reshape(arr.shape[0], arr.shape[1], 3)
+    return Image.fromarray(arr)
+
+def _lsb_bits(img, nbits: int) -> np.ndarray:
+    if isinstance(img, _PngRows):
+        return img.lsb_bits(nbits)
+    # Only convert the rows that hold the requested bits
+    w, h = _size(img)
+    rows = min(-(-nbits // (3 * w)), h)
+    arr = _lsb_plane(img[:rows] if isinstance(img, np.ndarray) else img.crop((0, 0, w, rows)))
+    return arr[..., :3].reshape(-1)[:nbits] & 1
+
+def _read_numpy(img, nbytes: int) -> bytes:
+    bits = _lsb_bits(img, nbytes * 8)
+    return np.packbits(bits[:len(bits) - len(bits) % 8]).tobytes()
+
+def _scan_numpy(img) -> bytes:
+    # The legacy scan reads every pixel, so decode with PIL rather than row by row
+    if isinstance(img, _PngRows):
+        img = img.to_image()
+    w, h = _size(img)
+    bits = _lsb_bits(img, w * h * 3)
+
+    # The terminator is 15 ones then a zero: find the first zero preceded by 15 ones
+    zeros = np.flatnonzero(bits[15:] == 0) + 15
+    if not len(zeros):
+        return b''
+    ones = np.concatenate(([0], np.cumsum(bits, dtype=np.int64)))
+    hits = zeros[ones[zeros] - ones[zeros - 15] == 15]
+    if not len(hits):
+        return b''
+
+    data_bits = bits[:hits[0] - 15]
+    # Ensure we have complete bytes
+    if len(data_bits) % 8 != 0:
+        return b''
+    return np.packbits(data_bits).tobytes()
+
+# --- python engine ---
+
+def _embed_python(img, stream: bytes) -> Image.Image:
+    img = _as_image(img)
     encoded = img.copy()
     w, h = img.size
 
-    bits = ''.join(f'{b:08b}' for b in data) + _TERMINATOR
+    bits = ''.join(f'{b:08b}' for b in stream)
+    if len(bits) > w * h * 3:
+        raise ValueError(f"Payload needs {len(bits)} bits, cover holds {w * h * 3}")
     idx = 0
 
     for y in range(h):
@@ -22,30 +330,105 @@ def embed_data_in_image(input_path: str, data: bytes, output_path: str) -> str:
             encoded.putpixel((x, y), tuple(px))
         if idx >= len(bits):
             break
+    return encoded
 
-    encoded.save(output_path)
-    return output_path
+def _read_python(img, nbytes: int) -> bytes:
+    img = _as_image(img)
+    out = bytearray()
+    byte = nbits = 0
 
-def extract_data_from_image(input_path: str) -> bytes:
+    for y in range(img.height):
+        for x in range(img.width):
+            px = img.getpixel((x, y))
+            for i in range(3):
+                byte = (byte << 1) | (px[i] & 1)
+                nbits += 1
+                if nbits == 8:
+                    out.append(byte)
+                    if len(out) == nbytes:
+                        return bytes(out)
+                    byte = nbits = 0
+    return bytes(out)
+
+def _scan_python(img) -> bytes:
+    img = _as_image(img)
+    bits = ''
+
+    for y in range(img.height):
+        for x in range(img.width):
+            px = img.getpixel((x, y))
+            for i in range(3):
+                bits += str(px[i] & 1)
+                if bits.endswith(_TERMINATOR):
+                    data_bits = bits[:-len(_TERMINATOR)]
+                    # Ensure we have complete bytes
+                    if len(data_bits) % 8 != 0:
+                        return b''
+                    return bytes(
+                        int(data_bits[i:i+8], 2)
+                        for i in range(0, len(data_bits), 8)
+                    )
+    return b''
+
+# engine name -> (embed stream, read first n bytes, legacy terminator scan)
+_ENGINES = {
+    "numpy": (_embed_numpy, _read_numpy, _scan_numpy),
+    "python": (_embed_python, _read_python, _scan_python),
+}
+
+def _extract(img, engine: str) -> bytes:
+    _, read, scan = _ENGINES[engine]
+
+    header = read(img, _HEADER.size)
+    if len(header) < _HEADER.size or header[:len(_MAGIC)] != _MAGIC:
+        # No header: fall back to legacy terminator-framed images
+        return scan(img)
+
+    _, version, flags, length = _HEADER.unpack(header)
+    if version != _VERSION:
+        raise ValueError(f"Unsupported stego format version: {version}")
+    offset = _HEADER.size + (_CRC.size if flags & _FLAG_CRC else 0)
+    w, h = _size(img)
+    if (offset + length) * 8 > w * h * 3:
+        raise ValueError(f"Stego header claims {length} bytes, more than the image holds")
+
+    stream = read(img, offset + length)
+    data = stream[offset:]
+    if flags & _FLAG_CRC:
+        (crc,) = _CRC.unpack(stream[_HEADER.size:offset])
+        if zlib.crc32(data) != crc:
+            raise ValueError("Stego payload CRC mismatch")
+    return data
+
+@metrics.timed("stego.embed")
+def embed_data_in_image(src, data: bytes, output=None,
+                        engine: str = None, crc: bool = True):
+    """Embed data into the cover `src` (path, bytes, file-like, Image or array).
+
+    With no `output` the stego Image is returned; a path or file-like
+    `output` receives the PNG and is returned.
+    """
+    embed, _, _ = _ENGINES[engine or DEFAULT_ENGINE]
+    encoded = embed(_open(src), _frame(data, crc))
+    if output is None:
+        return encoded
+    if isinstance(output, (str, os.PathLike)):
+        encoded.save(output)
+    else:
+        encoded.save(output, format="PNG")
+    return output
+
+@metrics.timed("stego.extract")
+def extract_data_from_image(src, engine: str = None, req=None) -> bytes:
+    # Returns b'' when no payload can be read; the reason goes to the log, and to req (a RequestLog) if given
     try:
-        img = Image.open(input_path)
-        bits = ''
-
-        for y in range(img.height):
-            for x in range(img.width):
-                px = img.getpixel((x, y))
-                for i in range(3):
-                    bits += str(px[i] & 1)
-                    if bits.endswith(_TERMINATOR):
-                        data_bits = bits[:-len(_TERMINATOR)]
-                        # Ensure we have complete bytes
-                        if len(data_bits) % 8 != 0:
-                            return b''
-                        return bytes(
-                            int(data_bits[i:i+8], 2)
-                            for i in range(0, len(data_bits), 8)
-                        )
-        return b''
+        if isinstance(src, (str, os.PathLike)):
+            with open(src, 'rb') as fp:
+                return _extract(_open_for_read(fp), engine or DEFAULT_ENGINE)
+        return _extract(_open_for_read(src), engine or DEFAULT_ENGINE)
     except Exception as e:
-        print(f"Error extracting data from image: {e}")
+        reason = f"{type(e).__name__}: {e}"
+        logger.warning("stego extraction failed: %s", reason)
+        if req is not None:
+            req.set(extract_error=reason)
         return b''
@@ -1,10 +1,194 @@
+import struct
 from Crypto.Cipher import ChaCha20_Poly1305
+from Crypto.Random import get_random_bytes
+try:
+    from . import metrics
+except ImportError:
+    import metrics
 
+@metrics.timed("chacha20.encrypt")
 def encrypt_message(key: bytes, plaintext: bytes):
     cipher = ChaCha20_Poly1305.new(key=key)
     ciphertext, tag = cipher.encrypt_and_digest(plaintext)
     return cipher.nonce, ciphertext, tag
 
+@metrics.timed("chacha20.decrypt")
 def decrypt_message(key: bytes, nonce: bytes, ciphertext: bytes, tag: bytes):
     cipher = ChaCha20_Poly1305.new(key=key, nonce=nonce)
     return cipher.decrypt_and_verify(ciphertext, tag)
+
+# === Segmented streaming AEAD ===
+#
+# header = magic | version | chunk_size (u32) | base nonce (12 bytes)
+# body   = chunk_0 | chunk_1 | ... | final chunk, each chunk = ciphertext | tag (16 bytes)
+#
+# Every chunk except the last carries exactly chunk_size plaintext bytes; the
+# final chunk carries fewer (possibly zero), so truncation at a chunk boundary
+# is detected. Chunk i is sealed under nonce = base_nonce XOR (i << 8 | final)
+# with the header as associated data.
+
+STREAM_MAGIC = b'CPSA'
+STREAM_VERSION = 1
+DEFAULT_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+_STREAM_HEADER = struct.Struct('>4sBI12s')
+_TAG_LEN = 16
+
+def _chunk_nonce(base_nonce: bytes, counter: int, final: bool) -> bytes:
+    if counter >= 1 << 64:
+        raise OverflowError("Too many chunks in stream")
+    mixed = int.from_bytes(base_nonce, 'big') ^ ((counter << 8) | int(final))
+    return mixed.to_bytes(12, 'big')
+
+class StreamEncryptor:
+    """Incremental encryptor: header(), then update() per piece, then finalize()."""
+
+    def __init__(self, key: bytes, chunk_size: int = DEFAULT_CHUNK_SIZE, nonce: bytes = None):
+        if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(f"Invalid chunk size: {chunk_size}")
+        if nonce is None:
+            nonce = get_random_bytes(12)
+        elif len(nonce) != 12:
+            # The header stores exactly 12 bytes; any other length could never be decrypted
+            raise ValueError(f"Invalid stream nonce length: {len(nonce)} (expected 12)")
+        self._key = key
+        self.chunk_size = chunk_size
+        self.nonce = bytes(nonce)
+        self._header = _STREAM_HEADER.pack(STREAM_MAGIC, STREAM_VERSION, chunk_size, self.nonce)
+        self._buf = bytearray()
+        self._counter = 0
+        self._finalized = False
+
+    def header(self) -> bytes:
+        return self._header
+
+    def _seal(self, chunk: bytes, final: bool) -> bytes:
+        cipher = ChaCha20_Poly1305.new(key=self._key, nonce=_chunk_nonce(self.nonce, self._counter, final))
+        cipher.update(self._header)
+        ciphertext, tag = cipher.encrypt_and_digest(chunk)
+        self._counter += 1
+        return ciphertext + tag
+
+    def update(self, data: bytes) -> bytes:
+        if self._finalized:
+            raise ValueError("Stream already finalized")
+        self._buf += data
+        out = []
+        # Keep at least one byte back: a full chunk is never the final one
+        while len(self._buf) > self.chunk_size:
+            out.append(self._seal(bytes(self._buf[:self.chunk_size]), False))
+            del self._buf[:self.chunk_size]
+        return b''.join(out)
+
+    def finalize(self) -> bytes:
+        if self._finalized:
+            raise ValueError("Stream already finalized")
+        self._finalized = True
+        out = b''
+        if len(self._buf) == self.chunk_size:
+            out = self._seal(bytes(self._buf), False)
+            self._buf.clear()
+        out += self._seal(bytes(self._buf), True)
+        self._buf.clear()
+        return out
+
+class StreamDecryptor:
+    """Incremental decryptor: update() returns plaintext of each verified chunk.
+
+    Raises ValueError as soon as a chunk fails authentication; finalize()
+    raises if the stream ended without its final chunk.
+    """
+
+    def __init__(self, key: bytes):
+        self._key = key
+        self._header = None
+        self.chunk_size = None
+        self.nonce = None
+        self._buf = bytearray()
+        self._counter = 0
+        self._finalized = False
+
+    def _open(self, sealed: bytes, final: bool) -> bytes:
+        cipher = ChaCha20_Poly1305.new(key=self._key, nonce=_chunk_nonce(self.nonce, self._counter, final))
+        cipher.update(self._header)
+        plaintext = cipher.decrypt_and_verify(sealed[:-_TAG_LEN], sealed[-_TAG_LEN:])
+        self._counter += 1
+        return plaintext
+
+    def update(self, data: bytes) -> bytes:
+        if self._finalized:
+            raise ValueError("Stream already finalized")
+        self._buf += data
+        if self._header is None:
+            if len(self._buf) < _STREAM_HEADER.size:
+                return b''
+            self._header = bytes(self._buf[:_STREAM_HEADER.size])
+            magic, version, self.chunk_size, self.nonce = _STREAM_HEADER.unpack(self._header)
+            if magic != STREAM_MAGIC or version != STREAM_VERSION:
+                raise ValueError("Not a ChessPerm AEAD stream")
+            if not 0 < self.chunk_size <= MAX_CHUNK_SIZE:
+                raise ValueError(f"Invalid chunk size in stream header: {self.chunk_size}")
+            del self._buf[:_STREAM_HEADER.size]
+
+        sealed_size = self.chunk_size + _TAG_LEN
+        out = []
+        # A full-size chunk is never final, but only open it once more data follows
+        while len(self._buf) > sealed_size:
+            out.append(self._open(bytes(self._buf[:sealed_size]), False))
+            del self._buf[:sealed_size]
+        return b''.join(out)
+
+    def finalize(self) -> bytes:
+        if self._finalized:
+            raise ValueError("Stream already finalized")
+        self._finalized = True
+        if self._header is None or len(self._buf) < _TAG_LEN:
+            raise ValueError("Truncated AEAD stream")
+        if len(self._buf) == self.chunk_size + _TAG_LEN:
+            # A full-size chunk is never final
+            raise ValueError("Truncated AEAD stream: missing final chunk")
+        out = self._open(bytes(self._buf), True)
+        self._buf.clear()
+        return out
+
+def encrypt_stream(key: bytes, src, dst, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Encrypt file-like `src` into file-like `dst` with memory bounded by chunk_size."""
+    enc = StreamEncryptor(key, chunk_size)
+    dst.write(enc.header())
+    while True:
+        piece = src.read(chunk_size)
+        if not piece:
+            break
+        dst.write(enc.update(piece))
+    dst.write(enc.finalize())
+
+def decrypt_stream(key: bytes, src, dst, read_size: int = DEFAULT_CHUNK_SIZE):
+    """Decrypt file-like `src` into file-like `dst`; raises ValueError on tampering."""
+    dec = StreamDecryptor(key)
+    while True:
+        piece = src.read(read_size)
+        if not piece:
+            break
+        dst.write(dec.update(piece))
+    dst.write(dec.finalize())
+
+async def encrypt_aiter(key: bytes, source, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """Async generator: encrypt the byte pieces of async iterable `source`."""
+    enc = StreamEncryptor(key, chunk_size)
+    yield enc.header()
+    async for piece in source:
+        out = enc.update(piece)
+        if out:
+            yield out
+    yield enc.finalize()
+
+async def decrypt_aiter(key: bytes, source):
+    """Async generator: decrypt an AEAD stream arriving as async iterable `source`."""
+    dec = StreamDecryptor(key)
+    async for piece in source:
+        out = dec.update(piece)
+        if out:
+            yield out
+    out = dec.finalize()
+    if out:
+        yield out
@@ -0,0 +1,108 @@
+# backend/workers.py
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from . import metrics
+
+# Pool sizes; CHESSPERM_PROCESS_WORKERS=0 runs "process" work on the thread pool
+THREAD_WORKERS  = int(os.environ.get("CHESSPERM_THREAD_WORKERS", min(32, (os.cpu_count() or 1) + 4)))
+PROCESS_WORKERS = int(os.environ.get("CHESSPERM_PROCESS_WORKERS", os.cpu_count() or 1))
+
+def _timed(fn, args, kwargs):
+    # Runs inside the worker: report when the task actually started, and hand back
+    # the task's spans so they are recorded in the calling request's context
+    started = time.time()
+    with metrics.collect() as spans:
+        result = fn(*args, **kwargs)
+    return started, result, spans
+
+class WorkerPool:
+    """Executor wrapper that the async endpoints await.
+
+    Tracks in-flight tasks, queue depth (tasks waiting for a free worker)
+    and how long tasks waited between submission and starting.
+    """
+
+    def __init__(self, name: str, factory, max_workers: int):
+        self.name = name
+        self.max_workers = max_workers
+        self._factory = factory
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._waits = deque(maxlen=1024)
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._factory(max_workers=self.max_workers)
+            return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        return max(self.in_flight - self.max_workers, 0)
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        submitted = time.time()
+        self.in_flight += 1
+        try:
+            started, result, spans = await loop.run_in_executor(self.executor, _timed, fn, args, kwargs)
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+        wait = max(started - submitted, 0.0)
+        self.completed += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        self._waits.append(wait)
+        metrics.record(f"{self.name}.queue_wait", wait)
+        metrics.merge(spans)
+        return result
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        pct = lambda p: waits[min(int(p * len(waits)), len(waits) - 1)] * 1000 if waits else 0.0
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "wait_ms_avg": self.wait_total / self.completed * 1000 if self.completed else 0.0,
+            "wait_ms_p50": pct(0.50),
+            "wait_ms_p99": pct(0.99),
+            "wait_ms_max": self.wait_max * 1000,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+# Threads for primitives that release the GIL (liboqs, pycryptodome, zlib)
+threads = WorkerPool("threads", ThreadPoolExecutor, THREAD_WORKERS)
+# Processes for pure-Python work (ChessPerm simulation, stego)
+processes = (WorkerPool("processes", ProcessPoolExecutor, PROCESS_WORKERS)
+             if PROCESS_WORKERS > 0 else threads)
+
+_POOLS = [threads] if processes is threads else [threads, processes]
+
+def stats() -> dict:
+    return {pool.name: pool.stats() for pool in _POOLS}
+
+def shutdown():
+    for pool in _POOLS:
+        pool.shutdown()
@@ -0,0 +1,154 @@
+# backend/zipstream.py
+import time
+import zlib
+import struct
+
+# Entries are written front to back with a data descriptor after each one,
+# so nothing needs to be seeked back to; the central directory goes last.
+# ZIP64 is not supported: entries and the archive must stay under 4 GiB.
+
+STORED = None                # pass as `level` to store an entry uncompressed
+DEFAULT_LEVEL = 6
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+_LOCAL_HEADER   = struct.Struct('<IHHHHHIIIHH')
+_DESCRIPTOR     = struct.Struct('<IIII')
+_CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+_END_OF_DIR     = struct.Struct('<IHHHHIIH')
+
+_VERSION = 20
+_MADE_BY = (3 << 8) | _VERSION          # unix, so the external attributes carry permissions
+_FLAGS = 0x08 | 0x800                   # sizes in data descriptor, UTF-8 names
+_FILE_MODE = (0o100644 << 16)
+_LIMIT = 0xFFFFFFFF
+
+def _dos_time(timestamp: float):
+    t = time.localtime(timestamp)
+    year = min(max(t.tm_year, 1980), 2107)
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+class ZipEntry:
+    """File-like writer for one archive member; close() ends the entry."""
+
+    def __init__(self, archive, name: str, level, timestamp: float):
+        self._archive = archive
+        self.name = name.encode('utf-8')
+        self.method = 0 if level is STORED else 8
+        self._compressor = None if level is STORED else zlib.compressobj(level, zlib.DEFLATED, -15)
+        self.dos_time, self.dos_date = _dos_time(timestamp)
+        self.offset = archive.offset
+        self.crc = 0
+        self.size = 0
+        self.compressed_size = 0
+        self.closed = False
+        archive._emit(_LOCAL_HEADER.pack(0x04034b50, _VERSION, _FLAGS, self.method, self.dos_time,
+                                         self.dos_date, 0, 0, 0, len(self.name), 0) + self.name)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError(f"Entry {self.name.decode()} is closed")
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        out = self._compressor.compress(data) if self._compressor else bytes(data)
+        self.compressed_size += len(out)
+        self._archive._emit(out)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._compressor:
+            tail = self._compressor.flush()
+            self.compressed_size += len(tail)
+            self._archive._emit(tail)
+        if self.size > _LIMIT or self.compressed_size > _LIMIT:
+            raise ValueError(f"Entry {self.name.decode()} exceeds 4 GiB (ZIP64 is not supported)")
+        self._archive._emit(_DESCRIPTOR.pack(0x08074b50, self.crc, self.compressed_size, self.size))
+        self._archive._entry_closed(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class ZipStream:
+    """ZIP writer that emits the archive as it is produced.
+
+    With a `sink` callable, output is passed on in pieces of about
+    `chunk_size` bytes; without one it accumulates until drain().
+    Each entry picks its own deflate level, or STORED.
+    """
+
+    def __init__(self, sink=None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._sink = sink
+        self.chunk_size = chunk_size
+        self._buf = bytearray()
+        self._entries = []
+        self._current = None
+        self.offset = 0
+        self.closed = False
+
+    def _emit(self, data):
+        self._buf += data
+        self.offset += len(data)
+        if self._sink is not None and len(self._buf) >= self.chunk_size:
+            self._sink(self.drain())
+
+    def _entry_closed(self, entry: ZipEntry):
+        self._entries.append(entry)
+        self._current = None
+
+    def drain(self) -> bytes:
+        data = bytes(self._buf)
+        self._buf.clear()
+        return data
+
+    def open(self, name: str, level=DEFAULT_LEVEL, timestamp: float = None) -> ZipEntry:
+        if self.closed:
+            raise ValueError("Archive is closed")
+        if self._current is not None:
+            raise ValueError(f"Entry {self._current.name.decode()} is still open")
+        if self.offset > _LIMIT:
+            raise ValueError("Archive exceeds 4 GiB (ZIP64 is not supported)")
+        self._current = ZipEntry(self, name, level, time.time() if timestamp is None else timestamp)
+        return self._current
+
+    def writestr(self, name: str, data, level=DEFAULT_LEVEL, timestamp: float = None):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with self.open(name, level, timestamp) as entry:
+            entry.write(data)
+
+    def close(self):
+        if self.closed:
+            return
+        if self._current is not None:
+            self._current.close()
+        self.closed = True
+        start = self.offset
+        for e in self._entries:
+            self._emit(_CENTRAL_HEADER.pack(0x02014b50, _MADE_BY, _VERSION, _FLAGS, e.method, e.dos_time,
+                                            e.dos_date, e.crc, e.compressed_size, e.size, len(e.name),
+                                            0, 0, 0, 0, _FILE_MODE, e.offset) + e.name)
+        if len(self._entries) > 0xFFFF or self.offset > _LIMIT:
+            raise ValueError("Archive too large (ZIP64 is not supported)")
+        count = len(self._entries)
+        self._emit(_END_OF_DIR.pack(0x06054b50, 0, 0, count, count, self.offset - start, start, 0))
+        if self._sink is not None and self._buf:
+            self._sink(self.drain())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is None:
+            self.close()
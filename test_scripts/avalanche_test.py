@@ -9,35 +9,32 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
 from chessperm import derive_master_key
+from script_metrics import record
 import random
 from chess import Board
 
-def generate_similar_pgns(base_pgn, num_variations=100):
+def generate_similar_pgns(base_pgn, num_variations=100, seed=0):
     """Generate PGNs similar to the base PGN with small variations."""
     variations = []
+    rng = random.Random(seed)
     
     # Parse the base game
     base_game = Board()
-    base_game.set_pgn(base_pgn)
+    for san in base_pgn.split():
+        if not san.endswith('.'):
+            base_game.push_san(san)
     
     # Generate variations by changing one move
     for _ in range(num_variations):
-        game = Board()
-        game.set_pgn(base_pgn)
+        game = base_game.copy()
         
-        # Make a small change (e.g., change one move)
-        legal_moves = list(game.legal_moves)
+        # Make a small change: replace the last move with another legal one
+        last_move = game.pop() if game.move_stack else None
+        legal_moves = [move for move in game.legal_moves if move != last_move]
         if legal_moves:
-            # Undo last move if possible
-            if len(game.move_stack) > 0:
-                game.pop()
-            
-            # Make a different move
-            if legal_moves:
-                new_move = random.choice(legal_moves)
-                game.push(new_move)
+            game.push(rng.choice(legal_moves))
         
-        variations.append(game.pgn())
+        variations.append(Board().variation_san(game.move_stack))
     
     return variations
 
@@ -84,6 +81,7 @@ def avalanche_test():
             print("✓ Good avalanche effect")
         else:
             print("✗ Poor avalanche effect")
+        record(avg_bit_diff=avg_diff, avg_bit_diff_pct=avg_diff / 256 * 100, variations=total_tests)
 
 def single_bit_avalanche_test():
     """Test avalanche effect with single bit changes in PGN."""
@@ -120,6 +118,7 @@ def single_bit_avalanche_test():
         print(f"Single-bit avalanche test:")
         print(f"Average bit difference per single-bit change: {avg_diff:.2f} bits")
         print(f"Percentage of bits changed: {avg_diff/256*100:.2f}%")
+        record(single_bit_avg_bit_diff=avg_diff)
 
 if __name__ == "__main__":
     avalanche_test()
@@ -8,13 +8,16 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from chessperm import derive_master_key
+import chessperm
+from chessperm import derive_master_key, derive_master_key_from_password, derive_master_keys_batch
+from script_metrics import record
 import time
 import random
 from chess import Board
 
-def generate_random_pgns(n, depth=12):
+def generate_random_pgns(n, depth=12, seed=0):
     """Generate n random PGN strings with specified depth."""
+    rng = random.Random(seed)
     pgns = []
     for _ in range(n):
         # Create a random chess game
@@ -26,11 +29,11 @@ def generate_random_pgns(n, depth=12):
             legal_moves = list(game.legal_moves)
             if not legal_moves:
                 break
-            move = random.choice(legal_moves)
-            game.push(move)
+            move = rng.choice(legal_moves)
             moves.append(game.san(move))
+            game.push(move)
         
-        pgn = game.pgn()
+        pgn = Board().variation_san(game.move_stack)
         if pgn.strip():
             pgns.append(pgn)
     
@@ -51,20 +54,20 @@ def benchmark_throughput(num_tests=1000):
     
     # Benchmark
     print("Running benchmark...")
-    start_time = time.time()
+    start_time = time.perf_counter()
     
     for i, pgn in enumerate(pgns):
         try:
             derive_master_key(pgn)
             if i % 100 == 0:
-                elapsed = time.time() - start_time
+                elapsed = time.perf_counter() - start_time
                 rate = (i + 1) / elapsed
                 print(f"Processed {i+1}/{num_tests} - Rate: {rate:.1f} derivations/sec")
         except Exception as e:
             print(f"Error processing PGN {i}: {e}")
             continue
     
-    end_time = time.time()
+    end_time = time.perf_counter()
     total_time = end_time - start_time
     
     print(f"\nBenchmark Results:")
@@ -72,6 +75,7 @@ def benchmark_throughput(num_tests=1000):
     print(f"Total derivations: {len(pgns)}")
     print(f"Throughput: {len(pgns)/total_time:.1f} derivations/sec")
     print(f"Average time per derivation: {total_time/len(pgns)*1000:.2f} ms")
+    record(pgn_throughput=len(pgns) / total_time)
 
 def benchmark_password_mode(num_tests=1000):
     """Benchmark password-based key derivation."""
@@ -81,33 +85,34 @@ def benchmark_password_mode(num_tests=1000):
     # Generate random passwords
     password_chars = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!@#$%^&*"
     passwords = []
+    rng = random.Random(0)
     
     for _ in range(num_tests):
-        password_length = random.randint(8, 16)
-        password = ''.join(random.choice(password_chars) for _ in range(password_length))
+        password_length = rng.randint(8, 16)
+        password = ''.join(rng.choice(password_chars) for _ in range(password_length))
         passwords.append(password)
     
     # Warm up
     print("Warming up...")
     for _ in range(10):
-        derive_master_key("testpassword123")
+        derive_master_key_from_password("testpassword123")
     
     # Benchmark
     print("Running benchmark...")
-    start_time = time.time()
+    start_time = time.perf_counter()
     
     for i, password in enumerate(passwords):
         try:
-            derive_master_key(password)
+            derive_master_key_from_password(password)
             if i % 100 == 0:
-                elapsed = time.time() - start_time
+                elapsed = time.perf_counter() - start_time
                 rate = (i + 1) / elapsed
                 print(f"Processed {i+1}/{num_tests} - Rate: {rate:.1f} derivations/sec")
         except Exception as e:
             print(f"Error processing password {i}: {e}")
             continue
     
-    end_time = time.time()
+    end_time = time.perf_counter()
     total_time = end_time - start_time
     
     print(f"\nPassword Benchmark Results:")
@@ -115,6 +120,50 @@ def benchmark_password_mode(num_tests=1000):
     print(f"Total derivations: {len(passwords)}")
     print(f"Throughput: {len(passwords)/total_time:.1f} derivations/sec")
     print(f"Average time per derivation: {total_time/len(passwords)*1000:.2f} ms")
+    record(password_throughput=len(passwords) / total_time)
+
+def benchmark_batch(num_tests=1000, workers=None):
+    """Benchmark batch derivation across a process pool."""
+    print(f"\nBenchmarking batch key derivation...")
+    print(f"Number of tests: {num_tests}")
+
+    pgns = generate_random_pgns(num_tests, depth=12)
+
+    print("Running benchmark...")
+    start_time = time.perf_counter()
+    count = sum(1 for _ in derive_master_keys_batch(pgns, workers=workers))
+    total_time = time.perf_counter() - start_time
+
+    print(f"\nBatch Benchmark Results:")
+    print(f"Workers: {workers or os.cpu_count()}")
+    print(f"Total time: {total_time:.2f} seconds")
+    print(f"Total derivations: {count}")
+    print(f"Throughput: {count/total_time:.1f} derivations/sec")
+    record(batch_throughput=count / total_time)
+
+def benchmark_engines(num_tests=300):
+    """Compare the python-chess and bitboard simulation engines on the same PGNs."""
+    print(f"\nBenchmarking simulation engines...")
+    print(f"Number of tests: {num_tests}")
+
+    pgns = generate_random_pgns(num_tests, depth=12)
+    default = chessperm.ENGINE
+    results = {}
+    try:
+        for engine in ('python-chess', 'bitboard'):
+            chessperm.ENGINE = engine
+            start_time = time.perf_counter()
+            keys = [derive_master_key(pgn) for pgn in pgns]
+            results[engine] = (time.perf_counter() - start_time, keys)
+    finally:
+        chessperm.ENGINE = default
+
+    assert results['python-chess'][1] == results['bitboard'][1], "Engines derived different keys"
+    print(f"\nEngine Benchmark Results (keys identical):")
+    for engine, (total_time, _) in results.items():
+        print(f"{engine:>12}: {len(pgns)/total_time:8.1f} derivations/sec")
+    print(f"Speedup: {results['python-chess'][0] / results['bitboard'][0]:.2f}x")
+    record(bitboard_speedup=results['python-chess'][0] / results['bitboard'][0])
 
 def memory_usage_test():
     """Test memory usage during key derivation."""
@@ -140,6 +189,7 @@ def memory_usage_test():
     final_memory = process.memory_info().rss / 1024 / 1024
     print(f"Final memory usage: {final_memory:.2f} MB")
     print(f"Memory increase: {final_memory - initial_memory:.2f} MB")
+    record(memory_increase_mb=final_memory - initial_memory)
 
 if __name__ == "__main__":
     # Benchmark PGN mode
@@ -147,6 +197,12 @@ if __name__ == "__main__":
     
     # Benchmark password mode
     benchmark_password_mode(1000)
+
+    # Benchmark batch derivation
+    benchmark_batch(1000)
+
+    # Compare simulation engines (CHESSPERM_ENGINE selects the one used above)
+    benchmark_engines(300)
     
     # Memory usage test (if psutil is available)
     try:
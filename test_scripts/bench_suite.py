@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for every backend stage.
+Times ChessPerm derivation (PGN and password modes at several ply counts),
+Kyber keygen/encap/decap, ChaCha20-Poly1305 at several message sizes, stego
+embed/extract at several cover sizes and full /api/encrypt + /api/decrypt
+round-trips. Inputs come from seeded corpora; every stage is warmed up,
+calibrated and timed over several rounds. Results can be saved as a JSON
+baseline, and a later run compared against it fails when a stage regresses
+beyond the threshold.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import gc
+import io
+import json
+import math
+import time
+import random
+import asyncio
+import zipfile
+import argparse
+import platform
+import datetime
+import statistics
+from itertools import cycle
+import numpy as np
+from PIL import Image
+from chess import Board
+
+import chessperm
+import stego
+from chessperm import derive_master_key, derive_master_key_from_password
+from symcrypto import encrypt_message, decrypt_message
+
+PASSWORD_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!@#$%^&*"
+PLIES = (50, 100, 200)
+MESSAGE_SIZES = (64, 1024, 64 * 1024, 1024 * 1024)
+COVER_SIZES = ((256, 256), (512, 512), (1024, 1024))
+METRICS = ("median", "mean", "min")
+
+def seeded_pgns(n, seed=0, depth=12):
+    rng = random.Random(seed)
+    pgns = []
+    for _ in range(n):
+        game = Board()
+        for _ in range(depth):
+            legal_moves = list(game.legal_moves)
+            if not legal_moves:
+                break
+            game.push(rng.choice(legal_moves))
+        pgns.append(Board().variation_san(game.move_stack))
+    return pgns
+
+def seeded_passwords(n, seed=0):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(PASSWORD_CHARS) for _ in range(rng.randint(8, 16))) for _ in range(n)]
+
+def _size_label(n):
+    return f"{n // 1024 // 1024}MiB" if n >= 1 << 20 else f"{n // 1024}KiB" if n >= 1024 else f"{n}B"
+
+# --- Stages: each yields (name, fn) where fn() runs one operation ---
+
+def chessperm_cases(seed):
+    pgns, passwords = seeded_pgns(64, seed), seeded_passwords(64, seed)
+    for plies in PLIES:
+        items = cycle(pgns)
+        yield f"chessperm.pgn.plies{plies}", lambda items=items, plies=plies: derive_master_key(next(items), plies=plies)
+    for plies in PLIES:
+        items = cycle(passwords)
+        yield (f"chessperm.password.plies{plies}",
+               lambda items=items, plies=plies: derive_master_key_from_password(next(items), plies=plies))
+
+def kyber_cases(seed):
+    from kyber_kem import generate_keypair, encapsulate, decapsulate
+    public_key, secret_key = generate_keypair()
+    ciphertext, _ = encapsulate(public_key)
+    yield "kyber.keygen", generate_keypair
+    yield "kyber.encap", lambda: encapsulate(public_key)
+    yield "kyber.decap", lambda: decapsulate(ciphertext, secret_key)
+
+def chacha20_cases(seed):
+    rng = random.Random(seed)
+    key = rng.randbytes(32)
+    for size in MESSAGE_SIZES:
+        message = rng.randbytes(size)
+        nonce, ciphertext, tag = encrypt_message(key, message)
+        yield f"chacha20.encrypt.{_size_label(size)}", lambda message=message: encrypt_message(key, message)
+        yield (f"chacha20.decrypt.{_size_label(size)}",
+               lambda args=(nonce, ciphertext, tag): decrypt_message(key, *args))
+
+def stego_cases(seed):
+    # The API's payload: Kyber512 ciphertext + nonce + tag + a short message
+    payload = random.Random(seed).randbytes(768 + 12 + 16 + 256)
+    rng = np.random.default_rng(seed)
+    for width, height in COVER_SIZES:
+        cover = Image.fromarray(rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8), mode="RGB")
+        png = io.BytesIO()
+        stego.embed_data_in_image(cover, payload, png)
+        stego_png = png.getvalue()
+        yield (f"stego.embed.{width}x{height}",
+               lambda cover=cover: stego.embed_data_in_image(cover, payload, io.BytesIO()))
+        yield (f"stego.extract.{width}x{height}",
+               lambda data=stego_png: stego.extract_data_from_image(io.BytesIO(data)))
+
+def endpoint_cases(seed):
+    import httpx
+    from backend.main import app
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=300)
+    rng = random.Random(seed)
+    inputs = {'pgn': cycle({'input_type': 'pgn', 'pgn': pgn} for pgn in seeded_pgns(16, seed)),
+              'password': cycle({'input_type': 'password', 'password': p} for p in seeded_passwords(16, seed))}
+    messages = cycle(f"benchmark message {rng.getrandbits(64):016x}" for _ in range(16))
+
+    async def round_trip(fields):
+        message = next(messages)
+        r = await client.post("/api/encrypt", data={**fields, 'message': message})
+        r.raise_for_status()
+        with zipfile.ZipFile(io.BytesIO(r.content)) as z:
+            private_key = z.read("private_key.txt").decode()
+        r = await client.post("/api/decrypt", data={**fields, 'private_key': private_key},
+                              files={'file': ('chessperm_package.zip', r.content, 'application/zip')})
+        r.raise_for_status()
+        assert r.json()["message"] == message, "Round-trip returned the wrong message"
+
+    for mode in ('pgn', 'password'):
+        yield f"endpoint.roundtrip.{mode}", lambda mode=mode: loop.run_until_complete(round_trip(next(inputs[mode])))
+
+STAGES = {
+    "chessperm": chessperm_cases,
+    "kyber": kyber_cases,
+    "chacha20": chacha20_cases,
+    "stego": stego_cases,
+    "endpoint": endpoint_cases,
+}
+
+# --- Runner ---
+
+def measure(fn, rounds=10, min_round_time=0.05, warmup=0.1):
+    """Per-call seconds for each round, pytest-benchmark style.
+
+    Calls fn for at least `warmup` seconds, calibrates how many calls make a
+    round last `min_round_time`, then times `rounds` rounds with GC off.
+    """
+    calls, started = 0, time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= warmup:
+            break
+    iterations = max(1, math.ceil(min_round_time / (elapsed / calls)))
+
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                fn()
+            samples.append((time.perf_counter() - start) / iterations)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return samples, iterations
+
+def summarize(samples, iterations):
+    quartiles = statistics.quantiles(samples, n=4) if len(samples) > 1 else [samples[0]] * 3
+    return {
+        "min": min(samples),
+        "max": max(samples),
+        "mean": statistics.fmean(samples),
+        "stddev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "median": statistics.median(samples),
+        "iqr": quartiles[2] - quartiles[0],
+        "ops": 1 / statistics.fmean(samples),
+        "rounds": len(samples),
+        "iterations": iterations,
+    }
+
+def machine_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "chessperm_engine": chessperm.ENGINE,
+        "stego_engine": stego.DEFAULT_ENGINE,
+    }
+
+def run_suite(stages=None, select=None, seed=0, rounds=10, min_round_time=0.05, warmup=0.1):
+    """Benchmark every case of the selected stages; returns the report dict."""
+    results = {}
+    print(f"{'benchmark':32} {'median':>11} {'mean':>11} {'stddev':>10} {'iqr':>10} {'ops':>10} {'rounds':>7}")
+    for stage in stages or STAGES:
+        try:
+            cases = list(STAGES[stage](seed))
+        except ImportError as e:
+            print(f"{stage:32} skipped ({e})")
+            continue
+        for name, fn in cases:
+            if select and select not in name:
+                continue
+            stats = summarize(*measure(fn, rounds, min_round_time, warmup))
+            results[name] = stats
+            print(f"{name:32} {stats['median'] * 1e3:9.3f}ms {stats['mean'] * 1e3:9.3f}ms "
+                  f"{stats['stddev'] * 1e3:8.3f}ms {stats['iqr'] * 1e3:8.3f}ms {stats['ops']:10.1f} "
+                  f"{stats['rounds']:7}")
+    return {
+        "datetime": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "machine_info": machine_info(),
+        "settings": {"seed": seed, "rounds": rounds, "min_round_time": min_round_time, "warmup": warmup},
+        "benchmarks": results,
+    }
+
+def compare(report, baseline, metric="median", threshold=0.10):
+    """Print per-benchmark deltas against `baseline`; returns the names that regressed."""
+    print(f"\nComparison against baseline from {baseline.get('datetime', '?')} "
+          f"({metric}, fail above +{threshold:.0%}):")
+    for key, value in baseline.get("machine_info", {}).items():
+        if report["machine_info"].get(key) != value:
+            print(f"  note: {key} was {value!r}, now {report['machine_info'].get(key)!r}")
+    regressed = []
+    old_results, new_results = baseline["benchmarks"], report["benchmarks"]
+    for name in sorted(old_results.keys() | new_results.keys()):
+        if name not in new_results:
+            print(f"  {name:32} {'missing':>11}")
+            continue
+        if name not in old_results:
+            print(f"  {name:32} {'new':>11}")
+            continue
+        old, new = old_results[name][metric], new_results[name][metric]
+        delta = new / old - 1
+        status = "REGRESSED" if delta > threshold else "faster" if delta < -threshold else "ok"
+        if status == "REGRESSED":
+            regressed.append(name)
+        print(f"  {name:32} {old * 1e3:9.3f}ms -> {new * 1e3:9.3f}ms {delta:+8.1%}  {status}")
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stage", action="append", choices=list(STAGES), help="Only these stages (repeatable)")
+    parser.add_argument("-k", dest="select", help="Only benchmarks whose name contains this")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--min-round-time", type=float, default=0.05, help="Seconds per timed round")
+    parser.add_argument("--warmup", type=float, default=0.1, help="Warmup seconds per benchmark")
+    parser.add_argument("--save", metavar="JSON", help="Write the results here as a baseline")
+    parser.add_argument("--compare", metavar="JSON", help="Compare against this baseline")
+    parser.add_argument("--metric", choices=METRICS, default="median", help="Statistic compared against the baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Fail when a benchmark is slower than the baseline by more than this fraction")
+    args = parser.parse_args()
+
+    print(f"Running benchmark suite (seed {args.seed}, {args.rounds} rounds)...\n")
+    report = run_suite(args.stage, args.select, args.seed, args.rounds, args.min_round_time, args.warmup)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved {len(report['benchmarks'])} results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        # Only hold the run to the part of the baseline it was asked to measure
+        baseline["benchmarks"] = {name: stats for name, stats in baseline["benchmarks"].items()
+                                  if name.split(".")[0] in (args.stage or STAGES)
+                                  and (not args.select or args.select in name)}
+        regressed = compare(report, baseline, args.metric, args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} benchmark(s) regressed: {', '.join(regressed)}")
+            sys.exit(1)
+        print("\nNo regressions")
+
+if __name__ == "__main__":
+    main()
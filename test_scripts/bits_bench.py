@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for ChessPerm bit handling.
+Compares the packed-int helpers against the original list-of-bits helpers
+(reproduced below) for time and allocation per derivation.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from chessperm import (_password_to_bits, _get_chunk_val, _board_to_master_key,
+                       _simulate_chess)
+import time
+import random
+import tracemalloc
+import chess
+
+# --- Original list-of-bits helpers, kept here as the baseline ---
+
+def list_password_to_bits(password, salt=b''):
+    combined = password.encode() + salt
+    return [((byte >> i) & 1) for byte in combined for i in reversed(range(8))]
+
+def list_get_chunk_val(bits, index, chunk_size=6):
+    start = (index * chunk_size) % len(bits)
+    chunk = bits[start:start + chunk_size]
+    if len(chunk) < chunk_size:
+        chunk += bits[:chunk_size - len(chunk)]
+    return int(''.join(str(b) for b in chunk), 2)
+
+def list_board_to_master_key(board):
+    bits = []
+    bits.extend([1 if board.piece_at(i) else 0 for i in chess.SQUARES])
+    for sq in chess.SQUARES:
+        piece = board.piece_at(sq)
+        if piece:
+            color_bit = 0 if piece.color == chess.WHITE else 1
+            val = (color_bit << 3) | (piece.piece_type & 0b111)
+            bits.extend([(val >> b) & 1 for b in reversed(range(4))])
+    bits.append(0 if board.turn == chess.WHITE else 1)
+    bits += [int(board.has_kingside_castling_rights(c)) for c in [chess.WHITE, chess.BLACK]]
+    bits += [int(board.has_queenside_castling_rights(c)) for c in [chess.WHITE, chess.BLACK]]
+    ep = board.ep_square if board.ep_square is not None else 0
+    bits.extend([(ep >> b) & 1 for b in reversed(range(6))])
+    hmc = min(board.halfmove_clock, 127)
+    bits.extend([(hmc >> b) & 1 for b in reversed(range(7))])
+    while len(bits) < 256:
+        bits.extend(bits[:256 - len(bits)])
+    return bytes(int(''.join(str(b) for b in bits[i:i+8]), 2) for i in range(0, 256, 8))
+
+def bit_stages(to_bits, chunk_val, to_key, password, board, plies=100):
+    """The bit-handling work of one derivation, without the chess simulation."""
+    bits = to_bits(password)
+    for i in range(plies):
+        chunk_val(bits, i)
+    return to_key(board)
+
+def measure(label, stages, passwords, boards):
+    """Print time and tracemalloc allocation figures per derivation."""
+    start = time.perf_counter()
+    for pw, board in zip(passwords, boards):
+        bit_stages(*stages, pw, board)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    peak_total = 0
+    for pw, board in zip(passwords, boards):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        bit_stages(*stages, pw, board)
+        peak_total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    n = len(passwords)
+    print(f"{label:12} {elapsed / n * 1e6:8.1f} us/derivation   "
+          f"{peak_total / n:8.0f} peak bytes allocated/derivation")
+    return elapsed
+
+def bits_benchmark(n=500, seed=42):
+    """Compare list-based and packed-int bit handling on n derivations."""
+    print(f"Benchmarking ChessPerm bit handling over {n} derivations (seed={seed})...")
+    rng = random.Random(seed)
+    chars = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+    passwords = [''.join(rng.choice(chars) for _ in range(rng.randint(8, 16))) for _ in range(n)]
+    boards = [_simulate_chess(_password_to_bits(pw)) for pw in passwords]
+
+    mismatches = sum(list_board_to_master_key(b) != _board_to_master_key(b) for b in boards)
+    print(f"Key mismatches between implementations: {mismatches}\n")
+
+    old = measure("list bits", (list_password_to_bits, list_get_chunk_val, list_board_to_master_key),
+                  passwords, boards)
+    new = measure("packed int", (_password_to_bits, _get_chunk_val, _board_to_master_key),
+                  passwords, boards)
+    print(f"\nSpeedup: {old / new:.2f}x")
+    return mismatches
+
+if __name__ == "__main__":
+    sys.exit(1 if bits_benchmark() else 0)
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 """
 Collision test for ChessPerm key derivation.
-Tests for hash collisions in derived master keys.
+Derives master keys for random PGNs in worker processes, writes the raw
+SHA-256 digest of every key into sorted per-shard runs on disk, then
+merge-sorts each shard into a memory-mapped index to find duplicates.
+With --dir the run is checkpointed and can be resumed or extended.
 """
 
 import sys
@@ -9,64 +12,265 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
 from chessperm import derive_master_key
-import hashlib
+from script_metrics import record
+import json
+import mmap
+import time
+import heapq
+import bisect
 import random
+import struct
+import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from chess import Board
 
-def generate_random_pgns(n, depth=12):
+DIGEST = 32
+MANIFEST = "manifest.json"
+DEFAULTS = {"depth": 12, "shards": 16}
+# Repeated digests per shard that are traced back to their PGNs
+KEEP = 20
+# Digests read from a run at a time while merging (16 KiB)
+BLOCK = 512
+
+def generate_random_pgns(n, depth=12, rng=random):
     """Generate n random PGN strings with specified depth."""
     pgns = []
     for _ in range(n):
-        # Create a random chess game
+        # Play random legal moves up to depth
         game = Board()
-        moves = []
-        
-        # Generate random moves up to depth
-        for i in range(depth):
+        for _ in range(depth):
             legal_moves = list(game.legal_moves)
             if not legal_moves:
                 break
-            move = random.choice(legal_moves)
-            game.push(move)
-            moves.append(game.san(move))
-        
-        pgn = game.pgn()
-        if pgn.strip():
-            pgns.append(pgn)
-    
+            game.push(rng.choice(legal_moves))
+        pgns.append(Board().variation_san(game.move_stack))
     return pgns
 
-def collision_test(n=10000):
+def chunk_pgns(params, chunk, size):
+    """The PGNs of one chunk; seeded per chunk so any chunk can be regenerated on its own."""
+    return generate_random_pgns(size, params["depth"], random.Random(f"{params['seed']}:{chunk}"))
+
+def run_path(workdir, chunk):
+    return os.path.join(workdir, "runs", f"chunk-{chunk:06d}.bin")
+
+def shard_path(workdir, shard):
+    return os.path.join(workdir, "shards", f"shard-{shard:04d}.bin")
+
+def shard_bounds(shards):
+    """First 2-byte digest prefix of shards 1..n-1, so a sorted run splits with bisect."""
+    return [(-(-s * 65536 // shards)).to_bytes(2, 'big') for s in range(1, shards)]
+
+def shard_of(digest, shards):
+    return int.from_bytes(digest[:2], 'big') * shards >> 16
+
+def derive_chunk(workdir, params, chunk, size):
+    """Worker: derive one chunk and write its digests as a sorted run with per-shard offsets."""
+    started = time.perf_counter()
+    digests, errors = [], 0
+    for pgn in chunk_pgns(params, chunk, size):
+        try:
+            digests.append(hashlib.sha256(derive_master_key(pgn)).digest())
+        except Exception:
+            errors += 1
+    digests.sort()
+    offsets = [0] + [bisect.bisect_left(digests, b) for b in shard_bounds(params["shards"])] + [len(digests)]
+    path = run_path(workdir, chunk)
+    with open(path + ".tmp", "wb") as f:
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+        f.write(b"".join(digests))
+    os.replace(path + ".tmp", path)
+    return chunk, size, errors, time.perf_counter() - started
+
+def run_slices(workdir, chunks, shard, shards):
+    """(chunk, first byte, end byte) of `shard`'s slice in each chunk run that has one."""
+    header = struct.calcsize(f"<{shards + 1}Q")
+    slices = []
+    for chunk in chunks:
+        with open(run_path(workdir, chunk), "rb") as f:
+            offsets = struct.unpack(f"<{shards + 1}Q", f.read(header))
+        if offsets[shard] != offsets[shard + 1]:
+            slices.append((chunk, header + offsets[shard] * DIGEST, header + offsets[shard + 1] * DIGEST))
+    return slices
+
+def _records(path, first, end):
+    # Reopens the run for every block, so merging thousands of runs holds no descriptors open
+    pos = first
+    while pos < end:
+        with open(path, "rb") as f:
+            f.seek(pos)
+            block = f.read(min(BLOCK * DIGEST, end - pos))
+        if not block:
+            raise ValueError(f"{path} ends before its shard offsets say")
+        pos += len(block)
+        for i in range(0, len(block), DIGEST):
+            yield block[i:i + DIGEST]
+
+def merge_shard(workdir, shard, shards, chunks):
+    """Worker: k-way merge one shard's runs into shards/shard-NNNN.bin, counting repeated digests."""
+    runs = run_slices(workdir, chunks, shard, shards)
+    total = sum(end - first for _, first, end in runs)
+    duplicates, examples, previous = 0, [], None
+    path = shard_path(workdir, shard)
+    with open(path + ".tmp", "w+b") as f:
+        if total:
+            f.truncate(total)
+            with mmap.mmap(f.fileno(), total) as out:
+                pos = 0
+                for digest in heapq.merge(*(_records(run_path(workdir, chunk), first, end)
+                                            for chunk, first, end in runs)):
+                    if digest == previous:
+                        duplicates += 1
+                        if len(examples) < KEEP and (not examples or examples[-1] != digest.hex()):
+                            examples.append(digest.hex())
+                    out[pos:pos + DIGEST] = digest
+                    pos += DIGEST
+                    previous = digest
+    os.replace(path + ".tmp", path)
+    return shard, total // DIGEST, duplicates, examples
+
+def locate(workdir, params, chunks, digest):
+    """(sample index, PGN) of every sample whose key hashes to `digest`.
+
+    Binary-searches each chunk's sorted run, then re-derives only the chunks that hold it.
+    """
+    found = []
+    for chunk, first, end in run_slices(workdir, chunks, shard_of(digest, params["shards"]), params["shards"]):
+        with open(run_path(workdir, chunk), "rb") as f:
+            def record_at(i):
+                f.seek(first + i * DIGEST)
+                return f.read(DIGEST)
+            lo, hi = 0, (end - first) // DIGEST
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if record_at(mid) < digest:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            hit = lo < (end - first) // DIGEST and record_at(lo) == digest
+        if hit:
+            for i, pgn in enumerate(chunk_pgns(params, chunk, chunks[chunk])):
+                if hashlib.sha256(derive_master_key(pgn)).digest() == digest:
+                    found.append((chunk * params["chunk"] + i, pgn))
+    return found
+
+def load_manifest(workdir, requested):
+    """Checkpoint state; explicitly requested parameters must match a resumed run's."""
+    path = os.path.join(workdir, MANIFEST)
+    if not os.path.exists(path):
+        return {"params": {}, "chunks": {}, "merged": None}
+    with open(path) as f:
+        manifest = json.load(f)
+    for name, value in requested.items():
+        if value is not None and manifest["params"].get(name, value) != value:
+            raise SystemExit(f"{workdir} holds a run with {name}={manifest['params'][name]}, not {value}")
+    print(f"Resuming {workdir}: {len(manifest['chunks'])} chunks already derived")
+    return manifest
+
+def save_manifest(workdir, manifest):
+    path = os.path.join(workdir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+def collision_test(n=10000, workdir=None, workers=None, chunk=None, shards=None, seed=None, depth=None):
     """Test for collisions in derived master keys."""
-    print(f"Running collision test with {n} PGNs...")
-    
-    seen = set()
+    workers = workers or os.cpu_count() or 1
+    if workdir is None:
+        with tempfile.TemporaryDirectory(prefix="chessperm-collisions-") as tmp:
+            return collision_test(n, tmp, workers, chunk, shards, seed, depth)
+
+    os.makedirs(os.path.join(workdir, "runs"), exist_ok=True)
+    os.makedirs(os.path.join(workdir, "shards"), exist_ok=True)
+    manifest = load_manifest(workdir, {"chunk": chunk, "shards": shards, "seed": seed, "depth": depth})
+    params = manifest["params"]
+    params.setdefault("seed", seed if seed is not None else random.randrange(2 ** 32))
+    params.setdefault("depth", depth or DEFAULTS["depth"])
+    params.setdefault("shards", shards or DEFAULTS["shards"])
+    # ~4 chunks per worker, but never so many run files that merging needs thousands of maps
+    params.setdefault("chunk", chunk or min(max(n // (workers * 4), 1000), 100000))
+    if not 1 <= params["shards"] <= 65536:
+        raise SystemExit("--shards must be between 1 and 65536")
+
+    size = params["chunk"]
+    wanted = {c: min(size, n - c * size) for c in range(-(-n // size))}
+    todo = [c for c in wanted if manifest["chunks"].get(str(c)) != wanted[c]]
+    print(f"Running collision test with {n} PGNs "
+          f"(seed {params['seed']}, {len(wanted)} chunks of {size}, {params['shards']} shards, {workers} workers)...")
+
+    started = time.perf_counter()
+    done = resumed = n - sum(wanted[c] for c in todo)
+    errors = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if todo:
+            manifest["merged"] = None
+            futures = [pool.submit(derive_chunk, workdir, params, c, wanted[c]) for c in todo]
+            for future in as_completed(futures):
+                c, count, failed, seconds = future.result()
+                manifest["chunks"][str(c)] = count
+                save_manifest(workdir, manifest)
+                done += count
+                errors += failed
+                rate = (done - resumed) / (time.perf_counter() - started)
+                print(f"Processed {done}/{n} PGNs... ({rate:.0f} keys/sec)")
+        derive_s = time.perf_counter() - started
+
+        merged = manifest["merged"]
+        if merged is None or merged["n"] != n:
+            merged = manifest["merged"] = {"n": n, "shards": {}}
+        started = time.perf_counter()
+        futures = [pool.submit(merge_shard, workdir, s, params["shards"], wanted)
+                   for s in range(params["shards"]) if str(s) not in merged["shards"]]
+        for future in as_completed(futures):
+            s, total, duplicates, examples = future.result()
+            merged["shards"][str(s)] = [total, duplicates, examples]
+            save_manifest(workdir, manifest)
+        merge_s = time.perf_counter() - started
+
+    unique = sum(total - dups for total, dups, _ in merged["shards"].values())
+    repeats = sum(dups for _, dups, _ in merged["shards"].values())
     collisions = 0
-    
-    for i, pgn in enumerate(generate_random_pgns(n, depth=12)):
-        if i % 1000 == 0:
-            print(f"Processed {i}/{n} PGNs...")
-        
-        try:
-            k = derive_master_key(pgn)
-            h = hashlib.sha256(k).hexdigest()
-            
-            if h in seen:
-                collisions += 1
-                print(f"COLLISION FOUND! PGN: {pgn[:100]}...")
+    for _, _, examples in merged["shards"].values():
+        for digest in examples:
+            samples = locate(workdir, params, wanted, bytes.fromhex(digest))
+            distinct = len({pgn for _, pgn in samples})
+            if distinct > 1:
+                collisions += distinct - 1
+                print(f"COLLISION FOUND! {digest[:16]}... from samples {[i for i, _ in samples]}:")
+                for i, pgn in samples:
+                    print(f"  #{i}: {pgn[:100]}")
             else:
-                seen.add(h)
-        except Exception as e:
-            print(f"Error processing PGN: {e}")
-            continue
-    
+                print(f"Repeated input (same random game drawn {len(samples)} times): {samples[0][1][:100]}")
+
     print(f"\nCollision Test Results:")
-    print(f"Tested {n} PGNs")
+    print(f"Tested {n} PGNs ({errors} derivation errors)")
     print(f"Collisions found: {collisions}")
     print(f"Collision rate: {collisions/n*100:.4f}%")
-    print(f"Unique hashes: {len(seen)}")
-    
+    print(f"Unique hashes: {unique}")
+    print(f"Repeated digests: {repeats}")
+    if any(len(examples) == KEEP for _, _, examples in merged["shards"].values()):
+        print(f"(only the first {KEEP} repeated digests of each shard were traced back to their PGNs)")
+    print(f"Derive: {derive_s:.2f} s, merge: {merge_s:.2f} s, "
+          f"index: {unique + repeats} x {DIGEST} bytes in {params['shards']} shards")
+    record(samples=n, collisions=collisions, collision_rate=collisions / n, unique_hashes=unique,
+           repeated_digests=repeats, derivation_errors=errors,
+           keys_per_sec=(n - resumed) / derive_s if n > resumed else None)
+
     return collisions
 
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("samples", nargs="?", type=int, default=10000)
+    parser.add_argument("--dir", help="Keep runs and checkpoints here; rerunning with the same dir resumes")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--chunk", type=int, help="PGNs per worker task and sorted run")
+    parser.add_argument("--shards", type=int, help=f"Digest-prefix shards (default: {DEFAULTS['shards']})")
+    parser.add_argument("--seed", type=int, help="PGN generator seed (default: random, saved for resume)")
+    parser.add_argument("--depth", type=int, help=f"Plies per random game (default: {DEFAULTS['depth']})")
+    args = parser.parse_args()
+    collisions = collision_test(args.samples, args.dir, args.workers, args.chunk, args.shards, args.seed, args.depth)
+    sys.exit(1 if collisions else 0)
+
 if __name__ == "__main__":
-    collision_test() 
\ No newline at end of file
+    main()
@@ -10,6 +10,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
 from chessperm import derive_master_key
 import random
+import statistics
+from script_metrics import record
 
 def test_single_bit_propagation():
     """Test how single-bit changes propagate through key derivation."""
@@ -23,6 +25,7 @@ def test_single_bit_propagation():
         "♔♕♖♗♘♙♚♛♜♝♞♟"
     ]
     
+    averages = []
     for test_input in test_inputs:
         print(f"\nTesting input: {test_input[:50]}...")
         
@@ -56,12 +59,15 @@ def test_single_bit_propagation():
             avg_diff = total_diff_bits / total_tests
             print(f"Average bit difference per single-bit change: {avg_diff:.2f} bits")
             print(f"Percentage of bits changed: {avg_diff/256*100:.2f}%")
+            averages.append(avg_diff)
             
             # Evaluate propagation quality
             if 110 <= avg_diff <= 146:  # Within 15% of 50%
                 print("✓ Good differential propagation")
             else:
                 print("✗ Poor differential propagation")
+    if averages:
+        record(single_bit_avg_bit_diff=statistics.mean(averages))
 
 def test_avalanche_effect():
     """Test avalanche effect with different input modifications."""
@@ -82,16 +88,21 @@ def test_avalanche_effect():
     print(f"Base PGN: {base_pgn}")
     print(f"Base key (first 32 bytes): {base_key[:32].hex()}")
     print("\nTesting modifications:")
+    diffs = []
     
     for modified_pgn, description in modifications:
         try:
             modified_key = derive_master_key(modified_pgn)
             diff_bits = sum(bin(b1 ^ b2).count("1") for b1, b2 in zip(base_key, modified_key))
+            diffs.append(diff_bits)
             
             print(f"{description}: {diff_bits} bits different ({diff_bits/256*100:.1f}%)")
             
         except Exception as e:
             print(f"Error with modification '{description}': {e}")
+    
+    if diffs:
+        record(avalanche_avg_bit_diff=statistics.mean(diffs))
 
 def test_password_differential():
     """Test differential propagation with passwords."""
@@ -113,16 +124,21 @@ def test_password_differential():
     print(f"Base password: {base_password}")
     print(f"Base key (first 32 bytes): {base_key[:32].hex()}")
     print("\nTesting password modifications:")
+    diffs = []
     
     for modified_password, description in modifications:
         try:
             modified_key = derive_master_key(modified_password)
             diff_bits = sum(bin(b1 ^ b2).count("1") for b1, b2 in zip(base_key, modified_key))
+            diffs.append(diff_bits)
             
             print(f"{description}: {diff_bits} bits different ({diff_bits/256*100:.1f}%)")
             
         except Exception as e:
             print(f"Error with modification '{description}': {e}")
+    
+    if diffs:
+        record(password_avg_bit_diff=statistics.mean(diffs))
 
 def test_unicode_differential():
     """Test differential propagation with Unicode characters."""
@@ -142,16 +158,21 @@ def test_unicode_differential():
     print(f"Base input: {base_input}")
     print(f"Base key (first 32 bytes): {base_key[:32].hex()}")
     print("\nTesting Unicode modifications:")
+    diffs = []
     
     for modified_input, description in modifications:
         try:
             modified_key = derive_master_key(modified_input)
             diff_bits = sum(bin(b1 ^ b2).count("1") for b1, b2 in zip(base_key, modified_key))
+            diffs.append(diff_bits)
             
             print(f"{description}: {diff_bits} bits different ({diff_bits/256*100:.1f}%)")
             
         except Exception as e:
             print(f"Error with modification '{description}': {e}")
+    
+    if diffs:
+        record(unicode_avg_bit_diff=statistics.mean(diffs))
 
 if __name__ == "__main__":
     # Test single-bit propagation
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Equivalence test for the ChessPerm simulation core.
+Checks that _simulate_chess and the bitboard engine (bitperm) play exactly
+the same moves as the reference implementation over a large randomized
+corpus of input bit vectors.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from chessperm import _Bits, _simulate_chess, _simulate_chess_reference, _board_to_master_key
+import bitperm
+import time
+import random
+
+def random_bits(rng):
+    """Random bit vector; short vectors exercise the chunk wrap-around."""
+    length = rng.choice([6, 8, 24, rng.randint(1, 64), rng.randint(64, 1200)])
+    return _Bits.from_list([rng.getrandbits(1) for _ in range(length)])
+
+def equivalence_test(n=2000, seed=1234):
+    """Compare move sequences and master keys of all three cores on n inputs."""
+    print(f"Running equivalence test with {n} random inputs (seed={seed})...")
+    rng = random.Random(seed)
+    mismatches = 0
+    fast_time = reference_time = bitboard_time = 0.0
+
+    for i in range(n):
+        bits = random_bits(rng)
+        plies = rng.choice([100, 100, 100, rng.randint(1, 300)])
+        prioritize = rng.random() < 0.9
+
+        start = time.perf_counter()
+        fast = _simulate_chess(bits, plies, prioritize)
+        fast_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        reference = _simulate_chess_reference(bits, plies, prioritize)
+        reference_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        bitboard = bitperm.simulate(bits, plies, prioritize)
+        bitboard_time += time.perf_counter() - start
+
+        reference_moves = [(m.from_square, m.to_square, m.promotion or 0) for m in reference.move_stack]
+        if (fast.move_stack != reference.move_stack or bitboard.moves != reference_moves or
+                _board_to_master_key(fast) != _board_to_master_key(reference) or
+                bitperm.master_key(bitboard) != _board_to_master_key(reference)):
+            mismatches += 1
+            print(f"MISMATCH at input {i}: plies={plies} prioritize={prioritize} bits={bits.to_list()}")
+
+        if i % 500 == 0:
+            print(f"Checked {i}/{n} inputs...")
+
+    print(f"\nEquivalence Test Results:")
+    print(f"Inputs checked: {n}")
+    print(f"Mismatches: {mismatches}")
+    print(f"Reference core: {reference_time / n * 1000:.2f} ms/simulation")
+    print(f"Fast core:      {fast_time / n * 1000:.2f} ms/simulation")
+    print(f"Bitboard core:  {bitboard_time / n * 1000:.2f} ms/simulation")
+    print(f"Speedup: {reference_time / fast_time:.2f}x (fast), {reference_time / bitboard_time:.2f}x (bitboard)")
+    return mismatches
+
+if __name__ == "__main__":
+    sys.exit(1 if equivalence_test() else 0)
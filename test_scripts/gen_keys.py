@@ -1,110 +1,211 @@
 #!/usr/bin/env python3
 """
 Generate a large sample of keys for randomness testing.
+Random PGNs (or passwords) are generated lazily, derived in a worker pool and
+streamed through a buffered writer, so memory stays constant however large
+the sample. Output is raw binary, dieharder's ASCII input format or NIST STS
+ASCII bits; rerunning an interrupted command resumes where the file ends.
 """
 
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from chessperm import derive_master_key
+from chessperm import derive_master_keys_batch
+import json
+import time
 import random
+import struct
+import argparse
+from itertools import islice
 from chess import Board
 
-def generate_random_pgns(n, depth=12):
-    """Generate n random PGN strings with specified depth."""
-    pgns = []
-    for _ in range(n):
-        # Create a random chess game
-        game = Board()
-        moves = []
-        
-        # Generate random moves up to depth
-        for i in range(depth):
-            legal_moves = list(game.legal_moves)
-            if not legal_moves:
-                break
-            move = random.choice(legal_moves)
-            game.push(move)
-            moves.append(game.san(move))
-        
-        pgn = game.pgn()
-        if pgn.strip():
-            pgns.append(pgn)
-    
-    return pgns
-
-def generate_key_sample(num_keys=50000, output_file="keys.bin"):
-    """Generate a large sample of keys for randomness testing."""
-    print(f"Generating {num_keys} keys for randomness testing...")
-    
-    keys = b''
-    pgns = generate_random_pgns(num_keys, depth=12)
-    
-    for i, pgn in enumerate(pgns):
-        if i % 1000 == 0:
-            print(f"Generated {i}/{num_keys} keys...")
-        
-        try:
-            key = derive_master_key(pgn)
-            keys += key
-        except Exception as e:
-            print(f"Error generating key for PGN {i}: {e}")
-            continue
-    
-    # Write to binary file
-    with open(output_file, "wb") as f:
-        f.write(keys)
-    
-    print(f"Generated {len(keys)} bytes of key data")
+KEY_BYTES = 32
+# Inputs per independently seeded block, so a resumed run skips straight to its block
+BLOCK = 4096
+FORMATS = ("bin", "dieharder", "nist")
+PASSWORD_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!@#$%^&*"
+
+def random_pgn(rng, depth=12):
+    """A random PGN string with specified depth."""
+    game = Board()
+    for _ in range(depth):
+        legal_moves = list(game.legal_moves)
+        if not legal_moves:
+            break
+        game.push(rng.choice(legal_moves))
+    return Board().variation_san(game.move_stack)
+
+def random_password(rng):
+    return ''.join(rng.choice(PASSWORD_CHARS) for _ in range(rng.randint(8, 16)))
+
+def sample_inputs(source, seed, start=0, depth=12):
+    """Endless stream of random PGNs or passwords, beginning at input number `start`."""
+    block, skip = divmod(start, BLOCK)
+    while True:
+        rng = random.Random(f"{seed}:{block}")
+        for _ in range(BLOCK):
+            item = random_pgn(rng, depth) if source == 'pgn' else random_password(rng)
+            if skip:
+                skip -= 1
+                continue
+            yield item
+        block += 1
+
+def _encode_nist(data):
+    # One ASCII '0'/'1' per bit, most significant first (STS input mode 0)
+    return bin(int.from_bytes(data, 'big') | 1 << 8 * len(data))[3:].encode()
+
+def _encode_dieharder(data):
+    return b''.join(b'%d\n' % v for v in struct.unpack(f'>{len(data) // 4}I', data))
+
+def parse_size(text):
+    """Byte count with an optional K/M/G suffix (powers of 1024)."""
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    text = text.strip().upper().removesuffix('B')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+class KeySink:
+    """Buffered writer of key material in one of FORMATS.
+
+    The run's parameters are checkpointed in `<output>.json`; opening an
+    output that has one resumes it after its last complete record.
+    """
+
+    def __init__(self, path, fmt, target, source='pgn', seed=None, depth=12):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format: {fmt}")
+        if fmt == 'dieharder':
+            target -= target % 4        # whole 32-bit numbers only
+        self.path, self.fmt, self.target = path, fmt, target
+        self.encode = {'bin': bytes, 'nist': _encode_nist, 'dieharder': _encode_dieharder}[fmt]
+        run = {"source": source, "format": fmt, "depth": depth}
+        if fmt == 'dieharder':
+            run["target"] = target      # the header states the count
+        meta_path = path + ".json"
+
+        if os.path.exists(path) and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                saved = json.load(f)
+            seed = saved["seed"] if seed is None else seed
+            differ = sorted(k for k in {**run, "seed": seed} if saved.get(k) != {**run, "seed": seed}[k])
+            if differ:
+                raise SystemExit(f"{path} was written with a different {', '.join(differ)}; "
+                                 f"remove it or choose another output file")
+            self.seed = seed
+            self.written = self._recover()
+        else:
+            self.seed = random.randrange(2 ** 32) if seed is None else seed
+            self.written = 0
+            with open(path, "wb") as f:
+                f.write(self._header())
+        with open(meta_path, "w") as f:
+            json.dump({**run, "seed": self.seed, "target": target}, f)
+        self._file = open(path, "ab", buffering=1 << 20)
+
+    def _header(self):
+        if self.fmt != 'dieharder':
+            return b''
+        return (f"#==================================================================\n"
+                f"# generator chessperm  seed = {self.seed}\n"
+                f"#==================================================================\n"
+                f"type: d\ncount: {self.target // 4}\nnumbit: 32\n").encode()
+
+    def _recover(self):
+        """Key bytes already in the file, after cutting off any partial trailing record."""
+        size = os.path.getsize(self.path)
+        if self.fmt == 'bin':
+            return size
+        if self.fmt == 'nist':
+            keep = size - size % 8
+            os.truncate(self.path, keep)
+            return keep // 8
+        header = self._header()
+        numbers, end = 0, len(header)
+        with open(self.path, "rb") as f:
+            if f.read(len(header)) != header:
+                raise SystemExit(f"{self.path} does not start with this run's dieharder header")
+            pos = len(header)
+            while block := f.read(1 << 20):
+                numbers += block.count(b'\n')
+                last = block.rfind(b'\n')
+                if last >= 0:
+                    end = pos + last + 1
+                pos += len(block)
+        os.truncate(self.path, end)
+        return numbers * 4
+
+    def write(self, data: bytes):
+        self._file.write(self.encode(data))
+        self.written += len(data)
+
+    def close(self):
+        self._file.close()
+
+def stream_keys(output_file, target_bytes, source='pgn', fmt='bin', seed=None, workers=None, depth=12):
+    """Derive keys until `output_file` holds `target_bytes` of key material."""
+    sink = KeySink(output_file, fmt, target_bytes, source, seed, depth)
+    target = sink.target
+    if sink.written:
+        print(f"Resuming {output_file} at {sink.written}/{target} bytes")
+    print(f"Generating {target} bytes of {source}-derived keys as {fmt} (seed {sink.seed})...")
+
+    first, skip = divmod(sink.written, KEY_BYTES)
+    needed = max(-(-target // KEY_BYTES) - first, 0)
+    inputs = islice(sample_inputs(source, sink.seed, first, depth), needed)
+    report = max(1000, needed // 100)
+    started = time.perf_counter()
+    try:
+        for i, key in enumerate(derive_master_keys_batch(inputs, workers=workers, mode=source), 1):
+            sink.write(key[skip:target - sink.written + skip])
+            skip = 0
+            if i % report == 0:
+                print(f"Generated {sink.written}/{target} bytes "
+                      f"({i / (time.perf_counter() - started):.0f} keys/sec)...")
+    finally:
+        sink.close()
+
+    print(f"Generated {sink.written} bytes of key data")
     print(f"Saved to {output_file}")
-    print(f"Number of complete keys: {len(keys) // 32}")
-    
+    print(f"Number of complete keys: {sink.written // KEY_BYTES}")
     return output_file
 
-def generate_password_keys(num_keys=10000, output_file="password_keys.bin"):
+def generate_key_sample(num_keys=50000, output_file="keys.bin", fmt='bin', seed=None, workers=None):
+    """Generate a large sample of keys for randomness testing."""
+    return stream_keys(output_file, num_keys * KEY_BYTES, 'pgn', fmt, seed, workers)
+
+def generate_password_keys(num_keys=10000, output_file="password_keys.bin", fmt='bin', seed=None, workers=None):
     """Generate keys from random passwords for testing."""
-    print(f"Generating {num_keys} password-based keys...")
-    
-    keys = b''
-    
-    # Generate random passwords
-    password_chars = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!@#$%^&*"
-    
-    for i in range(num_keys):
-        if i % 1000 == 0:
-            print(f"Generated {i}/{num_keys} password keys...")
-        
-        # Generate random password
-        password_length = random.randint(8, 16)
-        password = ''.join(random.choice(password_chars) for _ in range(password_length))
-        
-        try:
-            key = derive_master_key(password)
-            keys += key
-        except Exception as e:
-            print(f"Error generating key for password {i}: {e}")
-            continue
-    
-    # Write to binary file
-    with open(output_file, "wb") as f:
-        f.write(keys)
-    
-    print(f"Generated {len(keys)} bytes of password key data")
-    print(f"Saved to {output_file}")
-    print(f"Number of complete keys: {len(keys) // 32}")
-    
-    return output_file
+    return stream_keys(output_file, num_keys * KEY_BYTES, 'password', fmt, seed, workers)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", nargs="?", help="Write one sample here (default: pgn_keys.bin and password_keys.bin)")
+    parser.add_argument("--bytes", type=parse_size, help="Key material to write, e.g. 512M or 4G (default: 50,000 keys)")
+    parser.add_argument("--source", choices=("pgn", "password"), default="pgn")
+    parser.add_argument("--format", choices=FORMATS, default="bin",
+                        help="bin: raw bytes; dieharder: ASCII for -g 202; nist: ASCII bits for STS")
+    parser.add_argument("--seed", type=int, help="Input generator seed (default: random, saved for resume)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count, 0 = inline)")
+    args = parser.parse_args()
+
+    if args.output:
+        stream_keys(args.output, args.bytes or 50000 * KEY_BYTES, args.source, args.format, args.seed, args.workers)
+        return
 
-if __name__ == "__main__":
     # Generate PGN-based keys
-    generate_key_sample(50000, "pgn_keys.bin")
-    
+    generate_key_sample(50000, "pgn_keys.bin", args.format, args.seed, args.workers)
+
     # Generate password-based keys
-    generate_password_keys(10000, "password_keys.bin")
-    
+    generate_password_keys(10000, "password_keys.bin", args.format, args.seed, args.workers)
+
     print("\nKey generation complete!")
     print("Files created:")
     print("- pgn_keys.bin: 50,000 PGN-based keys")
     print("- password_keys.bin: 10,000 password-based keys")
-    print("\nYou can now run randomness tests on these files.") 
\ No newline at end of file
+    print("\nYou can now run randomness tests on these files.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the Kyber KEM context pool.
+Compares a fresh liboqs context per call against the pooled contexts.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from kyber_kem import KemPool, DEFAULT_ALG
+from script_metrics import record
+import time
+import oqs
+
+def fresh_generate_keypair(alg):
+    kem = oqs.KeyEncapsulation(alg)
+    return kem.generate_keypair(), kem.export_secret_key()
+
+def fresh_encapsulate(alg, public_key):
+    return oqs.KeyEncapsulation(alg).encap_secret(public_key)
+
+def fresh_decapsulate(alg, ciphertext, secret_key):
+    return oqs.KeyEncapsulation(alg, secret_key=secret_key).decap_secret(ciphertext)
+
+def time_op(fn, n):
+    """Average microseconds per call over n calls after a short warmup."""
+    for _ in range(min(n, 20)):
+        fn()
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e6
+
+def kem_benchmark(alg=DEFAULT_ALG, n=2000):
+    """Time keygen/encap/decap with fresh and pooled contexts."""
+    print(f"Benchmarking {alg} KEM contexts ({n} calls per operation)...")
+    pool = KemPool(alg)
+    print(f"Pooled decapsulation self-check: {'passed' if pool.rebinding else 'FAILED, decap uses fresh contexts'}")
+    public_key, secret_key = pool.generate_keypair()
+    ciphertext, shared = pool.encapsulate(public_key)
+    assert fresh_decapsulate(alg, ciphertext, secret_key) == shared
+    assert pool.decapsulate(ciphertext, secret_key) == shared
+
+    ops = [
+        ("keygen", lambda: fresh_generate_keypair(alg), pool.generate_keypair),
+        ("encap",  lambda: fresh_encapsulate(alg, public_key), lambda: pool.encapsulate(public_key)),
+        ("decap",  lambda: fresh_decapsulate(alg, ciphertext, secret_key),
+                   lambda: pool.decapsulate(ciphertext, secret_key)),
+    ]
+    results = {}
+    print(f"\n{'op':8} {'fresh us':>10} {'pooled us':>10} {'saved':>8}")
+    for name, fresh, pooled in ops:
+        fresh_us = time_op(fresh, n)
+        pooled_us = time_op(pooled, n)
+        results[f"{name}_fresh_us"] = round(fresh_us, 1)
+        results[f"{name}_pooled_us"] = round(pooled_us, 1)
+        print(f"{name:8} {fresh_us:10.1f} {pooled_us:10.1f} {(1 - pooled_us / fresh_us) * 100:7.1f}%")
+    record(alg=alg, oqs_version=getattr(oqs, "oqs_python_version", lambda: None)(),
+           rebinding=pool.rebinding, **results)
+    return results
+
+if __name__ == "__main__":
+    kem_benchmark(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_ALG)
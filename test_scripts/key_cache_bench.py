@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the master-key cache.
+Replays workloads where the same PGNs and passwords recur and compares
+derivation time with and without MasterKeyCache.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from chessperm import MasterKeyCache, derive_master_key, derive_master_key_from_password
+import time
+import random
+
+PGNS = [
+    "1. e4 e5 2. Nf3 Nc6 3. Bb5 a6",
+    "1. d4 d5 2. c4 e6 3. Nc3 Nf6",
+    "1. e4 c5 2. Nf3 d6 3. d4 cxd4 4. Nxd4 Nf6",
+    "1. c4 e5 2. Nc3 Nf6 3. g3 d5",
+]
+
+def make_workload(requests, distinct, seed=0):
+    """`requests` (mode, secret) pairs drawn from `distinct` inputs, most recent ones favoured."""
+    rng = random.Random(seed)
+    inputs = [('pgn', PGNS[i % len(PGNS)] + f" {i + 4}. a3") if i % 2 else ('password', f"password-{i}")
+              for i in range(distinct)]
+    workload = []
+    for i in range(requests):
+        # Runs of the same input, as when one key encrypts a series of messages
+        if workload and rng.random() < 0.5:
+            workload.append(workload[-1])
+        else:
+            workload.append(rng.choice(inputs))
+    return workload
+
+def uncached(mode, secret):
+    derive = derive_master_key_from_password if mode == 'password' else derive_master_key
+    return derive(secret)
+
+def run(workload, derive):
+    start = time.perf_counter()
+    keys = [derive(mode, secret) for mode, secret in workload]
+    return time.perf_counter() - start, keys
+
+def check_cache():
+    """LRU order, TTL expiry and zeroization on eviction."""
+    cache = MasterKeyCache(max_entries=2, ttl=0.05)
+    for name in ("a", "b"):
+        cache.put('password', name, b'\x11' * 32)
+    cache.get('password', 'a')                       # a becomes most recent, b is next to go
+    held = cache._entries[next(iter(cache._entries))][0]
+    cache.put('password', 'c', b'\x22' * 32)
+    assert cache.get('password', 'b') is None and cache.get('password', 'a') is not None
+    assert held == bytearray(32), "Evicted key was not zeroed"
+    untouched = cache._entries[next(reversed(cache._entries))][0]
+    time.sleep(0.06)
+    assert cache.get('password', 'a') is None, "Expired key was returned"
+    # The lookup sweeps out every expired entry, not just the one asked for
+    assert cache.stats()["entries"] == 0 and untouched == bytearray(32), "Expired key was not purged"
+    assert cache.stats()["evictions"] == 1 and cache.stats()["expirations"] == 2
+    print("LRU eviction, TTL expiry, purging and zeroization: OK")
+
+def key_cache_benchmark(requests=500):
+    print(f"Benchmarking master-key cache ({requests} derivations per workload)...")
+    check_cache()
+    print(f"\n{'distinct':>9} {'uncached s':>11} {'cached s':>9} {'hit rate':>9} {'speedup':>8}")
+    for distinct in (5, 50, 250, requests):
+        workload = make_workload(requests, distinct)
+        cache = MasterKeyCache(max_entries=128, ttl=300)
+        plain_s, expected = run(workload, uncached)
+        cached_s, keys = run(workload, cache.derive)
+        assert keys == expected, "Cached keys differ from derived keys"
+        print(f"{distinct:9} {plain_s:11.2f} {cached_s:9.2f} {cache.stats()['hit_rate']:9.1%} "
+              f"{plain_s / cached_s:7.1f}x")
+
+if __name__ == "__main__":
+    key_cache_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Legacy PGN key test.
+Pins the master keys that annotated PGNs derived before the PGN lexer
+(when moves inside {comments} and (variations) were played), checks that
+derive_legacy_master_key still reproduces them, and that /api/decrypt
+opens a package sealed with such a key.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+# Run "process" work on threads, so the encrypt endpoint below can be pointed at the legacy key
+os.environ.setdefault("CHESSPERM_PROCESS_WORKERS", "0")
+
+from chessperm import derive_master_key, derive_legacy_master_key
+from script_metrics import record
+import io
+import asyncio
+import zipfile
+
+# (PGN, key from the whitespace tokenizer, whether the lexer now derives a different key)
+PINNED = [
+    ("1. e4 e5 2. Nf3 Nc6 3. Bb5 a6 4. Ba4 Nf6 5. O-O Be7",
+     "000048022100000096b9e0002800012008840000025ae78000a0000480221000", False),
+    ("1. e4 {Best by test; 1. d4 is also fine} e5 2. Nf3 (2. f4 exf4 3. Nf3) Nc6 3. Bb5 $1 a6 1-0",
+     "100010048000400869191e000044000401200010021a46478000110001004800", False),
+    ("1. d4 Nf6 2. c4 e6 {Nimzo or Queen's Indian? 3. Nc3 Bb4} 3. Nf3 (3. Nc3 Bb4 4. Qc2 (4. e3 O-O)) b6 *",
+     "0000000001100000e600034000000000440000398000d0000000001100000e60", True),
+    ("[Event \"Casual\"]\n[Site \"?\"]\n\n1. e4 c5 2. Nf3 d6 {Najdorf: 3. d4 cxd4 4. Nxd4 Nf6 5. Nc3 a6} 3. Bb5+ Bd7 1/2-1/2",
+     "202011809010000141611911e000088080460240400005058464478000220201", True),
+    ("1. e4! e5!? 2. Qh5?! (2. Nf3) Nc6 3. Bc4 Nf6?? 4. Qxf7# 1-0",
+     "0002400000000020e1600008000900000000008385800020002400000000020e", False),
+]
+
+def pinned_key_test():
+    """Legacy keys match the pinned ones; unchanged PGNs need no legacy key."""
+    print("Checking pinned legacy keys...")
+    failures = 0
+    for pgn, expected, changed in PINNED:
+        legacy = derive_legacy_master_key(pgn)
+        key = legacy if changed else derive_master_key(pgn)
+        if key is None or key.hex() != expected or (legacy is not None) != changed:
+            failures += 1
+            print(f"MISMATCH for {pgn[:60]!r}: got {key.hex() if key else None}, legacy={legacy is not None}")
+    print(f"  {len(PINNED)} PGNs, {failures} mismatches")
+    return failures
+
+def decrypt_fallback_test():
+    """A package sealed with a legacy key opens through /api/decrypt with today's PGN."""
+    print("Checking /api/decrypt falls back to the legacy key...")
+    try:
+        import httpx
+        from backend import main
+    except ImportError as e:
+        print(f"  skipped ({e})")
+        return 0
+
+    pgn = next(pgn for pgn, _, changed in PINNED if changed)
+    message = "sealed before the PGN lexer"
+
+    async def round_trip():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=300) as client:
+            derive = main._derive
+            main._derive = lambda input_type, pgn, password: derive_legacy_master_key(pgn)
+            try:
+                r = await client.post("/api/encrypt", data={'input_type': 'pgn', 'pgn': pgn, 'message': message})
+            finally:
+                main._derive = derive
+            r.raise_for_status()
+            with zipfile.ZipFile(io.BytesIO(r.content)) as z:
+                private_key = z.read("private_key.txt").decode()
+            r = await client.post("/api/decrypt", data={'input_type': 'pgn', 'pgn': pgn, 'private_key': private_key},
+                                  files={'file': ('chessperm_package.zip', r.content, 'application/zip')})
+            return r.status_code, r.json()
+
+    status, body = asyncio.run(round_trip())
+    if status != 200 or body.get("message") != message:
+        print(f"  FAILED: {status} {body}")
+        return 1
+    print("  legacy package decrypted")
+    return 0
+
+def legacy_pgn_test():
+    failures = pinned_key_test() + decrypt_fallback_test()
+    print(f"\nLegacy PGN Test Results:")
+    print(f"Failures: {failures}")
+    record(failures=failures, pinned_pgns=len(PINNED))
+    return failures
+
+if __name__ == "__main__":
+    sys.exit(1 if legacy_pgn_test() else 0)
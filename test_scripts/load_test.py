@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Load test for the ChessPerm API.
+Fires concurrent encrypt/decrypt round-trips and reports latency percentiles
+together with the server's worker-pool queue metrics.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import io
+import json
+import time
+import random
+import asyncio
+import zipfile
+import argparse
+import httpx
+
+PGNS = [
+    "1. e4 e5 2. Nf3 Nc6 3. Bb5 a6",
+    "1. d4 d5 2. c4 e6 3. Nc3 Nf6",
+    "1. e4 c5 2. Nf3 d6 3. d4 cxd4 4. Nxd4 Nf6",
+]
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of floats."""
+    ordered = sorted(values)
+    return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+async def round_trip(client, i):
+    """Encrypt then decrypt one message; return (encrypt_s, decrypt_s)."""
+    fields = ({'input_type': 'password', 'password': f"load-test-{i}"} if i % 2
+              else {'input_type': 'pgn', 'pgn': random.choice(PGNS)})
+    message = f"load test message {i}"
+
+    start = time.perf_counter()
+    r = await client.post("/api/encrypt", data={**fields, 'message': message})
+    r.raise_for_status()
+    encrypt_s = time.perf_counter() - start
+
+    with zipfile.ZipFile(io.BytesIO(r.content)) as z:
+        private_key = z.read("private_key.txt").decode()
+
+    start = time.perf_counter()
+    r = await client.post("/api/decrypt", data={**fields, 'private_key': private_key},
+                          files={'file': ('chessperm_package.zip', r.content, 'application/zip')})
+    r.raise_for_status()
+    decrypt_s = time.perf_counter() - start
+    assert r.json()["message"] == message, f"Round-trip {i} returned the wrong message"
+    return encrypt_s, decrypt_s
+
+async def load_test(client, requests=200, concurrency=16):
+    """Run `requests` round-trips with at most `concurrency` in flight."""
+    print(f"Running {requests} round-trips at concurrency {concurrency}...")
+    gate = asyncio.Semaphore(concurrency)
+
+    async def limited(i):
+        async with gate:
+            return await round_trip(client, i)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(limited(i) for i in range(requests)))
+    total = time.perf_counter() - start
+
+    print(f"\nLoad Test Results:")
+    print(f"Total time: {total:.2f} seconds")
+    print(f"Throughput: {requests / total:.1f} round-trips/sec")
+    for name, samples in (("encrypt", [r[0] for r in results]), ("decrypt", [r[1] for r in results])):
+        print(f"{name:8} p50: {percentile(samples, 0.50) * 1000:8.1f} ms   "
+              f"p95: {percentile(samples, 0.95) * 1000:8.1f} ms   "
+              f"p99: {percentile(samples, 0.99) * 1000:8.1f} ms")
+
+    stats = (await client.get("/api/workers")).json()
+    print(f"\nWorker pools:")
+    for pool, s in stats.items():
+        print(f"{pool:10} workers: {s['workers']:3}  completed: {s['completed']:6}  "
+              f"wait avg: {s['wait_ms_avg']:7.1f} ms  p99: {s['wait_ms_p99']:7.1f} ms  "
+              f"max: {s['wait_ms_max']:7.1f} ms")
+
+async def batch_test(client, messages=200, batch_size=50, concurrency=16):
+    """Encrypt `messages` one request each, then through /api/encrypt-batch, and compare."""
+    print(f"Encrypting {messages} messages singly and in batches of {batch_size}...")
+    fields = {'input_type': 'pgn', 'pgn': PGNS[0]}
+    gate = asyncio.Semaphore(concurrency)
+
+    async def single(i):
+        async with gate:
+            r = await client.post("/api/encrypt", data={**fields, 'message': f"batch test message {i}"})
+            r.raise_for_status()
+
+    async def batch(start):
+        items = [{'message': f"batch test message {i}"} for i in range(start, min(start + batch_size, messages))]
+        async with gate:
+            r = await client.post("/api/encrypt-batch", json={**fields, 'items': items})
+            r.raise_for_status()
+        with zipfile.ZipFile(io.BytesIO(r.content)) as z:
+            manifest = json.loads(z.read("manifest.json"))
+        assert manifest["succeeded"] == len(items), f"Batch at {start} had failures: {manifest['failed']}"
+
+    start = time.perf_counter()
+    await asyncio.gather(*(single(i) for i in range(messages)))
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await asyncio.gather(*(batch(i) for i in range(0, messages, batch_size)))
+    batch_s = time.perf_counter() - start
+
+    print(f"\nBatch Test Results:")
+    print(f"/api/encrypt:       {single_s:7.2f} s  ({messages / single_s:7.1f} messages/sec)")
+    print(f"/api/encrypt-batch: {batch_s:7.2f} s  ({messages / batch_s:7.1f} messages/sec)")
+    print(f"Speedup: {single_s / batch_s:.2f}x")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of a running server")
+    parser.add_argument("--in-process", action="store_true", help="Drive backend.main.app directly via ASGI")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch", type=int, default=0, metavar="SIZE",
+                        help="Compare /api/encrypt against /api/encrypt-batch with SIZE items per batch")
+    args = parser.parse_args()
+
+    if args.in_process:
+        from backend.main import app
+        transport, base_url = httpx.ASGITransport(app=app), "http://test"
+    else:
+        transport, base_url = None, args.url
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=300) as client:
+        if args.batch:
+            await batch_test(client, args.requests, args.batch, args.concurrency)
+        else:
+            await load_test(client, args.requests, args.concurrency)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for stego extraction on large covers.
+Compares extraction through a full PIL decode with the incremental PNG
+row decoder on 4K and 8K stego images.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from stego import embed_data_in_image, extract_data_from_image
+from upload_bench import PeakRSS
+import io
+import time
+import numpy as np
+from PIL import Image
+
+SIZES = {"4K": (3840, 2160), "8K": (7680, 4320)}
+
+def make_stego_png(width, height, payload, seed=0):
+    """Photo-like cover (gradients plus noise) with the payload embedded, as PNG bytes."""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack([(x // 16) % 256, (y // 9) % 256, ((x + y) // 24) % 256], axis=-1)
+    pixels = (pixels + rng.integers(0, 4, size=pixels.shape)).astype(np.uint8)
+    buf = io.BytesIO()
+    embed_data_in_image(Image.fromarray(pixels), payload, buf)
+    return buf.getvalue()
+
+def measure(fn, repeats):
+    """Return (average seconds, peak RSS growth in MB) for fn()."""
+    with PeakRSS() as rss:
+        fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats, rss.growth_mb
+
+def png_benchmark(payload_sizes=(1024, 16 * 1024, 256 * 1024), repeats=3):
+    print("Benchmarking stego extraction on large covers...")
+    for label, (width, height) in SIZES.items():
+        for payload_size in payload_sizes:
+            payload = os.urandom(payload_size)
+            png = make_stego_png(width, height, payload)
+            print(f"\n{label} cover {width}x{height} ({len(png) / 1024 / 1024:.1f} MB PNG), "
+                  f"payload {payload_size // 1024} KB")
+
+            full = lambda: extract_data_from_image(Image.open(io.BytesIO(png)))
+            rows = lambda: extract_data_from_image(png)
+            assert full() == payload and rows() == payload, "Extraction mismatch"
+
+            for name, fn in (("row decoder", rows), ("full decode", full)):
+                elapsed, growth = measure(fn, repeats)
+                print(f"  {name:12} {elapsed * 1000:9.1f} ms   peak RSS growth {growth:8.1f} MB")
+
+if __name__ == "__main__":
+    png_benchmark()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the PGN prefix trie.
+Builds an opening-heavy corpus (popular openings followed by random
+continuations) and compares plain replay with PgnReplay, for move parsing
+alone and for full batch key derivation.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from chessperm import PgnReplay, _pgn_move_bits, derive_master_keys_batch
+import time
+import random
+import chess
+
+OPENINGS = [
+    "e4 e5 Nf3 Nc6 Bb5 a6 Ba4 Nf6 O-O Be7 Re1 b5 Bb3 d6",        # Ruy Lopez, closed
+    "e4 e5 Nf3 Nc6 Bc4 Bc5 c3 Nf6 d4 exd4 cxd4 Bb4+",            # Italian
+    "e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6 Nc3 a6 Be3 e5",               # Najdorf
+    "e4 c5 Nf3 Nc6 d4 cxd4 Nxd4 Nf6 Nc3 e5 Ndb5 d6",             # Sveshnikov
+    "e4 e6 d4 d5 Nc3 Bb4 e5 c5 a3 Bxc3+ bxc3 Ne7",               # French, Winawer
+    "e4 c6 d4 d5 e5 Bf5 Nf3 e6 Be2 c5 Be3",                      # Caro-Kann, advance
+    "d4 d5 c4 e6 Nc3 Nf6 Bg5 Be7 e3 O-O Nf3 h6",                 # QGD
+    "d4 d5 c4 c6 Nf3 Nf6 Nc3 dxc4 a4 Bf5 e3 e6",                 # Slav
+    "d4 Nf6 c4 g6 Nc3 Bg7 e4 d6 Nf3 O-O Be2 e5",                 # King's Indian
+    "d4 Nf6 c4 e6 Nc3 Bb4 Qc2 O-O a3 Bxc3+ Qxc3 b6",             # Nimzo-Indian
+    "d4 Nf6 c4 e6 Nf3 b6 g3 Ba6 b3 Bb4+ Bd2 Be7",                # Queen's Indian
+    "c4 e5 Nc3 Nf6 Nf3 Nc6 g3 d5 cxd5 Nxd5 Bg2 Nb6",             # English
+    "Nf3 d5 g3 Nf6 Bg2 e6 O-O Be7 d3 O-O",                       # Reti / KIA
+    "e4 e5 Nf3 Nf6 Nxe5 d6 Nf3 Nxe4 d4 d5 Bd3 Nc6",              # Petroff
+]
+
+def make_corpus(games=2000, continuation=(4, 24), seed=0):
+    """PGN movetext: a random opening (cut at a random depth) plus random legal moves."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(games):
+        sans = rng.choice(OPENINGS).split()
+        board = chess.Board()
+        for san in sans[:rng.randint(len(sans) // 2, len(sans))]:
+            board.push_san(san)
+        for _ in range(rng.randint(*continuation)):
+            moves = list(board.legal_moves)
+            if not moves:
+                break
+            board.push(rng.choice(moves))
+        corpus.append(chess.Board().variation_san(board.move_stack))
+    return corpus
+
+def replay_benchmark(games=2000):
+    corpus = make_corpus(games)
+    print(f"Benchmarking PGN replay on {len(corpus)} games over {len(OPENINGS)} openings...")
+
+    start = time.perf_counter()
+    plain = [_pgn_move_bits(pgn) for pgn in corpus]
+    plain_s = time.perf_counter() - start
+
+    trie = PgnReplay()
+    print(f"\nMove parsing:")
+    print(f"  plain replay:        {plain_s:7.2f} s")
+    for label in ("prefix trie (cold):", "prefix trie (warm):"):
+        start = time.perf_counter()
+        cached = [trie.move_bits(pgn) for pgn in corpus]
+        trie_s = time.perf_counter() - start
+        assert [(b.value, b.length) for b in plain] == [(b.value, b.length) for b in cached], "Move bits differ"
+        print(f"  {label:20} {trie_s:7.2f} s  ({plain_s / trie_s:.2f}x)")
+    stats = trie.stats()
+    print(f"  {stats['cached_fraction']:.1%} of tokens served from the trie, {stats['nodes']} nodes")
+
+    sample = corpus[:games // 4]
+    results = {}
+    for replay in (False, True):
+        start = time.perf_counter()
+        results[replay] = list(derive_master_keys_batch(sample, workers=0, replay=replay))
+        results[replay, 's'] = time.perf_counter() - start
+    assert results[False] == results[True], "Derived keys differ"
+    print(f"\nBatch key derivation ({len(sample)} games, inline):")
+    print(f"  plain replay:        {results[False, 's']:7.2f} s")
+    print(f"  prefix trie:         {results[True, 's']:7.2f} s  ({results[False, 's'] / results[True, 's']:.2f}x)")
+
+if __name__ == "__main__":
+    replay_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
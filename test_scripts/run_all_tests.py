@@ -1,88 +1,246 @@
 #!/usr/bin/env python3
 """
 Comprehensive test runner for ChessPerm security analysis.
-Runs all security tests and generates a report.
+Runs the security tests concurrently, each in its own subprocess with a
+timeout, collects the JSON metrics every script records (script_metrics.py)
+and generates a report with trend deltas against each test's latest run
+in earlier chessperm_security_report_* files.
 """
 
 import sys
 import os
+import re
+import glob
+import json
 import time
+import shutil
+import signal
+import argparse
+import tempfile
 import subprocess
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Add backend to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-def run_test(test_name, test_script, description=""):
-    """Run a test and return results."""
-    print(f"\n{'='*60}")
-    print(f"Running {test_name}")
-    print(f"{'='*60}")
-    if description:
-        print(f"Description: {description}")
-    
-    start_time = time.time()
-    
+from script_metrics import ENV as METRICS_ENV
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPORT_PREFIX = "chessperm_security_report_"
+
+# Default per-test timeouts are generous for a single core; --timeout overrides them all
+TESTS = [
+    {
+        'name': 'Collision Test',
+        'script': 'collision_test.py',
+        'description': 'Tests for hash collisions in derived master keys',
+        'timeout': 1800,
+    },
+    {
+        'name': 'Avalanche Test',
+        'script': 'avalanche_test.py',
+        'description': 'Tests avalanche effect and bit propagation',
+        'timeout': 600,
+    },
+    {
+        'name': 'Timing Analysis',
+        'script': 'timing.py',
+        'description': 'Analyzes timing characteristics for side-channel resistance',
+        'timeout': 600,
+        'exclusive': True,
+    },
+    {
+        'name': 'Differential Propagation',
+        'script': 'diff_probe.py',
+        'description': 'Tests how single-bit changes propagate through the system',
+        'timeout': 600,
+    },
+    {
+        'name': 'Performance Benchmark',
+        'script': 'bench.py',
+        'description': 'Benchmarks throughput and performance characteristics',
+        'timeout': 1800,
+        'exclusive': True,
+    },
+    {
+        'name': 'Streaming AEAD Verification',
+        'script': 'stream_test.py',
+        'description': 'Round-trips the chunked AEAD stream and checks tampering, truncation and reordering are rejected',
+        'timeout': 300,
+    },
+    {
+        'name': 'Legacy PGN Keys',
+        'script': 'legacy_pgn_test.py',
+        'description': 'Checks that annotated PGNs still derive their pre-lexer keys for old packages',
+        'timeout': 300,
+    },
+]
+
+def _kill_tree(proc):
+    """Kill a test and any worker processes it started."""
+    if os.name == 'posix':
+        os.killpg(proc.pid, signal.SIGKILL)
+    else:
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(proc.pid)], capture_output=True)
+
+def _tail(path, limit=4000):
+    with open(path, 'rb') as f:
+        f.seek(max(os.path.getsize(path) - limit, 0))
+        return f.read().decode('utf-8', errors='replace')
+
+def run_test(test_name, test_script, description="", timeout=None, workdir=None):
+    """Run a test in its own subprocess and return results.
+
+    stdout and stderr go to log files in `workdir` rather than memory, and
+    the script's metrics to a JSON file named by CHESSPERM_TEST_METRICS.
+    """
+    stem = os.path.splitext(test_script)[0]
+    log_file = os.path.join(workdir, f"{stem}.log")
+    err_file = os.path.join(workdir, f"{stem}.err")
+    metrics_file = os.path.join(workdir, f"{stem}.json")
+    env = {**os.environ, METRICS_ENV: metrics_file, "PYTHONIOENCODING": "utf-8"}
+    group = ({'start_new_session': True} if os.name == 'posix'
+             else {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP})
+
+    start_time = time.perf_counter()
+    timed_out = False
     try:
-        # Run the test script
-        result = subprocess.run([sys.executable, test_script], 
-                              capture_output=True, text=True, cwd=os.path.dirname(__file__))
-        
-        end_time = time.time()
-        duration = end_time - start_time
-        
-        print(result.stdout)
-        if result.stderr:
-            print("STDERR:", result.stderr)
-        
-        success = result.returncode == 0
-        print(f"\nTest completed in {duration:.2f} seconds")
-        print(f"Status: {'✓ PASS' if success else '✗ FAIL'}")
-        
-        return {
-            'name': test_name,
-            'success': success,
-            'duration': duration,
-            'output': result.stdout,
-            'error': result.stderr
-        }
-        
+        with open(log_file, 'w') as out, open(err_file, 'w') as err:
+            proc = subprocess.Popen([sys.executable, test_script], stdout=out, stderr=err,
+                                    cwd=HERE, env=env, **group)
+            try:
+                returncode = proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                _kill_tree(proc)
+                returncode = proc.wait()
+                timed_out = True
+        error = _tail(err_file)
     except Exception as e:
-        print(f"Error running {test_name}: {e}")
-        return {
-            'name': test_name,
-            'success': False,
-            'duration': 0,
-            'output': '',
-            'error': str(e)
-        }
-
-def generate_report(results):
+        returncode, error = None, str(e)
+    duration = time.perf_counter() - start_time
+
+    metrics = {}
+    try:
+        with open(metrics_file) as f:
+            metrics = json.load(f)
+    except (OSError, ValueError):
+        pass  # nothing recorded, or the test died mid-write
+    if timed_out:
+        error = f"Timed out after {timeout} seconds\n{error}"
+
+    return {
+        'name': test_name,
+        'script': test_script,
+        'description': description,
+        'success': returncode == 0 and not timed_out,
+        'timed_out': timed_out,
+        'returncode': returncode,
+        'duration': duration,
+        'metrics': metrics,
+        'log': log_file,
+        'error': error
+    }
+
+def _status(result):
+    return "TIMEOUT" if result.get('timed_out') else "PASS" if result['success'] else "FAIL"
+
+def _read_report(path):
+    """{test name: result} from one earlier report.
+
+    JSON reports carry metrics; older text-only reports still give status and duration.
+    """
+    if path.endswith('.json'):
+        with open(path) as f:
+            return {r['name']: r for r in json.load(f)['results']}
+    tests = {}
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            match = re.match(r"^(.+): (PASS|FAIL|TIMEOUT) \(([\d.]+)s\)$", line.rstrip())
+            if match:
+                tests[match[1]] = {'success': match[2] == "PASS", 'duration': float(match[3]), 'metrics': {}}
+    return tests
+
+def load_previous_results(report_dir, names):
+    """For each test in `names`, its result in the newest earlier report that ran it."""
+    # Newest timestamp first; of a .txt/.json pair written together, take the JSON
+    reports = sorted(glob.glob(os.path.join(report_dir, f"{REPORT_PREFIX}*.json")) +
+                     glob.glob(os.path.join(report_dir, f"{REPORT_PREFIX}*.txt")),
+                     key=lambda p: (os.path.splitext(p)[0], p.endswith('.json')), reverse=True)
+    previous, seen = {}, set()
+    for path in reports:
+        stem = os.path.splitext(path)[0]
+        if stem in seen:
+            continue
+        seen.add(stem)
+        for name, result in _read_report(path).items():
+            if name in names and name not in previous:
+                previous[name] = {**result, 'file': os.path.basename(path)}
+        if len(previous) == len(names):
+            break
+    return previous
+
+def _fmt(value):
+    return f"{value:.6g}" if isinstance(value, float) else str(value)
+
+def _delta(now, before):
+    if not isinstance(now, (int, float)) or not isinstance(before, (int, float)):
+        return ""
+    change = f"{now - before:+.4g}"
+    if before:
+        change += f" ({(now - before) / abs(before) * 100:+.1f}%)"
+    return change
+
+def trend_lines(results, previous):
+    """One line per test duration and metric: current value, previous value and delta."""
+    lines = []
+    for result in results:
+        before = previous.get(result['name'])
+        lines.append(f"{result['name']}" + (f" (vs {before['file']}):" if before else ":"))
+        rows = [("duration_s", result['duration'], before and before.get('duration'))]
+        rows += [(name, value, before and before.get('metrics', {}).get(name))
+                 for name, value in result['metrics'].items()]
+        for name, value, old in rows:
+            line = f"  {name:28} {_fmt(value):>14}"
+            if old is not None:
+                line += f"   was {_fmt(old):>14}   {_delta(value, old)}"
+            lines.append(line)
+    return lines
+
+def generate_report(results, previous=None, report_dir="."):
     """Generate a comprehensive test report."""
+    generated = datetime.now()
     print(f"\n{'='*60}")
     print("CHESSPERM SECURITY TEST REPORT")
     print(f"{'='*60}")
-    print(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    
+    print(f"Generated: {generated.strftime('%Y-%m-%d %H:%M:%S')}")
+
     # Summary
     total_tests = len(results)
     passed_tests = sum(1 for r in results if r['success'])
     failed_tests = total_tests - passed_tests
     total_duration = sum(r['duration'] for r in results)
-    
+
     print(f"\nSUMMARY:")
     print(f"Total tests: {total_tests}")
     print(f"Passed: {passed_tests}")
     print(f"Failed: {failed_tests}")
     print(f"Success rate: {passed_tests/total_tests*100:.1f}%")
-    print(f"Total duration: {total_duration:.2f} seconds")
-    
+    print(f"Total duration: {total_duration:.2f} seconds (summed over tests)")
+
     # Detailed results
     print(f"\nDETAILED RESULTS:")
     for result in results:
-        status = "✓ PASS" if result['success'] else "✗ FAIL"
+        status = {"PASS": "✓ PASS", "FAIL": "✗ FAIL", "TIMEOUT": "✗ TIMEOUT"}[_status(result)]
         print(f"{result['name']:30} {status:10} {result['duration']:6.2f}s")
-    
+
+    # Metrics with trend deltas
+    previous = previous or {}
+    trends = trend_lines(results, previous)
+    print(f"\nMETRICS:")
+    for line in trends:
+        print(line)
+
     # Failed tests details
     failed_results = [r for r in results if not r['success']]
     if failed_results:
@@ -91,87 +249,116 @@ def generate_report(results):
             print(f"\n{result['name']}:")
             if result['error']:
                 print(f"Error: {result['error']}")
-    
-    # Save report to file
-    report_file = f"chessperm_security_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
-    with open(report_file, 'w') as f:
+
+    # Save report to file, plus a JSON copy the next run compares against
+    stamp = generated.strftime('%Y%m%d_%H%M%S')
+    report_file = os.path.join(report_dir, f"{REPORT_PREFIX}{stamp}.txt")
+    with open(report_file, 'w', encoding='utf-8') as f:
         f.write("CHESSPERM SECURITY TEST REPORT\n")
         f.write("="*60 + "\n")
-        f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-        
+        f.write(f"Generated: {generated.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+
         f.write("SUMMARY:\n")
         f.write(f"Total tests: {total_tests}\n")
         f.write(f"Passed: {passed_tests}\n")
         f.write(f"Failed: {failed_tests}\n")
         f.write(f"Success rate: {passed_tests/total_tests*100:.1f}%\n")
         f.write(f"Total duration: {total_duration:.2f} seconds\n\n")
-        
+
+        f.write("METRICS:\n")
+        f.write("\n".join(trends) + "\n\n")
+
         f.write("DETAILED RESULTS:\n")
         for result in results:
-            status = "PASS" if result['success'] else "FAIL"
-            f.write(f"{result['name']}: {status} ({result['duration']:.2f}s)\n")
-            if result['output']:
-                f.write(f"Output:\n{result['output']}\n")
+            f.write(f"{result['name']}: {_status(result)} ({result['duration']:.2f}s)\n")
+            if os.path.exists(result['log']) and os.path.getsize(result['log']):
+                f.write("Output:\n")
+                with open(result['log'], encoding='utf-8', errors='replace') as log:
+                    shutil.copyfileobj(log, f)
+                f.write("\n")
             if result['error']:
                 f.write(f"Error:\n{result['error']}\n")
             f.write("-"*40 + "\n")
-    
+
+    json_file = os.path.join(report_dir, f"{REPORT_PREFIX}{stamp}.json")
+    with open(json_file, 'w') as f:
+        json.dump({
+            'generated': generated.strftime('%Y-%m-%d %H:%M:%S'),
+            'previous': {name: result['file'] for name, result in previous.items()},
+            'results': [{**{key: r[key] for key in ('name', 'script', 'success', 'timed_out', 'returncode',
+                                                    'metrics')}, 'duration': round(r['duration'], 3)}
+                        for r in results],
+        }, f, indent=2)
+
     print(f"\nDetailed report saved to: {report_file}")
+    print(f"Metrics saved to: {json_file}")
+
+def _show(result, quiet=False):
+    print(f"\n{'='*60}")
+    print(f"{result['name']}: {_status(result)} in {result['duration']:.2f} seconds")
+    print(f"{'='*60}")
+    print(f"Description: {result['description']}")
+    if not quiet and os.path.exists(result['log']):
+        with open(result['log'], encoding='utf-8', errors='replace') as log:
+            shutil.copyfileobj(log, sys.stdout)
+    if result['error']:
+        print("STDERR:", result['error'])
+    if result['metrics']:
+        print(f"Metrics: {json.dumps(result['metrics'])}")
 
 def main():
     """Run all security tests."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="Tests run at once (default: CPU count)")
+    parser.add_argument("--timeout", type=float, help="Seconds before a test is killed (default: per test)")
+    parser.add_argument("--only", action="append", metavar="SCRIPT", help="Run only this script (repeatable)")
+    parser.add_argument("--report-dir", default=".", help="Where reports are written and previous ones are found")
+    parser.add_argument("--quiet", action="store_true", help="Do not echo each test's output")
+    args = parser.parse_args()
+
     print("CHESSPERM SECURITY TEST SUITE")
     print("="*60)
     print("This will run comprehensive security tests on the ChessPerm system.")
     print("Tests include collision detection, avalanche effect, timing analysis,")
     print("differential propagation, and performance benchmarking.")
-    print("\nStarting tests...")
-    
-    # Define all tests
-    tests = [
-        {
-            'name': 'Collision Test',
-            'script': 'collision_test.py',
-            'description': 'Tests for hash collisions in derived master keys'
-        },
-        {
-            'name': 'Avalanche Test',
-            'script': 'avalanche_test.py',
-            'description': 'Tests avalanche effect and bit propagation'
-        },
-        {
-            'name': 'Timing Analysis',
-            'script': 'timing.py',
-            'description': 'Analyzes timing characteristics for side-channel resistance'
-        },
-        {
-            'name': 'Differential Propagation',
-            'script': 'diff_probe.py',
-            'description': 'Tests how single-bit changes propagate through the system'
-        },
-        {
-            'name': 'Performance Benchmark',
-            'script': 'bench.py',
-            'description': 'Benchmarks throughput and performance characteristics'
-        }
-    ]
-    
-    # Run all tests
-    results = []
-    for test in tests:
-        result = run_test(test['name'], test['script'], test['description'])
-        results.append(result)
-    
-    # Generate report
-    generate_report(results)
-    
+
+    tests = [t for t in TESTS if not args.only or t['script'] in args.only or t['name'] in args.only]
+    if not tests:
+        raise SystemExit(f"No tests match {args.only}")
+    previous = load_previous_results(args.report_dir, {t['name'] for t in tests})
+    shared = [t for t in tests if not t.get('exclusive')]
+    exclusive = [t for t in tests if t.get('exclusive')]
+    print(f"\nStarting {len(tests)} tests, {args.jobs} at a time"
+          f"{f', then {len(exclusive)} timing-sensitive ones alone' if exclusive else ''}...")
+
+    # Run the tests concurrently, printing each one's output as it finishes; timing-sensitive
+    # tests then run one at a time so the others' load does not skew their numbers
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="chessperm-tests-") as workdir:
+        def run(t):
+            return run_test(t['name'], t['script'], t['description'], args.timeout or t['timeout'], workdir)
+
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            for future in as_completed([pool.submit(run, t) for t in shared]):
+                result = future.result()
+                results[result['name']] = result
+                _show(result, args.quiet)
+        for t in exclusive:
+            result = run(t)
+            results[result['name']] = result
+            _show(result, args.quiet)
+
+        # Generate report (logs are still on disk until the work directory goes away)
+        generate_report([results[t['name']] for t in tests], previous, args.report_dir)
+
     print(f"\n{'='*60}")
     print("TEST SUITE COMPLETE")
     print(f"{'='*60}")
     print("Check the generated report for detailed results.")
     print("For randomness testing, use the generated key files with:")
     print("- NIST STS: niststs --input keys.bin --blocksize 32")
-    print("- Dieharder: dieharder -a -g 202 -f keys.bin")
+    print("- Dieharder: dieharder -a -g 201 -f keys.bin")
+    sys.exit(0 if all(r['success'] for r in results.values()) else 1)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
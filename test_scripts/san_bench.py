@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the PGN front-end of ChessPerm.
+Compares the old whitespace tokenizer + parse_san with the PGN lexer and
+fast SAN resolver on annotated PGN files (comments, NAGs, variations),
+and checks both give identical move bits for the bare movetext.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from chessperm import _Bits, _pgn_move_bits
+import time
+import random
+import chess
+import chess.pgn
+
+def legacy_move_bits(pgn):
+    """The previous derive_master_key front-end: split on whitespace, try every token."""
+    board = chess.Board()
+    bits = _Bits()
+    for token in pgn.replace('\n', ' ').split():
+        if token.endswith('.'):
+            continue
+        try:
+            move = board.parse_san(token)
+            board.push(move)
+        except ValueError:
+            continue
+        if not move:
+            bits.append(0xFFF, 12)
+        else:
+            bits.append(((move.from_square & 7) << 9) | ((move.from_square >> 3) << 6) |
+                        ((move.to_square & 7) << 3) | (move.to_square >> 3), 12)
+    return bits
+
+def annotated_games(n, seed=0):
+    """Random games exported with clock comments, NAGs and side variations."""
+    rng = random.Random(seed)
+    games = []
+    for i in range(n):
+        game = chess.pgn.Game()
+        game.headers["Event"] = f"Benchmark game {i}"
+        node = game
+        for ply in range(rng.randint(30, 90)):
+            moves = list(node.board().legal_moves)
+            if not moves:
+                break
+            if rng.random() < 0.15 and len(moves) > 1:
+                side = node.add_variation(rng.choice(moves))
+                side.comment = "also possible"
+                for _ in range(rng.randint(1, 4)):
+                    side_moves = list(side.board().legal_moves)
+                    if not side_moves:
+                        break
+                    side = side.add_variation(rng.choice(side_moves))
+            node = node.add_main_variation(rng.choice(moves))
+            node.comment = f"[%clk 0:{rng.randint(0, 9):02d}:{rng.randint(0, 59):02d}]"
+            if rng.random() < 0.1:
+                node.nags.add(rng.choice([1, 2, 3, 4, 5, 6]))
+        game.headers["Result"] = rng.choice(["1-0", "0-1", "1/2-1/2", "*"])
+        games.append(game)
+    return games
+
+def read_games(path):
+    with open(path, encoding="utf-8", errors="replace") as fp:
+        games = []
+        while (game := chess.pgn.read_game(fp)) is not None:
+            games.append(game)
+    return games
+
+def export(game, annotated):
+    exporter = chess.pgn.StringExporter(headers=False, variations=annotated, comments=annotated)
+    return game.accept(exporter)
+
+def throughput(fn, texts):
+    start = time.perf_counter()
+    for text in texts:
+        fn(text)
+    return len(texts) / (time.perf_counter() - start)
+
+def san_benchmark(path=None, n=500):
+    games = read_games(path) if path else annotated_games(n)
+    annotated = [export(g, True) for g in games]
+    bare = [export(g, False) for g in games]
+    print(f"Benchmarking PGN front-end on {len(games)} games "
+          f"({'from ' + path if path else 'synthetic, annotated'})...")
+
+    mismatched = sum((a.value, a.length) != (b.value, b.length)
+                     for a, b in ((legacy_move_bits(t), _pgn_move_bits(t)) for t in bare))
+    print(f"\nBare movetext: {mismatched} of {len(bare)} games differ between old and new front-end")
+    assert mismatched == 0, "New front-end changed the move bits of well-formed games"
+    differ = sum((legacy_move_bits(t).value != _pgn_move_bits(t).value) for t in annotated)
+    print(f"Annotated movetext: {differ} games where the old tokenizer played moves out of comments/variations")
+
+    for label, texts in (("annotated", annotated), ("bare", bare)):
+        old = throughput(legacy_move_bits, texts)
+        new = throughput(_pgn_move_bits, texts)
+        print(f"\n{label:10} old: {old:8.1f} games/sec   new: {new:8.1f} games/sec   speedup: {new / old:.2f}x")
+
+if __name__ == "__main__":
+    san_benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,29 @@
+"""
+Machine-readable results for the test scripts.
+run_all_tests.py points CHESSPERM_TEST_METRICS at a JSON file; each script
+records its headline numbers there with record(), and the runner folds them
+into its report. Run on their own, the scripts record nothing.
+"""
+
+import os
+import json
+
+ENV = "CHESSPERM_TEST_METRICS"
+
+def record(**metrics):
+    """Merge `metrics` into the JSON file named by CHESSPERM_TEST_METRICS, if set."""
+    path = os.environ.get(ENV)
+    if not path:
+        return
+    current = {}
+    try:
+        with open(path) as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        pass
+    current.update({name: round(value, 6) if isinstance(value, float) else value
+                    for name, value in metrics.items()})
+    # Replace the file whole, so a test killed mid-write never leaves half a JSON document
+    with open(path + ".tmp", "w") as f:
+        json.dump(current, f, indent=2)
+    os.replace(path + ".tmp", path)
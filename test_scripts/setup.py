@@ -108,7 +108,7 @@ def main():
     print("\nFor external randomness testing:")
     print("  python gen_keys.py             # Generate key files")
     print("  niststs --input pgn_keys.bin --blocksize 32")
-    print("  dieharder -a -g 202 -f pgn_keys.bin")
+    print("  dieharder -a -g 201 -f pgn_keys.bin")
     
     return True
 
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for the stego LSB engines.
+Compares per-megapixel throughput of the python and numpy engines.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from stego import embed_data_in_image, extract_data_from_image
+import time
+import tempfile
+import numpy as np
+from PIL import Image
+
+def make_cover(path, width, height, seed=0):
+    """Write a random RGB cover image of the given size."""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    Image.fromarray(pixels, mode="RGB").save(path)
+
+def time_engine(engine, cover, payload, out, repeats):
+    """Return (embed_seconds, extract_seconds) averaged over repeats."""
+    embed_total = extract_total = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        embed_data_in_image(cover, payload, out, engine=engine)
+        embed_total += time.perf_counter() - start
+
+        start = time.perf_counter()
+        blob = extract_data_from_image(out, engine=engine)
+        extract_total += time.perf_counter() - start
+        assert blob == payload, f"{engine} engine round-trip mismatch"
+    return embed_total / repeats, extract_total / repeats
+
+def benchmark_stego(sizes=((256, 256), (512, 512), (1024, 1024)), repeats=3):
+    """Benchmark embed/extract for each engine over a range of cover sizes."""
+    print("Benchmarking stego engines...")
+    with tempfile.TemporaryDirectory() as tmp:
+        cover = os.path.join(tmp, "cover.png")
+        out = os.path.join(tmp, "stego.png")
+
+        for width, height in sizes:
+            make_cover(cover, width, height)
+            megapixels = width * height / 1e6
+            # Fill ~90% of the cover so both engines walk (almost) every pixel
+            payload = os.urandom(int(width * height * 3 * 0.9) // 8)
+            print(f"\nCover {width}x{height} ({megapixels:.2f} MP), payload {len(payload)} bytes")
+
+            results = {}
+            for engine in ("python", "numpy"):
+                embed_s, extract_s = time_engine(engine, cover, payload, out, repeats)
+                results[engine] = (embed_s, extract_s)
+                print(f"  {engine:6}  embed: {megapixels / embed_s:8.2f} MP/s   "
+                      f"extract: {megapixels / extract_s:8.2f} MP/s")
+
+            py, vec = results["python"], results["numpy"]
+            print(f"  speedup  embed: {py[0] / vec[0]:.1f}x   extract: {py[1] / vec[1]:.1f}x")
+
+if __name__ == "__main__":
+    benchmark_stego()
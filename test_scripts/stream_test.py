@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Verification test for the segmented streaming AEAD in symcrypto.
+Round-trips StreamEncryptor/StreamDecryptor, encrypt_stream/decrypt_stream
+and the async iterators over chunk-boundary sizes, then checks that every
+single-byte tamper, every truncation, trailing garbage and reordered
+chunks are all rejected.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from symcrypto import (StreamEncryptor, StreamDecryptor, encrypt_stream, decrypt_stream,
+                       encrypt_aiter, decrypt_aiter, MAX_CHUNK_SIZE, _STREAM_HEADER, _TAG_LEN)
+from script_metrics import record
+import io
+import time
+import random
+import asyncio
+
+CHUNK_SIZES = (1, 7, 16, 64)
+
+def boundary_lengths(chunk):
+    """Plaintext lengths around every chunk boundary up to three chunks."""
+    return sorted({0, 1, chunk - 1, chunk, chunk + 1, 2 * chunk - 1, 2 * chunk, 2 * chunk + 1, 3 * chunk})
+
+def seal(key, plaintext, chunk):
+    out = io.BytesIO()
+    encrypt_stream(key, io.BytesIO(plaintext), out, chunk)
+    return out.getvalue()
+
+def open_sealed(key, sealed, read_size=None):
+    out = io.BytesIO()
+    decrypt_stream(key, io.BytesIO(sealed), out, read_size or len(sealed) or 1)
+    return out.getvalue()
+
+def rejects(key, sealed):
+    try:
+        open_sealed(key, sealed)
+    except ValueError:
+        return True
+    return False
+
+def split(data, rng):
+    """Cut data into random-sized pieces, including empty ones."""
+    pieces, pos = [], 0
+    while pos < len(data):
+        n = rng.randint(0, 2 * rng.choice(CHUNK_SIZES))
+        pieces.append(data[pos:pos + n])
+        pos += n
+    return pieces
+
+async def _source(pieces):
+    for piece in pieces:
+        await asyncio.sleep(0)
+        yield piece
+
+async def _collect(agen):
+    return b''.join([piece async for piece in agen])
+
+def roundtrip_test(key, rng):
+    """Every API round-trips every boundary length, however the input is cut up."""
+    print("Testing round-trips at chunk boundaries...")
+    failures = cases = 0
+    for chunk in CHUNK_SIZES:
+        for length in boundary_lengths(chunk):
+            plaintext = rng.randbytes(length)
+            sealed = seal(key, plaintext, chunk)
+            expected = _STREAM_HEADER.size + (length // chunk + 1) * _TAG_LEN + length
+            results = {"size": len(sealed) == expected}
+            for read_size in (1, chunk, chunk + _TAG_LEN, 3 * chunk + 1):
+                results[f"decrypt_stream/{read_size}"] = open_sealed(key, sealed, read_size) == plaintext
+
+            enc = StreamEncryptor(key, chunk)
+            incremental = enc.header() + b''.join(enc.update(p) for p in split(plaintext, rng)) + enc.finalize()
+            dec = StreamDecryptor(key)
+            opened = b''.join(dec.update(p) for p in split(incremental, rng)) + dec.finalize()
+            results["incremental"] = opened == plaintext and len(incremental) == expected
+
+            sealed_async = asyncio.run(_collect(encrypt_aiter(key, _source(split(plaintext, rng)), chunk)))
+            results["encrypt_aiter"] = open_sealed(key, sealed_async) == plaintext
+            results["decrypt_aiter"] = asyncio.run(_collect(decrypt_aiter(key, _source(split(sealed, rng))))) == plaintext
+
+            cases += 1
+            bad = [name for name, ok in results.items() if not ok]
+            if bad:
+                failures += 1
+                print(f"ROUND-TRIP FAILURE chunk={chunk} length={length}: {', '.join(bad)}")
+    print(f"  {cases} plaintexts over {len(CHUNK_SIZES)} chunk sizes, {failures} failures")
+    return failures
+
+def tamper_test(key, rng):
+    """Flipping any single byte, header included, must fail authentication."""
+    print("Testing single-byte tampering...")
+    failures = checked = 0
+    for chunk in CHUNK_SIZES:
+        sealed = seal(key, rng.randbytes(2 * chunk + 1), chunk)
+        for pos in range(len(sealed)):
+            for flip in (0x01, 0x80):
+                tampered = bytearray(sealed)
+                tampered[pos] ^= flip
+                checked += 1
+                if not rejects(key, bytes(tampered)):
+                    failures += 1
+                    print(f"TAMPER ACCEPTED chunk={chunk} byte={pos} flip={flip:#04x}")
+    print(f"  {checked} tampered streams, {failures} accepted")
+    return failures
+
+def truncation_test(key, rng):
+    """Every proper prefix of a stream, down to empty, must be rejected."""
+    print("Testing truncation at every length...")
+    failures = checked = 0
+    for chunk in CHUNK_SIZES:
+        for length in (0, chunk, 2 * chunk + 1):
+            sealed = seal(key, rng.randbytes(length), chunk)
+            for cut in range(len(sealed)):
+                checked += 1
+                if not rejects(key, sealed[:cut]):
+                    failures += 1
+                    print(f"TRUNCATION ACCEPTED chunk={chunk} length={length} cut={cut}/{len(sealed)}")
+    print(f"  {checked} truncated streams, {failures} accepted")
+    return failures
+
+def garbage_test(key, rng):
+    """Trailing bytes, an appended stream, reordered or dropped chunks and a wrong key must be rejected."""
+    print("Testing trailing garbage, reordering and wrong keys...")
+    failures = checked = 0
+    for chunk in CHUNK_SIZES:
+        for length in (0, chunk - 1, chunk, 3 * chunk):
+            sealed = seal(key, rng.randbytes(length), chunk)
+            variants = {f"+{n} bytes": sealed + rng.randbytes(n) for n in (1, _TAG_LEN, chunk + _TAG_LEN + 1)}
+            variants["+another stream's body"] = sealed + seal(key, b'x', chunk)[_STREAM_HEADER.size:]
+            variants["wrong key"] = sealed
+            sealed_size = chunk + _TAG_LEN
+            body = sealed[_STREAM_HEADER.size:]
+            if length >= 2 * chunk:
+                first, second = body[:sealed_size], body[sealed_size:2 * sealed_size]
+                variants["swapped chunks"] = sealed[:_STREAM_HEADER.size] + second + first + body[2 * sealed_size:]
+                variants["dropped chunk"] = sealed[:_STREAM_HEADER.size] + body[sealed_size:]
+            for name, data in variants.items():
+                checked += 1
+                if not rejects(bytes(32) if name == "wrong key" else key, data):
+                    failures += 1
+                    print(f"ACCEPTED chunk={chunk} length={length}: {name}")
+    print(f"  {checked} altered streams, {failures} accepted")
+    return failures
+
+def async_failure_test(key, rng):
+    """decrypt_aiter raises on bad streams, having yielded only authenticated chunks."""
+    print("Testing async iterator failures...")
+    failures = 0
+    chunk = 16
+    plaintext = rng.randbytes(3 * chunk)
+    sealed = seal(key, plaintext, chunk)
+    last = len(sealed) - 1
+    for name, data in (("tampered final chunk", sealed[:last] + bytes([sealed[last] ^ 1])),
+                       ("truncated", sealed[:-1]),
+                       ("trailing garbage", sealed + b'\0')):
+        received = []
+
+        async def consume():
+            async for piece in decrypt_aiter(key, _source(split(data, rng))):
+                received.append(piece)
+        try:
+            asyncio.run(consume())
+        except ValueError:
+            if not plaintext.startswith(b''.join(received)):
+                failures += 1
+                print(f"ASYNC {name}: yielded unauthenticated plaintext")
+        else:
+            failures += 1
+            print(f"ASYNC {name}: accepted")
+    print(f"  3 bad streams, {failures} failures")
+    return failures
+
+def misuse_test(key):
+    """Invalid chunk sizes, nonces that are not 12 bytes and double finalize raise ValueError."""
+    print("Testing API misuse...")
+    failures = 0
+    calls = {
+        "chunk_size=0": lambda: StreamEncryptor(key, 0),
+        f"chunk_size={MAX_CHUNK_SIZE + 1}": lambda: StreamEncryptor(key, MAX_CHUNK_SIZE + 1),
+        **{f"{n}-byte nonce": (lambda n=n: StreamEncryptor(key, 16, bytes(n))) for n in (0, 5, 11, 13, 16)},
+        "update after finalize": lambda: (lambda e: (e.finalize(), e.update(b'x')))(StreamEncryptor(key, 16)),
+        "encryptor finalized twice": lambda: (lambda e: (e.finalize(), e.finalize()))(StreamEncryptor(key, 16)),
+        "not a stream": lambda: StreamDecryptor(key).update(b'\0' * _STREAM_HEADER.size),
+    }
+    for name, call in calls.items():
+        try:
+            call()
+        except ValueError:
+            continue
+        failures += 1
+        print(f"MISUSE ACCEPTED: {name}")
+    # An explicit 12-byte nonce is used as given and round-trips
+    nonce = bytes(range(12))
+    enc = StreamEncryptor(key, 16, nonce)
+    sealed = enc.header() + enc.update(b'explicit nonce') + enc.finalize()
+    if _STREAM_HEADER.unpack(sealed[:_STREAM_HEADER.size])[3] != nonce or open_sealed(key, sealed) != b'explicit nonce':
+        failures += 1
+        print("EXPLICIT 12-BYTE NONCE FAILED")
+    print(f"  {len(calls)} misuses, {failures} failures")
+    return failures
+
+def stream_test(seed=1234):
+    print(f"Running streaming AEAD test (seed={seed})...")
+    rng = random.Random(seed)
+    key = rng.randbytes(32)
+    started = time.perf_counter()
+    results = {
+        "roundtrip_failures": roundtrip_test(key, rng),
+        "tamper_accepted": tamper_test(key, rng),
+        "truncation_accepted": truncation_test(key, rng),
+        "garbage_accepted": garbage_test(key, rng),
+        "async_failures": async_failure_test(key, rng),
+        "misuse_accepted": misuse_test(key),
+    }
+    failures = sum(results.values())
+
+    print(f"\nStreaming AEAD Test Results:")
+    for name, count in results.items():
+        print(f"{name}: {count}")
+    print(f"Total failures: {failures} ({time.perf_counter() - started:.1f} s)")
+    record(failures=failures, **results)
+    return failures
+
+if __name__ == "__main__":
+    sys.exit(1 if stream_test() else 0)
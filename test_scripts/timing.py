@@ -8,7 +8,8 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from chessperm import derive_master_key
+from chessperm import derive_master_key, derive_master_key_from_password
+from script_metrics import record
 import time
 import random
 import statistics
@@ -28,10 +29,10 @@ def generate_random_pgns(n, depth=12):
             if not legal_moves:
                 break
             move = random.choice(legal_moves)
-            game.push(move)
             moves.append(game.san(move))
+            game.push(move)
         
-        pgn = game.pgn()
+        pgn = Board().variation_san(game.move_stack)
         if pgn.strip():
             pgns.append(pgn)
     
@@ -80,6 +81,7 @@ def timing_analysis(num_tests=100):
             print("⚠ Moderate timing variation")
         else:
             print("✗ High timing variation (potential side-channel)")
+        record(pgn_mean_ms=statistics.mean(timings), pgn_median_ms=statistics.median(timings), pgn_cv=cv)
 
 def password_timing_analysis(num_tests=100):
     """Analyze timing for password-based key derivation."""
@@ -95,7 +97,7 @@ def password_timing_analysis(num_tests=100):
         
         try:
             start_time = time.perf_counter()
-            derive_master_key(password)
+            derive_master_key_from_password(password)
             end_time = time.perf_counter()
             
             duration_ms = (end_time - start_time) * 1000
@@ -127,6 +129,8 @@ def password_timing_analysis(num_tests=100):
             print("⚠ Moderate timing variation")
         else:
             print("✗ High timing variation (potential side-channel)")
+        record(password_mean_ms=statistics.mean(timings), password_median_ms=statistics.median(timings),
+               password_cv=cv)
 
 def input_length_timing_test():
     """Test if timing varies with input length."""
@@ -161,6 +165,7 @@ def input_length_timing_test():
         import numpy as np
         correlation = np.corrcoef(lengths, timings)[0, 1]
         print(f"\nCorrelation between input length and timing: {correlation:.3f}")
+        record(length_timing_correlation=float(correlation))
         
         if abs(correlation) < 0.3:
             print("✓ Good: Low correlation between input length and timing")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Upload memory benchmark for /api/decrypt.
+Feeds a ~50 MB stego package, spooled the way starlette spools uploads,
+through the decrypt upload handling and reports peak RSS growth next to
+the old read-everything-into-memory approach, then checks that oversized
+uploads are refused before their body is read.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import io
+import time
+import asyncio
+import zipfile
+import tempfile
+import threading
+import numpy as np
+import psutil
+from PIL import Image
+
+from stego import embed_data_in_image, extract_data_from_image
+
+class PeakRSS:
+    """Samples this process's RSS in a background thread while active."""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.process = psutil.Process(os.getpid())
+
+    def __enter__(self):
+        self.baseline = self.peak = self.process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+    @property
+    def growth_mb(self):
+        return (self.peak - self.baseline) / 1024 / 1024
+
+def make_package(megabytes=50, seed=0):
+    """ZIP holding a random-pixel stego.png of roughly the requested size."""
+    side = int((megabytes * 1024 * 1024 / 3) ** 0.5)
+    pixels = np.random.default_rng(seed).integers(0, 256, size=(side, side, 3), dtype=np.uint8)
+    png = io.BytesIO()
+    # Placeholder payload: extraction succeeds, KEM decapsulation is expected to fail
+    embed_data_in_image(Image.fromarray(pixels), os.urandom(1024), png)
+    package = io.BytesIO()
+    with zipfile.ZipFile(package, 'w') as z:
+        z.writestr("stego.png", png.getvalue())
+    return package.getvalue()
+
+def old_extract(upload):
+    """The previous handler: whole upload in memory, then a second copy of the member."""
+    data = bytes(upload)
+    with zipfile.ZipFile(io.BytesIO(data)) as z:
+        data = z.read('stego.png')
+    return extract_data_from_image(data)
+
+def upload_benchmark(megabytes=50):
+    print(f"Building a ~{megabytes} MB stego package...")
+    package = make_package(megabytes)
+    print(f"Package size: {len(package) / 1024 / 1024:.1f} MB")
+
+    # Starlette keeps the first 1 MiB of an upload in memory and spools the rest to disk
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spool.write(package)
+    spool.seek(0)
+
+    from backend.main import _extract_upload
+
+    with PeakRSS() as new:
+        blob = _extract_upload(spool, True)
+    print(f"\nStreamed upload handling: peak RSS growth {new.growth_mb:7.1f} MB ({len(blob)} byte payload)")
+
+    with PeakRSS() as old:
+        old_extract(package)
+    print(f"Old in-memory handling:   peak RSS growth {old.growth_mb:7.1f} MB")
+
+async def _post(app, path, headers, chunks):
+    """Raw ASGI POST; returns (status, body bytes the app read)."""
+    chunks = iter(chunks)
+    read = 0
+    status = None
+
+    async def receive():
+        nonlocal read
+        chunk = next(chunks, None)
+        if chunk is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        read += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"",
+             "root_path": "", "headers": headers, "client": ("test", 0), "server": ("test", 80)}
+    await app(scope, receive, send)
+    return status, read
+
+def oversize_test():
+    """Uploads past the limit get 413 without starlette reading (and spooling) the body."""
+    from backend import main
+    limit = main.MAX_UPLOAD + main.FORM_OVERHEAD
+    boundary = b"chessperm"
+    head = (b"--" + boundary + b"\r\nContent-Disposition: form-data; name=\"file\"; filename=\"p.zip\"\r\n"
+            b"Content-Type: application/zip\r\n\r\n")
+    piece = bytes(64 * 1024)
+    pieces = (limit + 4 * len(piece)) // len(piece)
+    headers = [(b"content-type", b"multipart/form-data; boundary=" + boundary)]
+
+    def body():
+        yield head
+        for _ in range(pieces):
+            yield piece
+
+    size = len(head) + pieces * len(piece)
+    failures = 0
+    for name, extra, max_read in (("Content-Length", [(b"content-length", str(size).encode())], 0),
+                                  ("chunked", [(b"transfer-encoding", b"chunked")], limit + len(piece))):
+        status, read = asyncio.run(_post(main.app, "/api/decrypt", headers + extra, body()))
+        ok = status == 413 and read <= max_read
+        failures += not ok
+        print(f"{name:15} oversized upload: status {status}, {read / 1024 / 1024:.1f} of "
+              f"{size / 1024 / 1024:.1f} MB read{'' if ok else '  FAILED'}")
+    return failures
+
+if __name__ == "__main__":
+    upload_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
+    print()
+    sys.exit(1 if oversize_test() else 0)
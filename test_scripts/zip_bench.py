@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark script for building the encrypt response package.
+Compares building the whole ZIP in a BytesIO (the old encrypt path) with the
+streaming ZIP writer the PNG encoder writes straight into, reporting
+time-to-first-byte, total time and peak RSS growth.
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from stego import embed_data_in_image
+from zipstream import ZipStream, STORED
+from upload_bench import PeakRSS
+import io
+import time
+import zipfile
+import numpy as np
+
+def old_package(cover, payload, sec, send):
+    """Old path: PNG into bytes, ZIP into a BytesIO, then hand the result over."""
+    png = io.BytesIO()
+    embed_data_in_image(cover, payload, png)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        z.writestr("stego.png", png.getvalue())
+        z.writestr("private_key.txt", sec.hex())
+    buf.seek(0)
+    while True:
+        chunk = buf.read(64 * 1024)
+        if not chunk:
+            break
+        send(chunk)
+
+def streamed_package(cover, payload, sec, send):
+    """New path: the PNG encoder writes into a stored entry that is sent as it fills."""
+    archive = ZipStream(send)
+    with archive.open("stego.png", level=STORED) as entry:
+        embed_data_in_image(cover, payload, entry)
+    archive.writestr("private_key.txt", sec.hex())
+    archive.close()
+
+def measure(build, cover, payload, sec):
+    """Return (ttfb seconds, total seconds, bytes sent, peak RSS growth MB)."""
+    first = []
+    sent = [0]
+
+    def send(chunk):
+        if not first:
+            first.append(time.perf_counter())
+        sent[0] += len(chunk)
+
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        build(cover, payload, sec, send)
+        total = time.perf_counter() - start
+    return first[0] - start, total, sent[0], rss.growth_mb
+
+def zip_benchmark(sizes=(256, 1024, 2048, 4096)):
+    print("Benchmarking encrypt package building...")
+    sec = os.urandom(1632)
+    rng = np.random.default_rng(0)
+    warmup = rng.integers(0, 256, size=(64, 64, 3), dtype=np.uint8)
+    for build in (streamed_package, old_package):
+        build(warmup, b"warmup", sec, lambda chunk: None)
+    for side in sizes:
+        cover = rng.integers(0, 256, size=(side, side, 3), dtype=np.uint8)
+        payload = os.urandom(min(side * side * 3 // 8 - 64, 16 * 1024))
+        print(f"\nCover {side}x{side}, payload {len(payload)} bytes")
+        for name, build in (("streamed", streamed_package), ("in-memory", old_package)):
+            ttfb, total, size, growth = measure(build, cover, payload, sec)
+            print(f"  {name:10} ttfb {ttfb * 1000:8.1f} ms   total {total * 1000:8.1f} ms   "
+                  f"{size / 1024 / 1024:6.1f} MB   peak RSS growth {growth:7.1f} MB")
+
+if __name__ == "__main__":
+    zip_benchmark()